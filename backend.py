@@ -1,107 +1,57 @@
 import os
+import asyncio
 import json
 import sqlite3
 import time
 import traceback
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
 from datetime import date
 from pathlib import Path
 from typing import Optional, List, Dict, Any
 
-from fastapi import FastAPI, File, UploadFile, Query
+from fastapi import FastAPI, File, UploadFile, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
 
 import httpx
-from bs4 import BeautifulSoup
 
-import google.generativeai as genai
+from taric_storage_codec import decode_json
+import taric_image_store
+import taric_thumbnails
+import taric_analytics
+from taric_events import bus as event_bus, parse_last_event_id
+import taric_nomenclature
+import taric_http
+import taric_official_extract
+import taric_official_cache
+import taric_prefetch
+import taric_classify
+import taric_lanes
+from taric_memory_cache import LRUTTLCache, MISS
 
 # --------------------------------------------------
 # Basis-Konfiguration
 # --------------------------------------------------
 
 BASE_DIR = Path(__file__).resolve().parent
-DB_PATH = BASE_DIR / "taric_live.db"
+DB_PATH = taric_classify.DB_PATH
 
 # Hier speichert das Backend alle hochgeladenen Bilder,
 # damit sie später im Evaluationsmodul genutzt werden können.
-IMAGE_DIR = BASE_DIR / "bilder_uploads"
+# Ablage inhaltsadressiert + gesharded, siehe taric_image_store.py
+IMAGE_DIR = taric_image_store.IMAGE_DIR
 IMAGE_DIR.mkdir(parents=True, exist_ok=True)
 
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-# GEMINI_MODEL_NAME = os.getenv("GEMINI_MODEL_NAME", "gemini-2.5-flash")
-GEMINI_MODEL_NAME = os.getenv("GEMINI_MODEL_NAME", "gemini-2.5-flash-lite")
-
-# Erlaubte Bildformate (inkl. WEBP)
-ALLOWED_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp"}
-ALLOWED_MIME_TYPES = {
-    "image/jpeg",
-    "image/png",
-    "image/webp",
-}
-
-if GEMINI_API_KEY:
-    genai.configure(api_key=GEMINI_API_KEY)
-else:
-    print("WARNUNG: GEMINI_API_KEY ist nicht gesetzt. /classify wird nicht funktionieren.")
-
-# Systemprompt für das Modell (unverändert aus deiner Version)
-SYSTEM_PROMPT = """
-Du bist ein erfahrener EU-Zoll- und TARIC-Experte.
-Deine Aufgabe ist es, anhand eines Produktfotos den wahrscheinlichsten TARIC-Code
-für die Ware zu bestimmen.
-
-Rahmenbedingungen:
-- Verwende die Struktur der EU TARIC-Datenbank.
-- Gehe schrittweise vor:
-  1. Beschreibe kurz, was auf dem Bild zu sehen ist (Art der Ware, Material,
-     Verwendungszweck, besondere Merkmale).
-  2. Bestimme erst die wahrscheinliche HS-Position (4-stellig),
-     dann die 6-stellige Unterposition, anschließend die 8-stellige KN-Position
-     und zuletzt den 10-stelligen TARIC-Code.
-  3. Prüfe, ob besondere zollrechtliche Regelungen greifen könnten
-     (Medizinprodukt, Lebensmittel, Elektronik, Textil usw.).
-
-Ausgabeformat (immer als gültiges JSON, ohne zusätzlichen Text):
-
-{
-  "taric_code": "XXXXXXXXXX",
-  "cn_code": "XXXXXXXX",
-  "hs_chapter": "XX",
-  "confidence": 0.0,
-  "short_reason": "kurze Begründung in 2–4 Sätzen",
-  "possible_alternatives": [
-    {
-      "taric_code": "YYYYYYYYYY",
-      "short_reason": "warum dieser Code ebenfalls in Frage kommt"
-    }
-  ]
-}
-
-Regeln:
-- Antworte ausschließlich in diesem JSON-Format.
-- Wenn du sehr unsicher bist, gib trotzdem den besten Schätzwert und senke 'confidence'.
-- Verwende nur plausible TARIC-Codes, die formal zur beschriebenen Ware passen.
-
-Wichtig:
-- Nur das JSON-Objekt zurückgeben, keine zusätzliche Erklärung, kein Markdown,
-  keine Codeblöcke.
-"""
-
-USER_TEXT = "Bestimme für dieses Produktfoto den TARIC-Code und gib nur das JSON aus."
-
+# Modell-Konfiguration (GEMINI_*), Prompts und die /classify-Pipeline liegen in taric_classify.py
 
 # --------------------------------------------------
 # DB-Helfer
 # --------------------------------------------------
 
 
-def get_conn() -> sqlite3.Connection:
-    """Öffnet eine SQLite-Connection mit Row-Access per Spaltennamen."""
-    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
-    conn.row_factory = sqlite3.Row
-    return conn
+get_conn = taric_classify.get_conn
 
 
 def init_db() -> None:
@@ -110,6 +60,10 @@ def init_db() -> None:
     - taric_live existiert
     - taric_evaluation existiert
     - Spalte superviser_bewertung in taric_evaluation existiert
+    - Spalten model_name und validation_json in taric_live existieren
+    - image_store / image_alias existieren
+    - taric_reference existiert (inkl. Hierarchie-/Gültigkeitsspalten)
+    - taric_official_cache hat das einheitliche Schema und ist begrenzt
     """
     conn = get_conn()
     cur = conn.cursor()
@@ -129,10 +83,21 @@ def init_db() -> None:
                 confidence REAL,
                 short_reason TEXT,
                 alternatives_json TEXT,
-                raw_response_json TEXT
+                raw_response_json TEXT,
+                model_name TEXT,
+                validation_json TEXT
             );
             """
         )
+    else:
+        # Spalte model_name bei Bedarf nachziehen (für Modellvergleiche)
+        cur.execute("PRAGMA table_info(taric_live);")
+        cols = [row["name"] for row in cur.fetchall()]
+        if "model_name" not in cols:
+            cur.execute("ALTER TABLE taric_live ADD COLUMN model_name TEXT;")
+        # Prüfbericht/Korrektur getrennt von der unveränderten Modellantwort
+        if "validation_json" not in cols:
+            cur.execute("ALTER TABLE taric_live ADD COLUMN validation_json TEXT;")
 
     # taric_evaluation
     cur.execute(
@@ -162,6 +127,17 @@ def init_db() -> None:
                 "ALTER TABLE taric_evaluation ADD COLUMN superviser_bewertung INTEGER;"
             )
 
+    # Bild-Store (Referenzzählung + Alias für alte Dateinamen)
+    taric_image_store.ensure_image_store_schema(conn)
+
+    # Referenz-Nomenklatur (Hierarchie + Gültigkeit)
+    taric_nomenclature.ensure_reference_schema(conn)
+
+    # taric_official_cache: einheitliches Schema (übernimmt alte Formate), Obergrenzen einhalten
+    taric_official_cache.ensure_schema(conn)
+    conn.commit()
+    taric_official_cache.evict(conn)
+
     conn.commit()
     conn.close()
     print("DB initialisiert / geprüft.")
@@ -170,139 +146,20 @@ def init_db() -> None:
 init_db()
 
 
-# --------------------------------------------------
-# Modell-Helfer
-# --------------------------------------------------
-
-
-def extract_json_from_text(raw: str) -> dict:
-    """
-    Extrahiert ein JSON-Objekt aus einer generierten Text-Antwort.
-    Entfernt ggf. Markdown-Codeblöcke (```json ... ```).
-    """
-    if not raw:
-        raise ValueError("Leere Modell-Antwort")
-
-    txt = raw.strip()
-
-    # Markdown-Codeblock entfernen
-    if txt.startswith("```"):
-        lines = txt.splitlines()
-        if lines and lines[0].startswith("```"):
-            lines = lines[1:]
-        if lines and lines[-1].startswith("```"):
-            lines = lines[:-1]
-        txt = "\n".join(lines).strip()
-
-    # Versuchen, das JSON anhand der äußeren Klammern zu finden
-    start = txt.find("{")
-    end = txt.rfind("}")
-    if start == -1 or end == -1 or end <= start:
-        raise ValueError("Keine JSON-Klammern in Modell-Antwort gefunden")
-
-    json_str = txt[start : end + 1]
-    return json.loads(json_str)
-
-
-def classify_with_gemini(
-    image_bytes: bytes, filename: str, content_type: Optional[str]
-) -> dict:
-    """
-    Ruft das Gemini-Modell mit Bild + Systemprompt auf und gibt ein
-    JSON-ähnliches Dict mit Standardfeldern + optionalem 'usage'-Block zurück.
-    """
-    if not GEMINI_API_KEY:
-        raise RuntimeError("GEMINI_API_KEY ist nicht gesetzt")
-
-    model = genai.GenerativeModel(GEMINI_MODEL_NAME)
-
-    # MIME-Type bestimmen; WEBP explizit zulassen. Bei unbekanntem oder
-    # leerem Typ wird defensiv image/jpeg verwendet.
-    mime = content_type or "image/jpeg"
-    if mime not in ALLOWED_MIME_TYPES:
-        mime = "image/jpeg"
-
-    result = model.generate_content(
-        [
-            SYSTEM_PROMPT,
-            {
-                "mime_type": mime,
-                "data": image_bytes,
-            },
-        ]
-    )
-
-    raw_text = getattr(result, "text", None)
-    if not raw_text:
-        raise RuntimeError("Modell-Antwort war leer")
-
-    parsed = extract_json_from_text(raw_text)
-
-    # Token-Nutzung (usage_metadata) nach Möglichkeit übernehmen.
-    usage = getattr(result, "usage_metadata", None)
-    if usage is not None:
-        parsed["usage"] = {
-            "prompt_tokens": getattr(usage, "prompt_token_count", None),
-            "completion_tokens": getattr(usage, "candidates_token_count", None),
-            "total_tokens": getattr(usage, "total_token_count", None),
-        }
-
-    # Standardfelder absichern
-    parsed.setdefault("taric_code", None)
-    parsed.setdefault("cn_code", None)
-    parsed.setdefault("hs_chapter", None)
-    parsed.setdefault("confidence", 0.0)
-    parsed.setdefault("short_reason", "")
-    parsed.setdefault("possible_alternatives", [])
-
-    return parsed
-
-
-def store_classification(filename: str, data: dict) -> int:
-    """
-    Speichert das Klassifikationsergebnis in taric_live und gibt die neue ID zurück.
-    Die komplette Modellantwort (inkl. usage) wird als JSON im Feld raw_response_json abgelegt.
-    """
+def load_nomenclature_index() -> None:
+    """Baut den In-Memory-Index der TARIC-Nomenklatur beim Start auf."""
     conn = get_conn()
-    cur = conn.cursor()
-
-    confidence = data.get("confidence")
     try:
-        confidence_val = float(confidence) if confidence is not None else None
-    except (TypeError, ValueError):
-        confidence_val = None
-
-    cur.execute(
-        """
-        INSERT INTO taric_live (
-            created_at,
-            filename,
-            taric_code,
-            cn_code,
-            hs_chapter,
-            confidence,
-            short_reason,
-            alternatives_json,
-            raw_response_json
-        )
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """,
-        (
-            time.strftime("%Y-%m-%d %H:%M:%S"),
-            filename,
-            data.get("taric_code"),
-            data.get("cn_code"),
-            data.get("hs_chapter"),
-            confidence_val,
-            data.get("short_reason"),
-            json.dumps(data.get("possible_alternatives") or [], ensure_ascii=False),
-            json.dumps(data, ensure_ascii=False),
-        ),
+        index = taric_nomenclature.load_index(conn)
+    finally:
+        conn.close()
+    print(
+        f"TARIC-Nomenklatur-Index: {len(index)} Codes geladen"
+        + (f" (Import vom {index.imported_at})." if index.complete else " (kein Import vermerkt, Codes werden nicht geprüft).")
     )
-    new_id = cur.lastrowid
-    conn.commit()
-    conn.close()
-    return new_id
+
+
+load_nomenclature_index()
 
 
 # --------------------------------------------------
@@ -310,47 +167,6 @@ def store_classification(filename: str, data: dict) -> int:
 # --------------------------------------------------
 
 
-def _extract_official_description_from_html(html: str, taric_prefix: str, digits: int) -> str | None:
-    """
-    Extrahiert aus der TARIC-Consultation-HTML den Beschreibungstext
-    für den angegebenen Präfix (z.B. '8517' bei digits=4).
-
-    Strategie:
-    - Anker-ID = Präfix auf 10 Stellen mit Nullen aufgefüllt (z.B. '8517000000')
-    - Passende Zeile / Container um diesen Anker herum suchen.
-    """
-    if not html:
-        return None
-
-    soup = BeautifulSoup(html, "html.parser")
-
-    anchor_id = taric_prefix.ljust(10, "0")
-    anchor = soup.find(id=anchor_id) or soup.find("a", attrs={"name": anchor_id})
-
-    if anchor:
-        container = anchor.find_parent("tr") or anchor.find_parent("div") or anchor.parent
-        if container:
-            text = " ".join(container.stripped_strings)
-            text = text.replace("\xa0", " ").strip()
-            if text:
-                return text
-
-    texts = soup.find_all(string=lambda s: s and taric_prefix in s)
-    collected = []
-    for t in texts:
-        parent = t.parent
-        if parent:
-            snippet = " ".join(parent.stripped_strings)
-            collected.append(snippet)
-
-    if collected:
-        unique = list(dict.fromkeys(collected))
-        combined = " | ".join(unique)
-        return combined[:4000]
-
-    return None
-
-
 def _get_cached_official_description(
     taric_prefix: str,
     digits: int,
@@ -362,24 +178,14 @@ def _get_cached_official_description(
     Rückgabe: (official_description, source_url) oder (None, None), wenn nichts gefunden.
     """
     conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute(
-        """
-        SELECT official_description, source_url
-        FROM taric_official_cache
-        WHERE taric_prefix = ?
-          AND digits = ?
-          AND sim_date = ?
-          AND lang = ?
-        LIMIT 1
-        """,
-        (taric_prefix, digits, sim_date, lang),
-    )
-    row = cur.fetchone()
-    conn.close()
+    try:
+        entry = taric_official_cache.get(conn, taric_prefix, digits, sim_date, lang)
+        taric_official_cache.maybe_evict(conn)
+    finally:
+        conn.close()
 
-    if row:
-        return row[0], row[1]
+    if entry:
+        return entry["description"], entry["source_url"]
     return None, None
 
 
@@ -388,25 +194,73 @@ def _store_official_description_in_cache(
     digits: int,
     sim_date: str,
     lang: str,
-    official_html: str,
     official_description: str | None,
+    official_rows: list,
     source_url: str,
+    official_html: str | None = None,
 ) -> None:
-    """Speichert das Ergebnis im Cache."""
+    """Speichert das Ergebnis im Cache (Upsert; HTML nur optional, siehe taric_official_cache)."""
     conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute(
-        """
-        INSERT INTO taric_official_cache (
-            taric_prefix, digits, sim_date, lang,
-            official_html, official_description, source_url, created_at, last_used_at
+    try:
+        taric_official_cache.put(
+            conn,
+            taric_prefix,
+            digits,
+            sim_date,
+            lang,
+            source=taric_official_cache.SOURCE_WEB,
+            description=official_description,
+            rows=official_rows,
+            raw=official_html,
+            source_url=source_url,
         )
-        VALUES (?, ?, ?, ?, ?, ?, ?, datetime('now'), datetime('now'))
-        """,
-        (taric_prefix, digits, sim_date, lang, official_html, official_description, source_url),
-    )
-    conn.commit()
-    conn.close()
+        conn.commit()
+        taric_official_cache.maybe_evict(conn)
+    finally:
+        conn.close()
+
+
+async def _fetch_official_from_upstream(
+    taric_prefix: str,
+    digits: int,
+    sim_date: str,
+    lang: str,
+) -> tuple[str | None, str, str]:
+    """
+    Ein Abruf der EU-TARIC-Seite über den gemeinsamen Client, inkl. Cache-Eintrag.
+    Rückgabe: (official_description, requested_url, final_url).
+    """
+    base_url = "https://ec.europa.eu/taxation_customs/dds2/taric/taric_consultation.jsp"
+    params = {
+        "Lang": lang,
+        "Taric": taric_prefix,
+        "Expand": "true",
+        "SimDate": sim_date,
+    }
+
+    html, requested_url, final_url = await taric_http.fetch_text(base_url, params=params)
+
+    def extract_and_store() -> str | None:
+        # Parsen + SQLite-Schreibzugriff im Thread-Pool, nicht im Event-Loop
+        extracted = taric_official_extract.extract(html, taric_prefix, digits)
+        _store_official_description_in_cache(
+            taric_prefix=taric_prefix,
+            digits=digits,
+            sim_date=sim_date,
+            lang=lang,
+            official_description=extracted.description,
+            official_rows=extracted.rows,
+            source_url=final_url,
+            official_html=html,
+        )
+        return extracted.description
+
+    official_description = await asyncio.to_thread(extract_and_store)
+    return official_description, requested_url, final_url
+
+
+_official_single_flight = taric_http.SingleFlight()
+_official_memory_cache = LRUTTLCache()
 
 
 async def fetch_official_taric_description(
@@ -439,52 +293,36 @@ async def fetch_official_taric_description(
     if sim_date is None:
         sim_date = date.today().strftime("%Y%m%d")
 
-    cached_desc, cached_url = _get_cached_official_description(
+    fast = _official_fast_result(full_code, taric_prefix, digits, sim_date, lang)
+    if fast is not None:
+        return fast
+
+    # Stufe 2: SQLite, außerhalb des Event-Loops
+    cached_desc, cached_url = await asyncio.to_thread(
+        _get_cached_official_description,
         taric_prefix=taric_prefix,
         digits=digits,
         sim_date=sim_date,
         lang=lang,
     )
     if cached_desc is not None:
-        return {
-            "input_code": full_code,
-            "used_prefix": taric_prefix,
-            "digits": digits,
-            "sim_date": sim_date,
-            "lang": lang,
-            "official_description": cached_desc,
-            "source_url": cached_url,
-            "from_cache": True,
-        }
+        _official_memory_cache.set((taric_prefix, digits, sim_date, lang), (cached_desc, cached_url))
+        return _official_result(full_code, taric_prefix, digits, sim_date, lang, cached_desc, cached_url)
 
-    base_url = "https://ec.europa.eu/taxation_customs/dds2/taric/taric_consultation.jsp"
-    params = {
-        "Lang": lang,
-        "Taric": taric_prefix,
-        "Expand": "true",
-        "SimDate": sim_date,
-    }
-
-    requested_url = None
-    async with httpx.AsyncClient(timeout=20.0) as client:
-        resp = await client.get(base_url, params=params)
-        requested_url = str(resp.request.url)
-        resp.raise_for_status()
-        html = resp.text
+    return await _fetch_official_uncached(full_code, taric_prefix, digits, sim_date, lang)
 
-    official_description = _extract_official_description_from_html(html, taric_prefix, digits)
-    final_url = str(resp.url)
-
-    _store_official_description_in_cache(
-        taric_prefix=taric_prefix,
-        digits=digits,
-        sim_date=sim_date,
-        lang=lang,
-        official_html=html,
-        official_description=official_description,
-        source_url=final_url,
-    )
 
+def _official_result(
+    full_code: str,
+    taric_prefix: str,
+    digits: int,
+    sim_date: str,
+    lang: str,
+    official_description: str | None,
+    source_url: str | None,
+    **extra: Any,
+) -> dict:
+    """Einheitliches Ergebnis-Dict für fetch_official_taric_description und den Batch-Endpoint."""
     return {
         "input_code": full_code,
         "used_prefix": taric_prefix,
@@ -492,17 +330,116 @@ async def fetch_official_taric_description(
         "sim_date": sim_date,
         "lang": lang,
         "official_description": official_description,
-        "source_url": final_url,
-        "requested_url": requested_url or final_url,
-        "from_cache": False,
+        "source_url": source_url,
+        "from_cache": True,
+        **extra,
     }
 
 
+def _official_fast_result(
+    full_code: str, taric_prefix: str, digits: int, sim_date: str, lang: str
+) -> dict | None:
+    """Ergebnis ohne I/O: lokale Nomenklatur, dann Speicher-Cache. None = weiter mit SQLite."""
+    # Lokale Nomenklatur zuerst – kein Netzwerk nötig
+    local_entry = taric_nomenclature.get_index().lookup_prefix(taric_prefix)
+    if local_entry is not None and local_entry.description(lang) and local_entry.is_valid_on(sim_date):
+        return _official_result(
+            full_code, taric_prefix, digits, sim_date, lang,
+            local_entry.description(lang), None, source="local_nomenclature",
+        )
+
+    # Stufe 1: Speicher-Cache (None = kürzlich upstream nicht gefunden)
+    cached = _official_memory_cache.get((taric_prefix, digits, sim_date, lang))
+    if cached is MISS:
+        return None
+    cached_desc, cached_url = cached or (None, None)
+    return _official_result(
+        full_code, taric_prefix, digits, sim_date, lang,
+        cached_desc, cached_url, negative_cache=cached is None,
+    )
+
+
+async def _fetch_official_uncached(
+    full_code: str, taric_prefix: str, digits: int, sim_date: str, lang: str
+) -> dict:
+    """Upstream-Abruf; gleichzeitige Misses für denselben Schlüssel teilen sich einen Abruf."""
+    cache_key = (taric_prefix, digits, sim_date, lang)
+    official_description, requested_url, final_url = await _official_single_flight.run(
+        cache_key,
+        lambda: _fetch_official_from_upstream(taric_prefix, digits, sim_date, lang),
+    )
+    _official_memory_cache.set(
+        cache_key,
+        (official_description, final_url) if official_description is not None else None,
+    )
+    return _official_result(
+        full_code, taric_prefix, digits, sim_date, lang,
+        official_description, final_url, requested_url=requested_url, from_cache=False,
+    )
+
+
+# Prefetch: Präfixlängen wie in der Evaluations-UI (currentTaricDigits), Stichtag Standard = heute
+PREFETCH_DIGITS = [int(d) for d in os.getenv("TARIC_PREFETCH_DIGITS", "8").split(",") if d.strip()]
+PREFETCH_SIM_DATE = os.getenv("TARIC_PREFETCH_SIM_DATE") or None
+
+
+async def _prefetch_official(code: str, digits: int, sim_date: str) -> dict:
+    return await fetch_official_taric_description(code, digits=digits, lang="de", sim_date=sim_date)
+
+
+official_prefetcher = taric_prefetch.Prefetcher(_prefetch_official, busy=taric_http.upstream_saturated)
+
+
+def _on_classification_stored(event: dict) -> None:
+    """Nach store_classification: Live-Event für die UI, offizielle Beschreibungen vorwärmen."""
+    filename = event["filename"]
+    event_bus.publish(
+        "classification",
+        {
+            **event,
+            "thumbnail_url": f"/api/images/thumb/{filename}",
+            "preview_url": f"/api/images/medium/{filename}",
+        },
+    )
+
+    # Offizielle Beschreibungen für Vorhersage + Alternativen vorwärmen
+    official_prefetcher.enqueue(
+        [event.get("taric_code")]
+        + [a.get("taric_code") if isinstance(a, dict) else a for a in event["alternatives"]],
+        PREFETCH_DIGITS,
+        PREFETCH_SIM_DATE or date.today().strftime("%Y%m%d"),
+    )
+
+
+taric_classify.add_store_hook(_on_classification_stored)
+
+
 # --------------------------------------------------
 # FastAPI-App
 # --------------------------------------------------
 
-app = FastAPI(title="TARIC-Gemini-Backend")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Gemeinsamer HTTP-Client (Keep-Alive zur EU-TARIC-Seite) für die Laufzeit der App
+    taric_http.start_client()
+    await official_prefetcher.start()
+    try:
+        yield
+    finally:
+        await official_prefetcher.stop()
+        await taric_http.close_client()
+        while _classify_executors:
+            _, executor = _classify_executors.popitem()
+            executor.shutdown(wait=False, cancel_futures=True)
+        # Vorgemerkte last_used_at-Zugriffe nicht verlieren
+        conn = get_conn()
+        try:
+            taric_official_cache.flush_touches(conn)
+        finally:
+            conn.close()
+
+
+app = FastAPI(title="TARIC-Gemini-Backend", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -523,73 +460,75 @@ class EvaluationIn(BaseModel):
     superviser_bewertung: Optional[int] = None
 
 
+class EvaluationBatchIn(BaseModel):
+    """Payload für das Speichern vieler Bewertungen in einem Aufruf."""
+
+    items: List[EvaluationIn]
+
+
+# Obergrenze pro Batch-Request
+MAX_EVALUATION_BATCH = 5000
+
+
+class OfficialCompareBatchIn(BaseModel):
+    """Payload für den Abruf offizieller Beschreibungen zu vielen Codes."""
+
+    codes: List[str]
+    digits: List[int] = [4]
+    lang: str = "de"
+    sim_date: Optional[str] = None
+    stream: bool = False
+
+
+# Obergrenze (Codes x Stellen) pro Batch-Request
+MAX_OFFICIAL_BATCH = 500
+
+# Eigene Thread-Pools für /classify statt des Standard-Executors (den teilen sich
+# Vorschaubilder, offizielle Beschreibungen und Metriken): Threads, die im
+# Lane-Scheduler warten oder auf Gemini blockieren, halten dort nichts fest.
+# Bulk/batch haben einen getrennten Pool, damit ein Bulk-Rückstand keine Threads
+# belegt, die interaktive Anfragen für den Weg zum Scheduler brauchen.
+# Je Pool so viele Threads wie Modell-Plätze; angelegt beim ersten Aufruf (nur aus
+# der Event-Loop), beendet im Lifespan.
+_classify_executors: Dict[str, ThreadPoolExecutor] = {}
+
+
+def _classify_executor(lane: str) -> ThreadPoolExecutor:
+    group = taric_lanes.INTERACTIVE if lane == taric_lanes.INTERACTIVE else "background"
+    executor = _classify_executors.get(group)
+    if executor is None:
+        executor = ThreadPoolExecutor(
+            taric_classify.GEMINI_CONCURRENCY, thread_name_prefix=f"classify-{group}"
+        )
+        _classify_executors[group] = executor
+    return executor
+
+
 @app.post("/classify")
-async def classify(file: UploadFile = File(...)):
+async def classify(request: Request, file: UploadFile = File(...)):
     """
     Nimmt ein Bild entgegen, ruft Gemini auf, speichert das Ergebnis
     in taric_live und gibt das Ergebnis zurück.
 
     Diese Route wird sowohl von der Web-UI (Einzelbild) als auch vom
-    bulk-evaluation-Script verwendet.
+    bulk-evaluation-Script verwendet. Die Spur (Header X-Taric-Lane, sonst
+    User-Agent; Standard interactive) bestimmt den Vorrang beim Modellaufruf.
+    Der Aufruf läuft in einem eigenen Thread-Pool je Spurgruppe, damit wartende
+    Bulk-Anfragen weder die Event-Loop noch den Standard-Executor blockieren.
     """
+    lane = taric_lanes.lane_for(
+        request.headers.get(taric_lanes.LANE_HEADER), request.headers.get("user-agent")
+    )
     try:
-        if not GEMINI_API_KEY:
-            return JSONResponse(
-                status_code=503,
-                content={"error": "GEMINI_API_KEY ist nicht gesetzt."},
-            )
-
         data = await file.read()
-        if not data:
-            return JSONResponse(
-                status_code=400, content={"error": "Leere Datei erhalten."}
-            )
-
-        # Dateiendung ermitteln und gegen Whitelist prüfen
-        original_name = file.filename or "upload.jpg"
-        suffix = Path(original_name).suffix.lower() or ".jpg"
-        if suffix not in ALLOWED_EXTENSIONS:
-            return JSONResponse(
-                status_code=400,
-                content={
-                    "error": f"Dateiformat {suffix} wird nicht unterstützt. "
-                    f"Erlaubt sind: {', '.join(sorted(ALLOWED_EXTENSIONS))}"
-                },
-            )
-
-        # Bild speichern (für Evaluation)
-        ts = time.strftime("%Y%m%d_%H%M%S")
-        filename = f"{ts}_{int(time.time() * 1000)}{suffix}"
-        img_path = IMAGE_DIR / filename
-        with img_path.open("wb") as f:
-            f.write(data)
-
-        # Modell aufrufen
-        try:
-            model_result = classify_with_gemini(
-                data, filename=original_name, content_type=file.content_type
-            )
-        except Exception as e:
-            traceback.print_exc()
-            return JSONResponse(
-                status_code=500, content={"error": f"Fehler bei Modellaufruf: {e}"}
-            )
-
-        # Ergebnis in DB speichern
-        new_id = store_classification(filename, model_result)
-
-        response: Dict[str, Any] = {
-            "id": new_id,
-            "filename": filename,
-            "taric_code": model_result.get("taric_code"),
-            "cn_code": model_result.get("cn_code"),
-            "hs_chapter": model_result.get("hs_chapter"),
-            "confidence": model_result.get("confidence"),
-            "short_reason": model_result.get("short_reason"),
-            "possible_alternatives": model_result.get("possible_alternatives"),
-            "usage": model_result.get("usage"),
-        }
+        response = await asyncio.get_running_loop().run_in_executor(
+            _classify_executor(lane),
+            taric_classify.classify_bytes,
+            data, file.filename or "upload.jpg", file.content_type, lane,
+        )
         return JSONResponse(content=response)
+    except taric_classify.ClassifyError as e:
+        return JSONResponse(status_code=e.status, content={"error": e.message})
     except Exception as e:
         traceback.print_exc()
         return JSONResponse(
@@ -628,6 +567,7 @@ async def get_evaluation_items(
             l.short_reason    AS short_reason,
             l.alternatives_json AS alternatives_json,
             l.raw_response_json AS raw_response_json,
+            l.validation_json AS validation_json,
             e.id              AS evaluation_id,
             e.correct_digits  AS correct_digits,
             e.reviewer        AS reviewer,
@@ -660,18 +600,10 @@ async def get_evaluation_items(
 
     items: List[dict] = []
     for r in rows:
-        alternatives_json = r["alternatives_json"] or "[]"
-        raw_response_json = r["raw_response_json"] or "{}"
-
-        try:
-            alternatives = json.loads(alternatives_json)
-        except Exception:
-            alternatives = []
-
-        try:
-            raw_response = json.loads(raw_response_json)
-        except Exception:
-            raw_response = {}
+        # Alt-Zeilen (TEXT) und komprimierte Zeilen (BLOB) werden gleich behandelt
+        alternatives = decode_json(r["alternatives_json"], default=[])
+        raw_response = decode_json(r["raw_response_json"], default={})
+        validation = decode_json(r["validation_json"], default=None)
 
         eval_block = None
         if r["evaluation_id"] is not None:
@@ -684,10 +616,13 @@ async def get_evaluation_items(
                 "reviewed_at": r["reviewed_at"],
             }
 
+        filename = r["filename"]
         items.append(
             {
                 "taric_live_id": r["taric_live_id"],
-                "filename": r["filename"],
+                "filename": filename,
+                "thumbnail_url": f"/api/images/thumb/{filename}" if filename else None,
+                "preview_url": f"/api/images/medium/{filename}" if filename else None,
                 "created_at": r["created_at"],
                 "taric_code": r["taric_code"],
                 "cn_code": r["cn_code"],
@@ -696,6 +631,7 @@ async def get_evaluation_items(
                 "short_reason": r["short_reason"],
                 "alternatives": alternatives,
                 "raw_response": raw_response,
+                "validation": validation,
                 "evaluation": eval_block,
             }
         )
@@ -703,72 +639,252 @@ async def get_evaluation_items(
     return JSONResponse(content=items)
 
 
-@app.post("/api/evaluation/save")
-async def save_evaluation(payload: EvaluationIn):
+EVALUATION_UPSERT_SQL = """
+    INSERT INTO taric_evaluation (
+        taric_live_id,
+        correct_digits,
+        reviewer,
+        comment,
+        superviser_bewertung,
+        reviewed_at
+    ) VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT(taric_live_id) DO UPDATE SET
+        correct_digits = excluded.correct_digits,
+        reviewer = excluded.reviewer,
+        comment = excluded.comment,
+        superviser_bewertung = excluded.superviser_bewertung,
+        reviewed_at = excluded.reviewed_at
+"""
+
+# Obergrenze für Parameter in IN (...)-Listen (SQLite-Variablenlimit)
+SQL_IN_CHUNK = 500
+
+
+def _chunks(values: List[Any], size: int = SQL_IN_CHUNK):
+    for i in range(0, len(values), size):
+        yield values[i : i + size]
+
+
+def upsert_evaluations(payloads: List[EvaluationIn]) -> List[dict]:
     """
-    Upsert in taric_evaluation:
-    - existiert für taric_live_id noch kein Eintrag → INSERT
-    - sonst UPDATE
+    Schreibt beliebig viele Bewertungen als ein
+    INSERT ... ON CONFLICT(taric_live_id) DO UPDATE (executemany)
+    in einer einzigen Transaktion.
+
+    Rückgabe: Status pro Eintrag in Eingabereihenfolge
+    ({"taric_live_id", "status": "ok"|"not_found", "evaluation_id"}).
+    Bei mehrfach enthaltener taric_live_id gewinnt der letzte Eintrag.
     """
-    conn = get_conn()
-    cur = conn.cursor()
+    if not payloads:
+        return []
 
     now = time.strftime("%Y-%m-%d %H:%M:%S")
+    live_ids = sorted({p.taric_live_id for p in payloads})
 
-    cur.execute(
-        "SELECT id FROM taric_evaluation WHERE taric_live_id = ?",
-        (payload.taric_live_id,),
-    )
-    row = cur.fetchone()
-
-    if row:
-        eval_id = row["id"]
-        cur.execute(
-            """
-            UPDATE taric_evaluation
-               SET correct_digits = ?,
-                   reviewer = ?,
-                   comment = ?,
-                   superviser_bewertung = ?,
-                   reviewed_at = ?
-             WHERE id = ?
-            """,
+    conn = get_conn()
+    try:
+        existing = set()
+        for chunk in _chunks(live_ids):
+            placeholders = ",".join("?" * len(chunk))
+            rows = conn.execute(
+                f"SELECT id FROM taric_live WHERE id IN ({placeholders})", chunk
+            ).fetchall()
+            existing.update(r["id"] for r in rows)
+
+        params = [
             (
-                payload.correct_digits,
-                payload.reviewer,
-                payload.comment,
-                payload.superviser_bewertung,
+                p.taric_live_id,
+                p.correct_digits,
+                p.reviewer,
+                p.comment,
+                p.superviser_bewertung,
                 now,
-                eval_id,
-            ),
+            )
+            for p in payloads
+            if p.taric_live_id in existing
+        ]
+
+        with conn:
+            conn.executemany(EVALUATION_UPSERT_SQL, params)
+
+        eval_ids: Dict[int, int] = {}
+        for chunk in _chunks(sorted(existing)):
+            placeholders = ",".join("?" * len(chunk))
+            rows = conn.execute(
+                f"SELECT id, taric_live_id FROM taric_evaluation WHERE taric_live_id IN ({placeholders})",
+                chunk,
+            ).fetchall()
+            eval_ids.update((r["taric_live_id"], r["id"]) for r in rows)
+    finally:
+        conn.close()
+
+    if params:
+        taric_analytics.invalidate_cache()
+        # Ein Event je gespeicherter Bewertung (letzter Stand je taric_live_id)
+        latest = {p.taric_live_id: p for p in payloads if p.taric_live_id in existing}
+        for live_id, p in latest.items():
+            event_bus.publish(
+                "evaluation",
+                {
+                    "taric_live_id": live_id,
+                    "evaluation_id": eval_ids.get(live_id),
+                    "correct_digits": p.correct_digits,
+                    "reviewer": p.reviewer,
+                    "comment": p.comment,
+                    "superviser_bewertung": p.superviser_bewertung,
+                    "reviewed_at": now,
+                },
+            )
+
+    return [
+        {
+            "taric_live_id": p.taric_live_id,
+            "status": "ok" if p.taric_live_id in existing else "not_found",
+            "evaluation_id": eval_ids.get(p.taric_live_id),
+        }
+        for p in payloads
+    ]
+
+
+@app.post("/api/evaluation/save")
+async def save_evaluation(payload: EvaluationIn):
+    """
+    Upsert in taric_evaluation (INSERT ... ON CONFLICT(taric_live_id) DO UPDATE).
+    """
+    result = upsert_evaluations([payload])[0]
+
+    if result["status"] != "ok":
+        return JSONResponse(
+            status_code=404,
+            content={"error": f"taric_live_id {payload.taric_live_id} nicht gefunden."},
         )
-    else:
-        cur.execute(
-            """
-            INSERT INTO taric_evaluation (
-                taric_live_id,
-                correct_digits,
-                reviewer,
-                comment,
-                superviser_bewertung,
-                reviewed_at
-            ) VALUES (?, ?, ?, ?, ?, ?)
-            """,
-            (
-                payload.taric_live_id,
-                payload.correct_digits,
-                payload.reviewer,
-                payload.comment,
-                payload.superviser_bewertung,
-                now,
-            ),
+
+    return JSONResponse(content={"status": "ok", "evaluation_id": result["evaluation_id"]})
+
+
+@app.post("/api/evaluation/save_batch")
+async def save_evaluation_batch(payload: EvaluationBatchIn):
+    """
+    Batch-Upsert vieler Bewertungen in einer Transaktion (z.B. Neubewertung
+    hunderter Fälle aus evaluation.html in einem Round-Trip).
+    Liefert den Status je Eintrag zurück.
+    """
+    if len(payload.items) > MAX_EVALUATION_BATCH:
+        return JSONResponse(
+            status_code=400,
+            content={"error": f"Maximal {MAX_EVALUATION_BATCH} Einträge pro Batch."},
         )
-        eval_id = cur.lastrowid
 
-    conn.commit()
-    conn.close()
+    try:
+        results = upsert_evaluations(payload.items)
+    except sqlite3.Error as e:
+        traceback.print_exc()
+        return JSONResponse(
+            status_code=500,
+            content={"error": f"Datenbankfehler beim Batch-Speichern: {e}"},
+        )
+
+    saved = sum(1 for r in results if r["status"] == "ok")
+    return JSONResponse(
+        content={
+            "status": "ok" if saved == len(results) else "partial",
+            "saved": saved,
+            "failed": len(results) - saved,
+            "items": results,
+        }
+    )
+
+
+@app.get("/api/events")
+async def events(
+    request: Request,
+    last_event_id: Optional[str] = Query(None, description="Alternative zum Last-Event-ID-Header"),
+    types: Optional[str] = Query(None, description="Kommagetrennt: classification,evaluation"),
+):
+    """
+    Server-Sent-Events-Feed neuer Klassifikationen und Bewertungen.
+    Clients setzen nach Verbindungsabbruch über Last-Event-ID fort; ist das nicht
+    möglich (Neustart, Puffer überlaufen), kommt ein 'reset'-Event und der Client
+    lädt seinen Stand neu.
+    """
+    resume_id = parse_last_event_id(request.headers.get("last-event-id") or last_event_id)
+    type_filter = {t.strip() for t in types.split(",") if t.strip()} if types else None
+
+    return StreamingResponse(
+        event_bus.subscribe(last_event_id=resume_id, types=type_filter),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+        },
+    )
+
 
-    return JSONResponse(content={"status": "ok", "evaluation_id": eval_id})
+def _read_slice(path: Path, start: int, length: int) -> bytes:
+    with path.open("rb") as f:
+        f.seek(start)
+        return f.read(length)
+
+
+@app.get("/api/images/{variant}/{filename:path}")
+async def get_image_variant(variant: str, filename: str, request: Request):
+    """
+    Liefert ein WebP-Vorschaubild (thumb / medium) zu einem taric_live.filename.
+    Vorschauen werden beim Upload oder hier lazy im Worker-Pool erzeugt und auf
+    Platte gecacht. Antwort mit starkem ETag, langem Cache-Control und Range-Support.
+    """
+    if variant not in taric_thumbnails.VARIANTS:
+        return JSONResponse(status_code=404, content={"error": f"Unbekannte Variante '{variant}'."})
+
+    def resolve() -> Optional[Path]:
+        conn = get_conn()
+        try:
+            return taric_image_store.resolve_image_path(conn, filename)
+        finally:
+            conn.close()
+
+    src = await asyncio.to_thread(resolve)
+    if src is None:
+        return JSONResponse(status_code=404, content={"error": "Bild nicht gefunden."})
+
+    etag = taric_thumbnails.etag_for(src, variant)
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "public, max-age=31536000, immutable",
+        "Accept-Ranges": "bytes",
+    }
+
+    if etag in (request.headers.get("if-none-match") or ""):
+        return Response(status_code=304, headers=headers)
+
+    try:
+        thumb_path = await asyncio.wrap_future(
+            taric_thumbnails.ensure_thumbnail_future(src, variant)
+        )
+    except taric_thumbnails.ThumbnailError as e:
+        return JSONResponse(status_code=500, content={"error": str(e)})
+
+    # Dateizugriffe im Thread: nur der angefragte Bereich wird gelesen
+    size = (await asyncio.to_thread(thumb_path.stat)).st_size
+
+    byte_range = None
+    if_range = request.headers.get("if-range")
+    if if_range is None or if_range == etag:
+        byte_range = taric_thumbnails.parse_range(request.headers.get("range"), size)
+
+    if byte_range is not None:
+        start, end = byte_range
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        body = await asyncio.to_thread(_read_slice, thumb_path, start, end - start + 1)
+        return Response(
+            content=body,
+            status_code=206,
+            media_type="image/webp",
+            headers=headers,
+        )
+
+    body = await asyncio.to_thread(thumb_path.read_bytes)
+    return Response(content=body, media_type="image/webp", headers=headers)
 
 
 @app.get("/api/taric_official_description/{taric_code}")
@@ -791,68 +907,100 @@ async def get_official_description(taric_code: str):
             content={"error": "Ungültiger TARIC-Code. Muss 10-stellig sein."},
         )
 
-    conn = get_conn()
-    cur = conn.cursor()
-
-    try:
-        # 2) Lookup in lokaler Referenz-DB
-        cur.execute(
-            """
-            SELECT description_de
-            FROM taric_reference
-            WHERE taric_code = ?
-            LIMIT 1
-            """,
-            (taric_code,),
-        )
-        row = cur.fetchone()
-
-        if row:
-            description = row["description_de"]
-            print(f"LOG: [EU-API-TEST] SUCCESS - Beschreibung für {taric_code} erfolgreich gefunden.")
-            return JSONResponse(
-                content={
-                    "taricCode": taric_code,
-                    "officialDescription": description,
-                    "source": "Local TARIC Reference DB (EU Data)",
-                }
-            )
+    # 2) Lookup im In-Memory-Index der Nomenklatur (aus taric_reference)
+    entry = taric_nomenclature.get_index().get(taric_code)
 
-        print(
-            f"LOG: [EU-API-TEST] WARNING - Code {taric_code} NICHT in 'taric_reference' gefunden (404 Not Found)."
-        )
+    if entry and entry.description("de"):
+        print(f"LOG: [EU-API-TEST] SUCCESS - Beschreibung für {taric_code} erfolgreich gefunden.")
         return JSONResponse(
-            status_code=404,
             content={
-                "error": "Code nicht in lokaler TARIC-Referenztabelle gefunden.",
-                "details": "Referenztabelle (taric_reference) muss mit EU-Daten befüllt werden. "
-                "API-Call kam an, aber der Code fehlt in der DB.",
-            },
+                "taricCode": taric_code,
+                "officialDescription": entry.description("de"),
+                "validFrom": entry.valid_from,
+                "validTo": entry.valid_to,
+                "ancestors": [
+                    {"taricCode": a.taric_code, "description": a.description("de")}
+                    for a in taric_nomenclature.get_index().ancestors(taric_code)
+                ],
+                "source": "Local TARIC Reference DB (EU Data)",
+            }
         )
 
-    except sqlite3.OperationalError as e:
-        print(
-            f"LOG: [EU-API-TEST] CRITICAL ERROR - Tabelle 'taric_reference' fehlt in DB. "
-            f"(500 Internal Server Error). Fehler: {e}"
-        )
+    print(
+        f"LOG: [EU-API-TEST] WARNING - Code {taric_code} NICHT in 'taric_reference' gefunden (404 Not Found)."
+    )
+    return JSONResponse(
+        status_code=404,
+        content={
+            "error": "Code nicht in lokaler TARIC-Referenztabelle gefunden.",
+            "details": "Referenztabelle (taric_reference) muss mit EU-Daten befüllt werden "
+            "(import_taric_nomenclature.py). API-Call kam an, aber der Code fehlt im Index.",
+        },
+    )
+
+
+def _entry_to_dict(entry: "taric_nomenclature.NomenclatureEntry", lang: str) -> dict:
+    return {
+        "taric_code": entry.taric_code,
+        "description": entry.description(lang),
+        "parent_code": entry.parent_code,
+        "level": entry.indent,
+        "valid_from": entry.valid_from,
+        "valid_to": entry.valid_to,
+        "is_leaf": entry.is_leaf,
+    }
+
+
+@app.get("/api/nomenclature/{prefix}")
+async def nomenclature_lookup(
+    prefix: str,
+    lang: str = Query("de", description="Sprachcode, z.B. 'de' oder 'en'"),
+    on_date: str | None = Query(None, description="Stichtag YYYYMMDD für die Gültigkeitsprüfung"),
+    limit: int = Query(200, description="max. Anzahl Codes im Präfixbereich"),
+):
+    """
+    Lokale Nomenklatur-Abfrage ohne Netzwerk: Eintrag zum 4/6/8/10-stelligen
+    Präfix, Vorfahren, direkte Unterpositionen und alle Codes im Präfixbereich.
+    """
+    if not prefix.isdigit() or len(prefix) not in (2, 4, 6, 8, 10):
         return JSONResponse(
-            status_code=500,
-            content={
-                "error": "Datenbankfehler: Tabelle 'taric_reference' fehlt.",
-                "details": f"Bitte DB-Schema prüfen. Originalfehler: {e}",
-            },
-        )
-    except Exception as e:
-        print(
-            f"LOG: [EU-API-TEST] UNKNOWN ERROR - Unerwarteter Fehler im Endpoint. "
-            f"(500 Internal Server Error). Fehler: {e}"
+            status_code=400,
+            content={"error": "Präfix muss 2, 4, 6, 8 oder 10 Ziffern haben."},
         )
+
+    index = taric_nomenclature.get_index()
+    entry = index.lookup_prefix(prefix)
+    if entry is None:
         return JSONResponse(
-            status_code=500,
-            content={"error": "Unerwarteter Serverfehler", "details": str(e)},
+            status_code=404,
+            content={"error": f"Präfix {prefix} nicht in der lokalen Nomenklatur.", "index_size": len(index)},
         )
+
+    codes = index.prefix_range(prefix)
+    return JSONResponse(
+        content={
+            "prefix": prefix,
+            "entry": _entry_to_dict(entry, lang),
+            "valid": entry.is_valid_on(on_date),
+            "ancestors": [_entry_to_dict(a, lang) for a in index.ancestors(entry.taric_code)],
+            "children": [_entry_to_dict(c, lang) for c in index.children(entry.taric_code)],
+            "codes_in_prefix": len(codes),
+            "codes": codes[: max(limit, 0)],
+        }
+    )
+
+
+@app.post("/api/nomenclature/reload")
+async def nomenclature_reload():
+    """Baut den In-Memory-Index nach einem Import neu auf."""
+    conn = get_conn()
+    try:
+        index = await asyncio.to_thread(taric_nomenclature.load_index, conn)
     finally:
         conn.close()
+    return JSONResponse(
+        content={"status": "ok", "index_size": len(index), "imported_at": index.imported_at}
+    )
 
 
 @app.get("/summary")
@@ -892,12 +1040,58 @@ async def summary():
     return JSONResponse(content=result)
 
 
+def _compute_evaluation_metrics(target_level: int, force: bool) -> dict:
+    conn = get_conn()
+    try:
+        return taric_analytics.get_evaluation_metrics(conn, target_level=target_level, force=force)
+    finally:
+        conn.close()
+
+
+@app.get("/api/analytics/evaluation")
+async def evaluation_analytics(
+    target_level: int = Query(10, description="Ab so vielen korrekten Stellen gilt ein Fall als richtig (Kalibrierung)"),
+    force: bool = Query(False, description="Cache ignorieren und neu berechnen"),
+):
+    """
+    Modellqualität aus taric_evaluation: Genauigkeit je Stellen-Ebene, je Kapitel,
+    Kalibrierung der confidence und Vergleich je Modell. Ergebnisse werden gecacht
+    und bei neuen Bewertungen invalidiert.
+    """
+    if target_level not in (2, 4, 6, 8, 10):
+        return JSONResponse(
+            status_code=400,
+            content={"error": "target_level muss 2, 4, 6, 8 oder 10 sein."},
+        )
+
+    try:
+        result = await asyncio.to_thread(_compute_evaluation_metrics, target_level, force)
+    except Exception as e:
+        traceback.print_exc()
+        return JSONResponse(
+            status_code=500,
+            content={"error": f"Fehler bei der Auswertung: {e}"},
+        )
+    return JSONResponse(content=result)
+
+
 @app.get("/health")
 async def health():
     """Einfache Health-Check-Route für Monitoring und Tests."""
     return {"status": "ok"}
 
 
+@app.get("/api/upstream/stats")
+async def upstream_stats():
+    """Zustand des HTTP-Clients, der Single-Flight-Abrufe, des Speicher-Caches, des Prefetchers und der Modell-Spuren."""
+    return {
+        **taric_http.stats(_official_single_flight),
+        "memory_cache": _official_memory_cache.stats(),
+        "prefetch": official_prefetcher.snapshot(),
+        "gemini_lanes": taric_classify.gemini_scheduler.snapshot(),
+    }
+
+
 @app.get("/api/taric_official_compare")
 async def taric_official_compare(
     code: str = Query(..., description="10-stelliger TARIC-Code, z.B. 8517120000"),
@@ -954,3 +1148,118 @@ async def taric_official_compare(
             },
             status_code=500,
         )
+
+
+async def _official_batch_miss(full_code: str, taric_prefix: str, digits: int, sim_date: str, lang: str) -> dict:
+    """Upstream-Abruf für den Batch-Endpoint; Fehler werden pro Eintrag gemeldet."""
+    try:
+        return await _fetch_official_uncached(full_code, taric_prefix, digits, sim_date, lang)
+    except httpx.HTTPStatusError as e:
+        error = f"HTTP-Fehler beim Abruf der EU-TARIC-Seite: {e.response.status_code} {e.response.reason_phrase}"
+    except httpx.HTTPError as e:
+        error = f"Netzwerkfehler beim Abruf der EU-TARIC-Seite: {str(e)}"
+    except Exception as e:
+        error = f"Interner Fehler beim TARIC-Vergleich: {str(e)}"
+    return {"error": error, "input_code": full_code, "used_prefix": taric_prefix, "digits": digits}
+
+
+@app.post("/api/taric_official_compare/batch")
+async def taric_official_compare_batch(payload: OfficialCompareBatchIn):
+    """
+    Offizielle Beschreibungen für viele Codes und Stellen-Ebenen in einem Request.
+
+    - Lokale Nomenklatur + Speicher-Cache ohne I/O
+    - restliche Cache-Treffer mit einer IN (...)-Abfrage
+    - Misses parallel (Upstream-Obergrenze + Single-Flight wie beim Einzelabruf)
+
+    stream=true liefert NDJSON (eine Zeile je Ergebnis, sobald es vorliegt),
+    sonst alle Ergebnisse gesammelt in Anfragereihenfolge.
+    """
+    sim_date = payload.sim_date or date.today().strftime("%Y%m%d")
+    lang = payload.lang
+    digit_levels = list(dict.fromkeys(d if d in (4, 6, 8, 10) else 4 for d in payload.digits)) or [4]
+    codes = list(dict.fromkeys((c or "").strip() for c in payload.codes))
+
+    if len(codes) * len(digit_levels) > MAX_OFFICIAL_BATCH:
+        return JSONResponse(
+            status_code=400,
+            content={"error": f"Zu viele Abfragen (max. {MAX_OFFICIAL_BATCH} Codes x Stellen)."},
+        )
+
+    results: Dict[tuple, dict] = {}
+    order: List[tuple] = []
+    pending: List[tuple] = []
+    for code in codes:
+        for digits in digit_levels:
+            order.append((code, digits))
+            if not code.isdigit() or len(code) != 10:
+                results[(code, digits)] = {
+                    "error": "TARIC-Code muss 10-stellig und numerisch sein.",
+                    "input_code": code,
+                    "digits": digits,
+                }
+                continue
+            fast = _official_fast_result(code, code[:digits], digits, sim_date, lang)
+            if fast is not None:
+                results[(code, digits)] = fast
+            else:
+                pending.append((code, digits))
+
+    # Cache-Treffer aus SQLite in einem Rutsch
+    if pending:
+        def load_cached() -> Dict[tuple, dict]:
+            conn = sqlite3.connect(DB_PATH)
+            try:
+                found = taric_official_cache.get_many(
+                    conn, [(code[:digits], digits, sim_date, lang) for code, digits in pending]
+                )
+                taric_official_cache.maybe_evict(conn)
+                return found
+            finally:
+                conn.close()
+
+        cached = await asyncio.to_thread(load_cached)
+        misses = []
+        for code, digits in pending:
+            entry = cached.get(taric_official_cache.make_key(code[:digits], digits, sim_date, lang))
+            if entry and entry["description"] is not None:
+                _official_memory_cache.set(
+                    (code[:digits], digits, sim_date, lang), (entry["description"], entry["source_url"])
+                )
+                results[(code, digits)] = _official_result(
+                    code, code[:digits], digits, sim_date, lang, entry["description"], entry["source_url"]
+                )
+            else:
+                misses.append((code, digits))
+        pending = misses
+
+    tasks = [
+        asyncio.ensure_future(_official_batch_miss(code, code[:digits], digits, sim_date, lang))
+        for code, digits in pending
+    ]
+
+    if payload.stream:
+        async def ndjson():
+            try:
+                for key in order:
+                    if key in results:
+                        yield json.dumps(results[key], ensure_ascii=False) + "\n"
+                for done in asyncio.as_completed(tasks):
+                    yield json.dumps(await done, ensure_ascii=False) + "\n"
+            finally:
+                for task in tasks:
+                    task.cancel()
+
+        return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+    for (code, digits), result in zip(pending, await asyncio.gather(*tasks)):
+        results[(code, digits)] = result
+    return JSONResponse(
+        content={
+            "sim_date": sim_date,
+            "lang": lang,
+            "count": len(order),
+            "fetched": len(pending),
+            "results": [results[key] for key in order],
+        }
+    )
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Benchmark der Extraktions-Engines für TARIC-Consultation-Seiten
+
+Funktion:
+- Lädt gespeicherte Consultation-Seiten (HTML-Dateien oder Ordner)
+  und/oder komprimiert gespeicherte Seiten aus taric_official_cache
+- Misst je verfügbarer Engine (selectolax, lxml, slice, bs4) die Laufzeit
+- Prüft, ob die Beschreibung mit der bisherigen bs4-Extraktion übereinstimmt
+
+Verwendung:
+    python3 benchmark_official_extract.py EU_VZTA_Ergebniss.html --prefix 8517
+    python3 benchmark_official_extract.py seiten/ --prefix 8517 --digits 4 --repeat 20
+    python3 benchmark_official_extract.py --from-db 50
+"""
+
+import argparse
+import os
+import sqlite3
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import List, Tuple
+
+import taric_official_extract
+from taric_official_cache import SOURCE_WEB
+from taric_storage_codec import decode_text
+
+DB_PATH = os.getenv("TARIC_DB_PATH", "taric_live.db")
+
+# (Name, HTML, Präfix, Stellen)
+Page = Tuple[str, str, str, int]
+
+
+def load_files(paths: List[Path], prefix: str, digits: int) -> List[Page]:
+    pages: List[Page] = []
+    for path in paths:
+        files = sorted(path.glob("*.htm*")) if path.is_dir() else [path]
+        for f in files:
+            pages.append((f.name, f.read_text(encoding="utf-8", errors="replace"), prefix, digits))
+    return pages
+
+
+def load_from_db(limit: int) -> List[Page]:
+    """Seiten, die mit TARIC_STORE_OFFICIAL_HTML=1 im Cache abgelegt wurden."""
+    if not Path(DB_PATH).exists():
+        return []
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        rows = conn.execute(
+            """
+            SELECT taric_code, digits, raw_payload
+              FROM taric_official_cache
+             WHERE source = ? AND raw_payload IS NOT NULL
+             LIMIT ?
+            """,
+            (SOURCE_WEB, limit),
+        ).fetchall()
+    except sqlite3.OperationalError:
+        rows = []
+    finally:
+        conn.close()
+    pages: List[Page] = []
+    for prefix, digits, html in rows:
+        text = decode_text(html)
+        if text:
+            pages.append((f"db:{prefix}", text, prefix, int(digits)))
+    return pages
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("paths", nargs="*", type=Path, help="HTML-Dateien oder Ordner")
+    parser.add_argument("--prefix", default="8517", help="TARIC-Präfix für Dateien (Standard: 8517)")
+    parser.add_argument("--digits", type=int, default=4, help="Stellen des Präfix (Standard: 4)")
+    parser.add_argument("--from-db", type=int, default=0, metavar="N", help="zusätzlich N Seiten aus taric_official_cache")
+    parser.add_argument("--repeat", type=int, default=10, help="Wiederholungen je Seite und Engine")
+    args = parser.parse_args()
+
+    pages = load_files(args.paths, args.prefix, args.digits)
+    if args.from_db:
+        pages += load_from_db(args.from_db)
+    if not pages:
+        raise SystemExit("Keine Seiten gefunden – Dateien angeben oder --from-db nutzen.")
+
+    engines = list(taric_official_extract.ENGINES)
+    total_kb = sum(len(p[1]) for p in pages) / 1024
+    print(f"[INFO] {len(pages)} Seiten ({total_kb:.0f} KB), Engines: {', '.join(engines)}")
+    print(f"[INFO] Standard-Engine: {taric_official_extract.default_engine()}")
+
+    reference = {}
+    if "bs4" in engines:
+        for name, html, prefix, digits in pages:
+            reference[name] = taric_official_extract.extract(html, prefix, digits, engine="bs4").description
+
+    print(f"\n{'Engine':<12}{'Median ms':>12}{'Mittel ms':>12}{'Seiten/s':>12}{'gleich bs4':>12}")
+    for engine in engines:
+        timings = []
+        same = 0
+        for name, html, prefix, digits in pages:
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                result = taric_official_extract.extract(html, prefix, digits, engine=engine)
+                timings.append((time.perf_counter() - started) * 1000)
+            if reference.get(name) == result.description:
+                same += 1
+        median = statistics.median(timings)
+        mean = statistics.fmean(timings)
+        agree = f"{same}/{len(pages)}" if reference else "-"
+        print(f"{engine:<12}{median:>12.2f}{mean:>12.2f}{1000 / mean:>12.0f}{agree:>12}")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\nAbgebrochen durch Benutzer.")
+        sys.exit(1)
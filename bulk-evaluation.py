@@ -4,25 +4,64 @@ TARIC Bulk Evaluation
 
 Funktion:
 - Nimmt Bilder aus data/taric_bulk_input
-- Schickt sie sequenziell an das FastAPI-Backend (/classify)
-- Wartet nach jedem Bild eine konfigurierbare Pause
+- Schickt sie an das FastAPI-Backend (/classify), optional mit mehreren Workern
+  (TARIC_BULK_WORKERS, Standard 1 = sequenziell)
+- Adaptive Taktung statt fester Pause: der Abstand zwischen zwei Anfragen
+  wird bei stabiler Latenz verkürzt, bei steigender Latenz und 429 verlängert
+- Eine gemeinsame Session mit Keep-Alive/Connection-Pool, getrennten
+  Connect-/Read-Timeouts und Wiederholung nur, wenn die Anfrage sicher nicht
+  verarbeitet wurde; Verbindungsstatistik am Ende des Laufs
+- --in-process: klassifiziert ohne HTTP direkt über taric_classify (gleiche
+  Pipeline wie /classify); das Bild wird nur einmal gelesen und per Hardlink
+  in den Bild-Store übernommen. Benötigt Zugriff auf taric_live.db und
+  GEMINI_API_KEY; Live-Events der Web-UI gibt es in diesem Modus nicht.
+- Token-Budget: Schätzung je Bild aus Bildgröße und bisherigem Verbrauch je
+  Größenklasse; gesendet wird nur, was noch in Lauf- und Tagesbudget passt.
+  --dry-run zeigt vorab Anzahl, geschätzte Tokens und Dauer
+- Schreibt je Lauf und je Datei (Status, Fehlercode, Latenz, Bytes, Tokens)
+  strukturierte Einträge (taric_bulk_runs.py); --report wertet Durchsatz,
+  Latenz-Perzentile, Fehler und Tokens je Lauf aus
 - Verschiebt erfolgreiche Bilder nach data/taric_bulk_done
 - Verschiebt dauerhafte Fehler nach data/taric_bulk_error
+- Führt ein Journal je Dateiinhalt (SHA-256, taric_bulk_journal.py): bereits
+  klassifizierte Bilder werden nie erneut gesendet, abgebrochene Läufe setzen
+  einfach fort, Fehler lassen sich je Fehlercode erneut versuchen
 - Beobachtet optional Token-Nutzung aus der Backend-Antwort
 
+Verwendung:
+    python3 bulk-evaluation.py
+    python3 bulk-evaluation.py --retry-errors HTTP_500,REQUEST_FAILED   # oder: all
+    python3 bulk-evaluation.py --status
+    python3 bulk-evaluation.py --in-process
+    python3 bulk-evaluation.py --dry-run
+    python3 bulk-evaluation.py --report --days 7
+
 Das Script ist bewusst defensiv:
-- Kein Parallelismus
-- Bricht bei Rate-Limits oder Backend-Ausfällen sauber ab
+- Ergebnisse werden in Eingabereihenfolge im Hauptthread geloggt und verschoben
+- Bricht nach wiederholten Rate-Limits (Kontingent erschöpft) sauber ab
 """
 
+import argparse
 import csv
 import os
 import sys
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, List, Optional, Any, Tuple
+from typing import Callable, Dict, List, NamedTuple, Optional, Any, Tuple
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from taric_bulk_journal import BulkJournal, DONE
+import taric_bulk_runs
+from taric_bulk_runs import BulkRunLog
+from taric_image_store import sha256_file
+import taric_lanes
+import taric_token_budget
+from taric_token_budget import TokenBudget, TokenEstimator
 
 
 # ---------------------------------------------------------------------------
@@ -36,19 +75,52 @@ INPUT_DIR = DATA_DIR / "taric_bulk_input"
 DONE_DIR = DATA_DIR / "taric_bulk_done"
 ERROR_DIR = DATA_DIR / "taric_bulk_error"
 LOG_FILE = DATA_DIR / "taric_bulk_log.csv"
+JOURNAL_PATH = Path(os.getenv("TARIC_BULK_JOURNAL", str(DATA_DIR / "taric_bulk_journal.db")))
 
 # Standard-Backend-Adresse kann per ENV überschrieben werden
 BACKEND_URL = os.getenv("TARIC_BACKEND_URL", "http://127.0.0.1:8000/classify")
 
-# Maximalanzahl Bilder pro Lauf
+# Maximalanzahl Bilder pro Lauf (0 = unbegrenzt, dann begrenzen nur die Token-Budgets)
 MAX_PER_RUN = int(os.getenv("TARIC_BULK_MAX_PER_RUN", "40"))
 
-# Pause nach jedem Bild (Sekunden)
+# Startwert für den Abstand zwischen zwei Anfragen (Sekunden), danach adaptiv
 SLEEP_SECONDS = float(os.getenv("TARIC_BULK_SLEEP_SECONDS", "10"))
 
-# Optionales Soft-Limit für Tokens pro Run (0 = deaktiviert)
+# Grenzen der adaptiven Taktung (MIN = MAX = SLEEP_SECONDS ergibt festen Takt)
+MIN_INTERVAL_SECONDS = float(os.getenv("TARIC_BULK_MIN_INTERVAL", "0.5"))
+MAX_INTERVAL_SECONDS = float(os.getenv("TARIC_BULK_MAX_INTERVAL", "120"))
+
+# Gleichzeitige Anfragen an das Backend
+WORKERS = max(1, int(os.getenv("TARIC_BULK_WORKERS", "1")))
+
+# Latenz über LATENCY_SLOWDOWN_FACTOR x Basiswert gilt als Überlast -> langsamer
+LATENCY_SLOWDOWN_FACTOR = 2.0
+
+# (Connect-, Read-Timeout) in Sekunden
+TIMEOUT = (
+    float(os.getenv("TARIC_BULK_CONNECT_TIMEOUT", "5")),
+    float(os.getenv("TARIC_BULK_READ_TIMEOUT", "60")),
+)
+
+# Wiederholungen bei Verbindungsfehlern bzw. 502/503 vom Proxy (Cloudflare)
+HTTP_RETRIES = int(os.getenv("TARIC_BULK_HTTP_RETRIES", "3"))
+
+# Nach so vielen 429 in Folge ist das Kontingent erschöpft -> Abbruch
+MAX_CONSECUTIVE_RATE_LIMITS = int(os.getenv("TARIC_BULK_MAX_RATE_LIMITS", "5"))
+
+# Ohne HTTP im selben Prozess klassifizieren (entspricht --in-process)
+IN_PROCESS = os.getenv("TARIC_BULK_IN_PROCESS", "0") == "1"
+
+# Token-Budget pro Run (0 = deaktiviert); Bilder werden vorab gegen die Schätzung zugelassen
 MAX_TOTAL_TOKENS_PER_RUN = int(os.getenv("TARIC_BULK_MAX_TOKENS", "0"))
 
+# Token-Budget pro Tag über alle Bulk-Läufe laut Journal (0 = deaktiviert)
+MAX_TOKENS_PER_DAY = int(os.getenv("TARIC_BULK_DAILY_TOKENS", "0"))
+
+# Gemini-Kontingent für die Dauer-Schätzung im Dry-Run (0 = unbekannt -> Startabstand)
+QUOTA_REQUESTS_PER_MINUTE = float(os.getenv("TARIC_GEMINI_RPM", "0"))
+QUOTA_TOKENS_PER_MINUTE = float(os.getenv("TARIC_GEMINI_TPM", "0"))
+
 # Erlaubte Dateiendungen (inkl. WEBP)
 ALLOWED_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp"}
 
@@ -88,7 +160,7 @@ def iter_input_files(limit: int) -> List[Path]:
             # Unbekannte Endung ignorieren – bleibt im Ordner liegen
             continue
         files.append(p)
-        if len(files) >= limit:
+        if limit and len(files) >= limit:
             break
     return files
 
@@ -190,6 +262,77 @@ def log_result(
     return int(total_tokens or 0)
 
 
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """
+    Gemeinsame Session für alle Worker (Keep-Alive, ein Pool-Platz je Worker).
+
+    /classify ist nicht idempotent (jeder Aufruf speichert eine Klassifikation).
+    Wiederholt wird daher nur, wenn die Anfrage das Backend nicht erreicht hat:
+    Verbindungsaufbau fehlgeschlagen oder 502/503 vom Proxy. Lese-Timeouts und
+    504 werden nicht wiederholt; 429 übernimmt die adaptive Taktung.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            retry = Retry(
+                total=HTTP_RETRIES,
+                connect=HTTP_RETRIES,
+                read=0,
+                status=HTTP_RETRIES,
+                other=0,
+                backoff_factor=1.0,
+                status_forcelist=(502, 503),
+                allowed_methods=frozenset({"POST"}),
+                respect_retry_after_header=True,
+                raise_on_status=False,
+            )
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=WORKERS, max_retries=retry)
+            session = requests.Session()
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            # Spur "bulk": das Backend bedient interaktive Anfragen (Web-UI) zuerst
+            session.headers.update({
+                "User-Agent": "TARIC-Bulk-Evaluation/1.0",
+                taric_lanes.LANE_HEADER: taric_lanes.BULK,
+            })
+            _session = session
+        return _session
+
+
+def close_session() -> None:
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+
+
+def connection_stats() -> Dict[str, Any]:
+    """Anfragen vs. neu aufgebaute Verbindungen über alle Pools der Session."""
+    requests_sent = 0
+    connections = 0
+    if _session is not None:
+        # Derselbe Adapter ist für http:// und https:// registriert -> nur einmal zählen
+        for adapter in {id(a): a for a in _session.adapters.values()}.values():
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools.get(key)
+                if pool is not None:
+                    requests_sent += pool.num_requests
+                    connections += pool.num_connections
+    reused = max(requests_sent - connections, 0)
+    return {
+        "requests": requests_sent,
+        "connections": connections,
+        "reused": reused,
+        "reuse_rate": reused / requests_sent if requests_sent else 0.0,
+    }
+
+
 def classify_file(path: Path) -> Tuple[str, Optional[dict], Optional[str], Optional[str]]:
     """
     Schickt eine Datei an das Backend und gibt zurück:
@@ -203,7 +346,7 @@ def classify_file(path: Path) -> Tuple[str, Optional[dict], Optional[str], Optio
     try:
         with path.open("rb") as f:
             files = {"file": (path.name, f, mime)}
-            resp = requests.post(BACKEND_URL, files=files, timeout=60)
+            resp = get_session().post(BACKEND_URL, files=files, timeout=TIMEOUT)
     except Exception as e:
         return "backend_error", None, "REQUEST_FAILED", str(e)
 
@@ -238,6 +381,279 @@ def classify_file(path: Path) -> Tuple[str, Optional[dict], Optional[str], Optio
     return "done", data, None, None
 
 
+class AdaptivePacer:
+    """
+    Gemeinsamer Takt für alle Worker (AIMD-artig):
+    - Erfolg bei stabiler Latenz: Abstand schrittweise verkürzen (x0.85)
+    - Latenz deutlich über dem Basiswert oder Fehler: Abstand verlängern
+    - 429: Abstand verdoppeln, alle Worker warten bis zum nächsten freien Slot
+    """
+
+    def __init__(self, interval: float, min_interval: float, max_interval: float) -> None:
+        self.min_interval = min_interval
+        self.max_interval = max(max_interval, min_interval)
+        self.interval = self._clamp(interval)
+        self.consecutive_rate_limits = 0
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+        self._latency_ewma: Optional[float] = None
+        self._latency_base: Optional[float] = None
+
+    def _clamp(self, value: float) -> float:
+        return min(self.max_interval, max(self.min_interval, value))
+
+    def wait(self, stop: threading.Event) -> bool:
+        """Reserviert den nächsten Slot und wartet darauf. True = Abbruch angefordert."""
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        delay = slot - now
+        return stop.wait(delay) if delay > 0 else stop.is_set()
+
+    def on_success(self, latency: float) -> None:
+        with self._lock:
+            self.consecutive_rate_limits = 0
+            ewma = latency if self._latency_ewma is None else 0.8 * self._latency_ewma + 0.2 * latency
+            self._latency_ewma = ewma
+            self._latency_base = ewma if self._latency_base is None else min(self._latency_base, ewma)
+            if ewma > LATENCY_SLOWDOWN_FACTOR * self._latency_base:
+                self.interval = self._clamp(self.interval * 1.5)
+            else:
+                self.interval = self._clamp(self.interval * 0.85)
+
+    def on_error(self) -> None:
+        with self._lock:
+            self.interval = self._clamp(self.interval * 1.25)
+
+    def on_rate_limit(self) -> int:
+        """Verlängert den Takt und sperrt alle Worker bis zum nächsten Slot. Rückgabe: 429 in Folge."""
+        with self._lock:
+            self.consecutive_rate_limits += 1
+            self.interval = self._clamp(max(self.interval * 2, 1.0))
+            self._next_slot = max(self._next_slot, time.monotonic() + self.interval)
+            return self.consecutive_rate_limits
+
+
+class WorkItem(NamedTuple):
+    path: Path
+    sha256: str
+    size_bucket: str
+
+
+class FileResult(NamedTuple):
+    status: str
+    data: Optional[dict]
+    error_code: Optional[str]
+    error_message: Optional[str]
+    latency_ms: Optional[float] = None  # letzter Aufruf; None = nicht gesendet
+    attempts: int = 0
+
+
+def process_file(
+    item: WorkItem,
+    estimate: int,
+    journal: BulkJournal,
+    budget: TokenBudget,
+    pacer: AdaptivePacer,
+    stop: threading.Event,
+    classify: Callable[[Path], Tuple[str, Optional[dict], Optional[str], Optional[str]]] = classify_file,
+) -> FileResult:
+    """
+    Worker: prüft das Token-Budget, wartet auf den Takt, klassifiziert und
+    wiederholt bei 429. Das Ergebnis steht im Journal, bevor der Hauptthread
+    die Datei verschiebt. Status "skipped" (Abbruch) bzw. "over_budget" =
+    nicht gesendet, Datei bleibt liegen.
+    """
+    if stop.is_set():
+        return FileResult("skipped", None, None, None)
+    if not budget.admit(estimate):
+        return FileResult("over_budget", None, None, None)
+
+    result = _send_with_retries(item.path, item.sha256, journal, pacer, stop, classify)
+    # Fehler ohne usage verbrauchen nichts; die Reservierung wird so oder so freigegeben
+    usage = ((result.data or {}).get("usage") or {}) if result.status == "done" else {}
+    budget.settle(estimate, usage.get("total_tokens"))
+    return result
+
+
+def _send_with_retries(
+    path: Path,
+    sha256: str,
+    journal: BulkJournal,
+    pacer: AdaptivePacer,
+    stop: threading.Event,
+    classify: Callable[[Path], Tuple[str, Optional[dict], Optional[str], Optional[str]]],
+) -> FileResult:
+    attempts = 0
+    while True:
+        if pacer.wait(stop):
+            return FileResult("skipped", None, None, None, attempts=attempts)
+
+        journal.claim(sha256)
+        attempts += 1
+        started = time.monotonic()
+        status, data, err_code, err_msg = classify(path)
+        latency = time.monotonic() - started
+
+        if status == "rate_limited":
+            if pacer.on_rate_limit() >= MAX_CONSECUTIVE_RATE_LIMITS:
+                journal.mark_pending(sha256)
+                stop.set()
+                return FileResult(status, data, err_code, err_msg, latency * 1000.0, attempts)
+            print(
+                f"  {path.name}: Rate-Limit, neuer Abstand {pacer.interval:.1f}s – neuer Versuch",
+                flush=True,
+            )
+            continue
+
+        if status == "done":
+            pacer.on_success(latency)
+            journal.mark_done(sha256, (data or {}).get("id"), data)
+        else:
+            pacer.on_error()
+            journal.mark_error(sha256, err_code, err_msg)
+        return FileResult(status, data, err_code, err_msg, latency * 1000.0, attempts)
+
+
+def collect_work(
+    journal: BulkJournal, retry_codes: Optional[List[str]], register: bool = True
+) -> List[WorkItem]:
+    """
+    Dateien aus INPUT (bis MAX_PER_RUN) plus – mit retry_codes – Dateien aus ERROR,
+    deren Journal-Fehlercode passt. Gleicher Inhalt wird nur einmal aufgenommen.
+    register=False (Dry-Run) schreibt nichts ins Journal.
+    """
+    candidates = iter_input_files(MAX_PER_RUN)
+    if retry_codes is not None:
+        for entry in journal.errors(retry_codes):
+            path = ERROR_DIR / entry["filename"]
+            if path.is_file() and path not in candidates:
+                candidates.append(path)
+
+    work: List[WorkItem] = []
+    seen = set()
+    for path in candidates:
+        try:
+            sha256 = sha256_file(path)
+        except OSError as e:
+            print(f"  {path.name}: nicht lesbar ({e}), übersprungen")
+            continue
+        if sha256 in seen:
+            continue  # Inhalt doppelt im Lauf – kommt im nächsten Lauf als "already_done"
+        seen.add(sha256)
+        width, height = taric_token_budget.image_size(path)
+        bucket = taric_token_budget.size_bucket(width, height)
+        if register:
+            journal.register(sha256, path.name, width, height, bucket)
+        work.append(WorkItem(path, sha256, bucket))
+        if MAX_PER_RUN and len(work) >= MAX_PER_RUN:
+            break
+    return work
+
+
+def make_budget(journal: BulkJournal) -> Tuple[TokenEstimator, TokenBudget]:
+    estimator = TokenEstimator(journal.bucket_history())
+    budget = TokenBudget(
+        run_limit=MAX_TOTAL_TOKENS_PER_RUN,
+        daily_limit=MAX_TOKENS_PER_DAY,
+        used_today=journal.tokens_today() if MAX_TOKENS_PER_DAY > 0 else 0,
+    )
+    return estimator, budget
+
+
+def print_dry_run(journal: BulkJournal, retry_codes: Optional[List[str]]) -> None:
+    """Vorschau ohne Senden: Anzahl, Tokens und Dauer sowie Zulassung gegen die Budgets."""
+    work = collect_work(journal, retry_codes, register=False)
+    done = [w for w in work if (journal.get(w.sha256) or {}).get("state") == DONE]
+    todo = [w for w in work if w not in done]
+    estimator, budget = make_budget(journal)
+    used_today = budget.used_today
+
+    admitted = 0
+    admitted_tokens = 0
+    for item in todo:
+        estimate = estimator.estimate(item.size_bucket)
+        if budget.admit(estimate):
+            budget.settle(estimate, estimate)
+            admitted += 1
+            admitted_tokens += estimate
+    total_tokens = sum(estimator.estimate(w.size_bucket) for w in todo)
+    minutes = taric_token_budget.estimate_minutes(
+        len(todo), total_tokens, QUOTA_REQUESTS_PER_MINUTE, QUOTA_TOKENS_PER_MINUTE,
+        SLEEP_SECONDS / WORKERS,
+    )
+
+    print(f"Dry-Run: {len(work)} Bild(er), davon {len(done)} bereits klassifiziert (werden nur verschoben)")
+    counts: Dict[str, int] = {}
+    for item in todo:
+        counts[item.size_bucket] = counts.get(item.size_bucket, 0) + 1
+    for bucket, info in estimator.describe(counts).items():
+        print(f"  Größenklasse {bucket:<8} {counts[bucket]:>5} × ≈{info['estimate']} Tokens ({info['samples']} Messwerte)")
+    quota = (
+        f"{QUOTA_REQUESTS_PER_MINUTE:g} Anfragen/min, {QUOTA_TOKENS_PER_MINUTE:g} Tokens/min"
+        if QUOTA_REQUESTS_PER_MINUTE or QUOTA_TOKENS_PER_MINUTE
+        else f"Startabstand {SLEEP_SECONDS}s bei {WORKERS} Worker(n)"
+    )
+    print(f"{len(todo)} Bild(er) ≈ {total_tokens} Tokens ≈ {minutes:.0f} Minuten ({quota})")
+    if MAX_TOTAL_TOKENS_PER_RUN or MAX_TOKENS_PER_DAY:
+        print(
+            f"Budget: Lauf {MAX_TOTAL_TOKENS_PER_RUN or 'unbegrenzt'}, Tag {MAX_TOKENS_PER_DAY or 'unbegrenzt'} "
+            f"(heute verbraucht {used_today}) -> "
+            f"{admitted} Bild(er) ≈ {admitted_tokens} Tokens zugelassen"
+        )
+
+
+def print_run_report(days: float) -> None:
+    since = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(time.time() - days * 86400))
+    runs = BulkRunLog(JOURNAL_PATH)
+    try:
+        report = runs.report(since)
+    finally:
+        runs.close()
+    if not report:
+        print(f"Keine Bulk-Läufe seit {since}.")
+        return
+    print(f"Bulk-Läufe seit {since} ({JOURNAL_PATH}):")
+    for line in taric_bulk_runs.format_report(report):
+        print(line)
+
+
+def print_journal_status(journal: BulkJournal) -> None:
+    summary = journal.summary()
+    print(f"Journal: {JOURNAL_PATH}")
+    for state, count in sorted(summary["states"].items()):
+        print(f"  {state:<10} {count}")
+    for code, count in sorted(summary["errors"].items()):
+        print(f"    Fehler {code}: {count}")
+
+
+def classify_file_in_process(path: Path) -> Tuple[str, Optional[dict], Optional[str], Optional[str]]:
+    """
+    Wie classify_file, aber direkt über taric_classify statt über /classify.
+    Fehlercodes entsprechen dem HTTP-Modus (HTTP_<status>), damit Journal
+    und --retry-errors in beiden Modi gleich funktionieren.
+    """
+    import taric_classify
+
+    try:
+        data = taric_classify.classify_path(path, lane=taric_lanes.BULK)
+    except taric_classify.ClassifyError as e:
+        if e.status == 429:
+            return "rate_limited", None, "RATE_LIMIT", e.message
+        return "http_error", None, f"HTTP_{e.status}", e.message
+    except Exception as e:
+        return "backend_error", None, "IN_PROCESS_FAILED", str(e)
+    return "done", data, None, None
+
+
+def file_size(path: Path) -> Optional[int]:
+    try:
+        return path.stat().st_size
+    except OSError:
+        return None
+
+
 def move_file(src: Path, dst_dir: Path) -> None:
     """Verschiebt eine Datei in das Zielverzeichnis (Zielverzeichnis wird angelegt)."""
     dst_dir.mkdir(parents=True, exist_ok=True)
@@ -251,62 +667,192 @@ def move_file(src: Path, dst_dir: Path) -> None:
 
 
 def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        "--retry-errors",
+        metavar="CODES",
+        help="Dateien aus taric_bulk_error mit diesen Fehlercodes erneut senden (kommagetrennt oder 'all')",
+    )
+    parser.add_argument("--status", action="store_true", help="Journal-Zusammenfassung anzeigen und beenden")
+    parser.add_argument("--dry-run", action="store_true", help="nur schätzen (Anzahl, Tokens, Dauer), nichts senden")
+    parser.add_argument("--report", action="store_true", help="Auswertung der Läufe (Durchsatz, Latenz, Fehler, Tokens)")
+    parser.add_argument("--days", type=float, default=7.0, help="Zeitraum für --report in Tagen (Standard: 7)")
+    parser.add_argument(
+        "--in-process",
+        action="store_true",
+        default=IN_PROCESS,
+        help="ohne HTTP direkt über taric_classify klassifizieren (Hardlink statt Upload)",
+    )
+    args = parser.parse_args()
+
+    if args.report:
+        print_run_report(args.days)
+        return
+
     ensure_dirs()
+    journal = BulkJournal(JOURNAL_PATH)
+    try:
+        if args.status:
+            print_journal_status(journal)
+            return
+        retry_codes = None
+        if args.retry_errors:
+            retry_codes = [] if args.retry_errors == "all" else [c.strip() for c in args.retry_errors.split(",") if c.strip()]
+        if args.dry_run:
+            print_dry_run(journal, retry_codes)
+            return
+        run(journal, retry_codes, in_process=args.in_process)
+    finally:
+        journal.close()
 
-    files = iter_input_files(MAX_PER_RUN)
-    if not files:
+
+def run(journal: BulkJournal, retry_codes: Optional[List[str]], in_process: bool = False) -> None:
+    work = collect_work(journal, retry_codes)
+    if not work:
         print("Keine passenden Dateien in data/taric_bulk_input gefunden.")
         return
 
-    print(f"Starte Bulk-Evaluation mit {len(files)} Datei(en).")
-    print(f"Backend: {BACKEND_URL}")
-    print(f"Pause zwischen Bildern: {SLEEP_SECONDS} Sekunden")
+    classify = classify_file
+    if in_process:
+        import taric_classify
+
+        taric_classify.init()
+        classify = classify_file_in_process
 
     writer = open_log_writer()
-    total_tokens_used = 0
+    runs = BulkRunLog(JOURNAL_PATH)
+    run_id = runs.start_run(
+        "in_process" if in_process else "http", None if in_process else BACKEND_URL, WORKERS, len(work)
+    )
 
-    try:
-        for idx, path in enumerate(files, start=1):
-            print(f"[{idx}/{len(files)}] Sende {path.name} ...", flush=True)
+    # Bereits klassifizierte Inhalte (z.B. Abbruch vor dem Verschieben) nur nachziehen
+    files: List[WorkItem] = []
+    for item in work:
+        entry = journal.get(item.sha256)
+        if entry and entry["state"] == DONE:
+            log_result(writer, item.path.name, "already_done", entry["response"], None, None)
+            runs.record_file(run_id, item.path.name, item.sha256, "already_done", size=file_size(item.path))
+            move_file(item.path, DONE_DIR)
+            print(f"{item.path.name}: bereits klassifiziert (taric_live #{entry['taric_live_id']}), verschoben")
+        else:
+            files.append(item)
+    if not files:
+        writer.close()
+        runs.finish_run(run_id, taric_bulk_runs.COMPLETED)
+        runs.close()
+        return
 
-            status, data, err_code, err_msg = classify_file(path)
+    print(f"Starte Bulk-Evaluation mit {len(files)} Datei(en).")
+    print(f"Backend: {'in-process (taric_classify)' if in_process else BACKEND_URL}")
+    print(f"Worker: {WORKERS}, Startabstand {SLEEP_SECONDS}s "
+          f"(adaptiv {MIN_INTERVAL_SECONDS}–{MAX_INTERVAL_SECONDS}s)")
+
+    estimator, budget = make_budget(journal)
+    if MAX_TOTAL_TOKENS_PER_RUN or MAX_TOKENS_PER_DAY:
+        print(
+            f"Token-Budget: Lauf {MAX_TOTAL_TOKENS_PER_RUN or 'unbegrenzt'}, "
+            f"Tag {MAX_TOKENS_PER_DAY or 'unbegrenzt'} (heute verbraucht {budget.used_today})"
+        )
 
-            # Logging
-            tokens = log_result(writer, path.name, status, data, err_code, err_msg)
-            total_tokens_used += tokens
+    total_tokens_used = 0
+    over_budget = 0
+    pacer = AdaptivePacer(SLEEP_SECONDS, MIN_INTERVAL_SECONDS, MAX_INTERVAL_SECONDS)
+    stop = threading.Event()
+    started = time.monotonic()
+    processed = 0
+    run_status = taric_bulk_runs.FAILED
 
-            # Token-Softlimit prüfen
-            if MAX_TOTAL_TOKENS_PER_RUN > 0 and total_tokens_used > MAX_TOTAL_TOKENS_PER_RUN:
-                print(
-                    f"Token-Softlimit erreicht ({total_tokens_used} > "
-                    f"{MAX_TOTAL_TOKENS_PER_RUN}). Breche ab."
+    try:
+        with ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="taric-bulk") as pool:
+            futures = [
+                pool.submit(
+                    process_file, item, estimator.estimate(item.size_bucket),
+                    journal, budget, pacer, stop, classify,
                 )
-                # Datei noch nicht verschieben, damit sie beim nächsten Lauf erneut drankommt
-                break
-
-            # Reaktion auf Status
-            if status == "done":
-                move_file(path, DONE_DIR)
-                print(f"  -> OK, verschoben nach {DONE_DIR.name}")
-            elif status == "rate_limited":
-                print("  -> Rate-Limit erkannt, breche Bulk-Run ab.")
-                # Datei im INPUT lassen, damit sie beim nächsten Run dran kommt
-                break
-            elif status in ("http_error", "backend_error"):
-                move_file(path, ERROR_DIR)
-                print(f"  -> Fehler ({err_code}), verschoben nach {ERROR_DIR.name}")
-            else:
-                # Unbekannter Status – sicherheitshalber in ERROR
-                move_file(path, ERROR_DIR)
-                print(f"  -> Unbekannter Status '{status}', verschoben nach {ERROR_DIR.name}")
-
-            # Pause zwischen den Bildern
-            if idx < len(files):
-                time.sleep(SLEEP_SECONDS)
+                for item in files
+            ]
+            try:
+                # Auswertung in Eingabereihenfolge: Log und Verschieben nur im Hauptthread.
+                # Nach einem Abbruch werden laufende Anfragen noch sauber verbucht.
+                for idx, (item, future) in enumerate(zip(files, futures), start=1):
+                    path = item.path
+                    result = future.result()
+                    status, data, err_code, err_msg = result[:4]
+                    if status == "skipped":
+                        continue
+                    runs.record_file(
+                        run_id, path.name, item.sha256, status, err_code,
+                        result.latency_ms, file_size(path), result.attempts, data,
+                    )
+                    if status == "over_budget":
+                        # Nicht gesendet – bleibt für den nächsten Lauf/Tag liegen
+                        over_budget += 1
+                        continue
+
+                    print(f"[{idx}/{len(files)}] {path.name}", flush=True)
+                    processed += 1
+
+                    # Logging
+                    tokens = log_result(writer, path.name, status, data, err_code, err_msg)
+                    total_tokens_used += tokens
+
+                    # Token-Softlimit prüfen
+                    if (
+                        MAX_TOTAL_TOKENS_PER_RUN > 0
+                        and total_tokens_used > MAX_TOTAL_TOKENS_PER_RUN
+                        and not stop.is_set()
+                    ):
+                        print(
+                            f"Token-Softlimit erreicht ({total_tokens_used} > "
+                            f"{MAX_TOTAL_TOKENS_PER_RUN}). Breche ab."
+                        )
+                        stop.set()
+                        # Datei bleibt liegen; der nächste Lauf verschiebt sie laut Journal ohne neuen Aufruf
+                        continue
+
+                    # Reaktion auf Status
+                    if status == "done":
+                        move_file(path, DONE_DIR)
+                        print(f"  -> OK, verschoben nach {DONE_DIR.name}")
+                    elif status == "rate_limited":
+                        print("  -> Rate-Limit hält an, breche Bulk-Run ab.")
+                        # Datei im INPUT lassen, damit sie beim nächsten Run dran kommt
+                        stop.set()
+                    elif status in ("http_error", "backend_error"):
+                        move_file(path, ERROR_DIR)
+                        print(f"  -> Fehler ({err_code}), verschoben nach {ERROR_DIR.name}")
+                    else:
+                        # Unbekannter Status – sicherheitshalber in ERROR
+                        move_file(path, ERROR_DIR)
+                        print(f"  -> Unbekannter Status '{status}', verschoben nach {ERROR_DIR.name}")
+            except BaseException:
+                stop.set()
+                raise
+        run_status = taric_bulk_runs.STOPPED if stop.is_set() else taric_bulk_runs.COMPLETED
 
     finally:
         writer.close()
-        print(f"Fertig. Insgesamt geschätzte Tokens in diesem Lauf: {total_tokens_used}")
+        elapsed = time.monotonic() - started
+        print(
+            f"Fertig. {processed} Datei(en) in {elapsed:.0f}s, "
+            f"letzter Abstand {pacer.interval:.1f}s."
+        )
+        print(f"Insgesamt geschätzte Tokens in diesem Lauf: {total_tokens_used}")
+        if over_budget:
+            print(f"{over_budget} Datei(en) nicht gesendet, Token-Budget ausgeschöpft – bleiben liegen.")
+        conn_stats = connection_stats()
+        if conn_stats["requests"]:
+            print(
+                f"HTTP: {conn_stats['requests']} Anfragen über {conn_stats['connections']} "
+                f"Verbindung(en), wiederverwendet: {conn_stats['reuse_rate']:.0%}"
+            )
+        runs.finish_run(
+            run_id, run_status,
+            http_requests=conn_stats["requests"] or None,
+            http_connections=conn_stats["connections"] or None,
+        )
+        runs.close()
+        close_session()
 
 
 if __name__ == "__main__":
@@ -3,6 +3,8 @@
 import sqlite3
 from pathlib import Path
 
+from taric_nomenclature import ensure_reference_schema
+
 # Basis-Konfiguration aus backend.py übernommen
 BASE_DIR = Path(__file__).resolve().parent
 DB_PATH = BASE_DIR / "taric_live.db"
@@ -14,23 +16,12 @@ def create_taric_reference_table():
     # Der conn-Teil ist ähnlich Ihrer get_conn() Funktion
     conn = sqlite3.connect(DB_PATH)
     conn.row_factory = sqlite3.Row
-    cur = conn.cursor()
     
     print("DB-Verbindung erfolgreich hergestellt.")
     
     try:
-        cur.execute(
-            """
-            CREATE TABLE IF NOT EXISTS taric_reference (
-                taric_code     TEXT PRIMARY KEY NOT NULL,
-                cn_code        TEXT,
-                hs_chapter     TEXT,
-                description_de TEXT,
-                description_en TEXT,
-                legal_base     TEXT
-            )
-            """
-        )
+        # Basistabelle + Hierarchie-/Gültigkeitsspalten (siehe taric_nomenclature.py)
+        ensure_reference_schema(conn)
         conn.commit()
         print("----------------------------------------------------------------------")
         print("✅ SUCCESS: Tabelle 'taric_reference' wurde erfolgreich erstellt/geprüft.")
@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""
+TARIC Dataset-Export (ersetzt die Kopierlogik aus export_dataset.sh)
+
+Funktion:
+- Konsistenter Snapshot der Live-DB über die SQLite Online-Backup-API
+  (kein `cp` einer Datei, in die das Backend gerade schreibt)
+- Streamt taric_live + taric_evaluation als JSONL (oder Parquet) direkt in
+  ein ZIP-Archiv – konstanter Speicherbedarf, kein Staging-Verzeichnis
+- Inkrementelle Exporte über Wasserzeichen: nur neue Klassifikationen,
+  neu/erneut bewertete Fälle und deren Bilder
+- Manifest mit Anzahl Datensätzen, Bildern und Wasserzeichen im Archiv
+
+Verwendung:
+    python3 export_dataset.py                  # inkrementell, JSONL
+    python3 export_dataset.py --full           # alles, ignoriert Wasserzeichen
+    python3 export_dataset.py --format parquet # benötigt pyarrow
+    python3 export_dataset.py --with-db        # DB-Snapshot zusätzlich ins Archiv
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import zipfile
+from pathlib import Path
+from typing import Any, Dict, Iterator, List
+
+try:
+    import pyarrow as pa  # optional, nur für --format parquet
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+import taric_image_store
+from taric_storage_codec import decode_json
+
+
+# ---------------------------------------------------------------------------
+# Basis-Konfiguration
+# ---------------------------------------------------------------------------
+
+BASE_DIR = Path(__file__).resolve().parent
+DB_PATH = Path(os.getenv("TARIC_DB_PATH", str(BASE_DIR / "taric_live.db")))
+EXPORT_BASE_DIR = BASE_DIR / "export"
+STATE_FILE = EXPORT_BASE_DIR / "export_state.json"
+
+# Zeilen pro fetchmany / Parquet-Row-Group
+BATCH_SIZE = 1000
+
+EXPORT_WHERE = """
+    WHERE l.id > ?
+       OR (e.reviewed_at IS NOT NULL AND e.reviewed_at > ?)
+"""
+
+EXPORT_SQL = """
+    SELECT
+        l.id                   AS taric_live_id,
+        l.created_at           AS created_at,
+        l.filename             AS filename,
+        l.taric_code           AS taric_code,
+        l.cn_code              AS cn_code,
+        l.hs_chapter           AS hs_chapter,
+        l.confidence           AS confidence,
+        l.short_reason         AS short_reason,
+        l.alternatives_json    AS alternatives_json,
+        l.raw_response_json    AS raw_response_json,
+        e.id                   AS evaluation_id,
+        e.correct_digits       AS correct_digits,
+        e.reviewer             AS reviewer,
+        e.comment              AS comment,
+        e.superviser_bewertung AS superviser_bewertung,
+        e.reviewed_at          AS reviewed_at
+    FROM taric_live l
+    LEFT JOIN taric_evaluation e
+      ON e.taric_live_id = l.id
+""" + EXPORT_WHERE + """
+    ORDER BY l.id
+"""
+
+COUNT_SQL = """
+    SELECT COUNT(*)
+    FROM taric_live l
+    LEFT JOIN taric_evaluation e
+      ON e.taric_live_id = l.id
+""" + EXPORT_WHERE
+
+
+# ---------------------------------------------------------------------------
+# Snapshot + Wasserzeichen
+# ---------------------------------------------------------------------------
+
+
+def snapshot_db(src_path: Path, dst_path: Path) -> None:
+    """
+    Erstellt einen konsistenten Snapshot über die Online-Backup-API.
+    Das Backend kann währenddessen weiter schreiben.
+    """
+    src = sqlite3.connect(f"file:{src_path}?mode=ro", uri=True)
+    dst = sqlite3.connect(dst_path)
+    try:
+        src.backup(dst, pages=1024)
+    finally:
+        dst.close()
+        src.close()
+
+
+def load_state() -> Dict[str, Any]:
+    if STATE_FILE.exists():
+        return json.loads(STATE_FILE.read_text(encoding="utf-8"))
+    return {"last_live_id": 0, "last_reviewed_at": ""}
+
+
+def save_state(state: Dict[str, Any]) -> None:
+    STATE_FILE.parent.mkdir(parents=True, exist_ok=True)
+    tmp = STATE_FILE.with_suffix(".tmp")
+    tmp.write_text(json.dumps(state, indent=2), encoding="utf-8")
+    tmp.replace(STATE_FILE)
+
+
+# ---------------------------------------------------------------------------
+# Zeilen streamen
+# ---------------------------------------------------------------------------
+
+
+def iter_rows(conn: sqlite3.Connection, last_live_id: int, last_reviewed_at: str) -> Iterator[Dict[str, Any]]:
+    """Liefert Exportzeilen batchweise (komprimierte JSON-Felder dekodiert)."""
+    cur = conn.execute(EXPORT_SQL, (last_live_id, last_reviewed_at))
+    while True:
+        batch = cur.fetchmany(BATCH_SIZE)
+        if not batch:
+            break
+        for r in batch:
+            row = dict(r)
+            row["alternatives"] = decode_json(row.pop("alternatives_json"), default=[])
+            row["raw_response"] = decode_json(row.pop("raw_response_json"), default={})
+            yield row
+
+
+def write_jsonl(zf: zipfile.ZipFile, arcname: str, rows: Iterator[Dict[str, Any]], on_row) -> int:
+    count = 0
+    with zf.open(arcname, "w", force_zip64=True) as fh:
+        for row in rows:
+            on_row(row)
+            fh.write(json.dumps(row, ensure_ascii=False).encode("utf-8"))
+            fh.write(b"\n")
+            count += 1
+    return count
+
+
+def write_parquet(zf: zipfile.ZipFile, arcname: str, rows: Iterator[Dict[str, Any]], on_row) -> int:
+    """
+    Schreibt Row-Groups à BATCH_SIZE direkt in den ZIP-Eintrag.
+    Verschachtelte Felder (alternatives, raw_response) werden als JSON-String abgelegt.
+    """
+    if pq is None:
+        raise SystemExit("FEHLER: --format parquet benötigt das Paket 'pyarrow'.")
+
+    schema = pa.schema(
+        [
+            ("taric_live_id", pa.int64()),
+            ("created_at", pa.string()),
+            ("filename", pa.string()),
+            ("taric_code", pa.string()),
+            ("cn_code", pa.string()),
+            ("hs_chapter", pa.string()),
+            ("confidence", pa.float64()),
+            ("short_reason", pa.string()),
+            ("evaluation_id", pa.int64()),
+            ("correct_digits", pa.int64()),
+            ("reviewer", pa.string()),
+            ("comment", pa.string()),
+            ("superviser_bewertung", pa.int64()),
+            ("reviewed_at", pa.string()),
+            ("alternatives", pa.string()),
+            ("raw_response", pa.string()),
+        ]
+    )
+
+    count = 0
+    with zf.open(arcname, "w", force_zip64=True) as fh:
+        writer = pq.ParquetWriter(fh, schema, compression="zstd")
+        try:
+            batch: List[Dict[str, Any]] = []
+            for row in rows:
+                on_row(row)
+                row["alternatives"] = json.dumps(row["alternatives"], ensure_ascii=False)
+                row["raw_response"] = json.dumps(row["raw_response"], ensure_ascii=False)
+                batch.append(row)
+                if len(batch) >= BATCH_SIZE:
+                    writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+                    count += len(batch)
+                    batch = []
+            if batch:
+                writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+                count += len(batch)
+        finally:
+            writer.close()
+    return count
+
+
+# ---------------------------------------------------------------------------
+# Main
+# ---------------------------------------------------------------------------
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--full", action="store_true", help="Vollexport, Wasserzeichen ignorieren")
+    parser.add_argument("--format", choices=("jsonl", "parquet"), default="jsonl")
+    parser.add_argument("--with-db", action="store_true", help="DB-Snapshot ins Archiv aufnehmen")
+    parser.add_argument("--no-images", action="store_true", help="keine Bilder exportieren")
+    parser.add_argument("--dry-run", action="store_true", help="Wasserzeichen nicht fortschreiben")
+    args = parser.parse_args()
+
+    print("== TARIC Export ==")
+    if not DB_PATH.exists():
+        raise SystemExit(f"FEHLER: Datenbank '{DB_PATH}' wurde nicht gefunden.")
+
+    state = {"last_live_id": 0, "last_reviewed_at": ""} if args.full else load_state()
+    mode = "full" if args.full else "incremental"
+    print(f"Modus: {mode} (ab taric_live.id > {state['last_live_id']}, "
+          f"reviewed_at > '{state['last_reviewed_at']}')")
+
+    ts = time.strftime("%Y%m%d_%H%M%S")
+    EXPORT_BASE_DIR.mkdir(parents=True, exist_ok=True)
+    archive_path = EXPORT_BASE_DIR / f"taric_export_{ts}_{mode}.zip"
+    n = 1
+    while archive_path.exists():
+        n += 1
+        archive_path = EXPORT_BASE_DIR / f"taric_export_{ts}_{mode}_{n}.zip"
+    partial_path = archive_path.with_suffix(".zip.partial")
+    prefix = f"taric_export_{ts}"
+
+    with tempfile.TemporaryDirectory(dir=EXPORT_BASE_DIR) as tmp_dir:
+        snapshot_path = Path(tmp_dir) / "taric_live_snapshot.db"
+        print("Erzeuge DB-Snapshot (Online-Backup-API) ...")
+        snapshot_db(DB_PATH, snapshot_path)
+
+        conn = sqlite3.connect(snapshot_path)
+        conn.row_factory = sqlite3.Row
+
+        pending = conn.execute(COUNT_SQL, (state["last_live_id"], state["last_reviewed_at"])).fetchone()[0]
+        if pending == 0 and not args.with_db:
+            conn.close()
+            print("Keine neuen oder geänderten Datensätze seit dem letzten Export.")
+            return
+
+        new_state = dict(state)
+        filenames: List[str] = []
+
+        def on_row(row: Dict[str, Any]) -> None:
+            if row["taric_live_id"] > new_state["last_live_id"]:
+                new_state["last_live_id"] = row["taric_live_id"]
+            if row["reviewed_at"] and row["reviewed_at"] > new_state["last_reviewed_at"]:
+                new_state["last_reviewed_at"] = row["reviewed_at"]
+            # Bilder nur für neue Klassifikationen (Bewertungs-Updates haben ihr Bild schon)
+            if row["filename"] and row["taric_live_id"] > state["last_live_id"]:
+                filenames.append(row["filename"])
+
+        try:
+            with zipfile.ZipFile(partial_path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+                rows = iter_rows(conn, state["last_live_id"], state["last_reviewed_at"])
+                if args.format == "parquet":
+                    n_rows = write_parquet(zf, f"{prefix}/taric_rows.parquet", rows, on_row)
+                else:
+                    n_rows = write_jsonl(zf, f"{prefix}/taric_rows.jsonl", rows, on_row)
+                print(f"{n_rows} Datensätze exportiert.")
+
+                n_images = 0
+                missing_images = 0
+                if not args.no_images:
+                    seen = set()
+                    for filename in filenames:
+                        if filename in seen:
+                            continue
+                        seen.add(filename)
+                        path = taric_image_store.resolve_image_path(conn, filename)
+                        if path is None:
+                            missing_images += 1
+                            continue
+                        # Bilder sind bereits komprimiert -> nur speichern
+                        zf.write(path, f"{prefix}/bilder_uploads/{filename}",
+                                 compress_type=zipfile.ZIP_STORED)
+                        n_images += 1
+                    print(f"{n_images} Bilder exportiert ({missing_images} fehlen).")
+
+                if args.with_db:
+                    zf.write(snapshot_path, f"{prefix}/taric_live.db")
+
+                manifest = {
+                    "exported_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+                    "mode": mode,
+                    "format": args.format,
+                    "rows": n_rows,
+                    "images": n_images,
+                    "missing_images": missing_images,
+                    "watermark_from": state,
+                    "watermark_to": new_state,
+                    "notes": [
+                        "Die Spalte 'filename' verweist auf Dateien unter bilder_uploads/.",
+                        "Evaluationsdaten sind pro Zeile eingebettet (evaluation_id, correct_digits, ...).",
+                    ],
+                }
+                zf.writestr(f"{prefix}/manifest.json", json.dumps(manifest, indent=2, ensure_ascii=False))
+        except BaseException:
+            partial_path.unlink(missing_ok=True)
+            raise
+        finally:
+            conn.close()
+
+    partial_path.replace(archive_path)
+
+    # Auch ein Vollexport setzt das Wasserzeichen auf den aktuellen Stand
+    if not args.dry_run:
+        save_state(new_state)
+
+    print()
+    print("FERTIG.")
+    print(f"ZIP-Archiv: {archive_path}")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\nAbgebrochen durch Benutzer.")
+        sys.exit(1)
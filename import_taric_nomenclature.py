@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+Bulk-Import der EU-TARIC-Nomenklatur nach taric_reference
+
+Funktion:
+- Liest einen Nomenklatur-Dump (CSV oder XML) von der Platte
+- Erkennt die Spalten/Felder anhand üblicher Bezeichnungen
+  (Goods code, Pr. suffix, Start date, End date, Language, Indent, Description)
+- Leitet die Hierarchie (parent_code) aus den Einrückungen ab
+- Schreibt alles per Upsert in einer Transaktion nach taric_reference
+  (pro Sprache eine Beschreibungsspalte, d.h. DE- und EN-Dump nacheinander importieren)
+
+Verwendung:
+    python3 import_taric_nomenclature.py nomenclature_de.csv --lang de
+    python3 import_taric_nomenclature.py nomenclature_en.xml --lang en
+    python3 import_taric_nomenclature.py dump.csv --lang de --delimiter ';'
+"""
+
+import argparse
+import csv
+import os
+import re
+import sqlite3
+import sys
+import time
+import xml.etree.ElementTree as ET
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+from taric_nomenclature import ensure_reference_schema, normalize_date, record_import
+
+BASE_DIR = Path(__file__).resolve().parent
+DB_PATH = Path(os.getenv("TARIC_DB_PATH", str(BASE_DIR / "taric_live.db")))
+
+# Normalisierte Feldnamen (klein, nur a-z0-9) -> internes Feld
+FIELD_ALIASES: Dict[str, str] = {
+    "goodscode": "code",
+    "goodsnomenclatureitemid": "code",
+    "tariccode": "code",
+    "code": "code",
+    "cncode": "code",
+    "prsuffix": "suffix",
+    "suffix": "suffix",
+    "productlinesuffix": "suffix",
+    "startdate": "valid_from",
+    "validitystartdate": "valid_from",
+    "validfrom": "valid_from",
+    "enddate": "valid_to",
+    "validityenddate": "valid_to",
+    "validto": "valid_to",
+    "language": "lang",
+    "lang": "lang",
+    "languageid": "lang",
+    "indent": "indent",
+    "indents": "indent",
+    "numberindents": "indent",
+    "description": "description",
+    "descr": "description",
+    "descriptiontext": "description",
+}
+
+# Produktlinien-Suffix für deklarierbare Zeilen; andere Suffixe sind Zwischenzeilen
+DECLARABLE_SUFFIX = "80"
+
+
+def _norm(name: str) -> str:
+    # Namespace aus XML-Tags entfernen, dann nur a-z0-9
+    name = name.rsplit("}", 1)[-1]
+    return re.sub(r"[^a-z0-9]", "", name.lower())
+
+
+def _map_record(raw: Dict[str, str]) -> Optional[Dict[str, str]]:
+    rec: Dict[str, str] = {}
+    for key, value in raw.items():
+        field = FIELD_ALIASES.get(_norm(key or ""))
+        if field and value is not None and field not in rec:
+            rec[field] = value.strip()
+    if not rec.get("code"):
+        return None
+
+    # "0101210000 80" -> Code + Suffix
+    code_parts = rec["code"].replace("\xa0", " ").split()
+    digits = re.sub(r"\D", "", code_parts[0])
+    if len(code_parts) > 1 and not rec.get("suffix"):
+        rec["suffix"] = code_parts[1]
+    if not digits:
+        return None
+    rec["code"] = digits.ljust(10, "0")[:10]
+    rec.setdefault("suffix", DECLARABLE_SUFFIX)
+    return rec
+
+
+def iter_csv(path: Path, delimiter: Optional[str]) -> Iterator[Dict[str, str]]:
+    with path.open("r", encoding="utf-8-sig", newline="") as f:
+        if delimiter is None:
+            sample = f.read(8192)
+            f.seek(0)
+            try:
+                delimiter = csv.Sniffer().sniff(sample, delimiters=",;\t|").delimiter
+            except csv.Error:
+                delimiter = ","
+        for raw in csv.DictReader(f, delimiter=delimiter):
+            rec = _map_record(raw)
+            if rec:
+                yield rec
+
+
+def iter_xml(path: Path) -> Iterator[Dict[str, str]]:
+    """
+    Streamt Datensätze per iterparse. Ein Datensatz ist jedes Element, dessen
+    Kindelemente (oder Attribute) ein Code-Feld enthalten.
+    """
+    for _event, elem in ET.iterparse(path, events=("end",)):
+        children = list(elem)
+        if not children and not elem.attrib:
+            continue
+        raw = dict(elem.attrib)
+        for child in children:
+            if len(child) == 0:
+                raw[child.tag] = (child.text or "")
+        if any(FIELD_ALIASES.get(_norm(k)) == "code" for k in raw):
+            rec = _map_record(raw)
+            if rec:
+                yield rec
+            elem.clear()
+
+
+def _parse_indent(value: Optional[str]) -> int:
+    if not value:
+        return 0
+    v = value.strip()
+    if v.isdigit():
+        return int(v)
+    return v.count("-")
+
+
+def select_current(records: Iterator[Dict[str, str]], lang: str) -> Dict[tuple, Dict[str, str]]:
+    """
+    Reduziert auf einen Datensatz je (Code, Suffix): bevorzugt den zuletzt
+    gestarteten Datensatz in der gewünschten Sprache.
+    """
+    selected: Dict[tuple, Dict[str, str]] = {}
+    for rec in records:
+        rec_lang = (rec.get("lang") or lang).lower()
+        if rec_lang[:2] != lang[:2]:
+            continue
+        rec["valid_from"] = normalize_date(rec.get("valid_from")) or ""
+        rec["valid_to"] = normalize_date(rec.get("valid_to")) or ""
+        key = (rec["code"], rec["suffix"])
+        current = selected.get(key)
+        if current is None or rec["valid_from"] >= current["valid_from"]:
+            selected[key] = rec
+    return selected
+
+
+def build_rows(selected: Dict[tuple, Dict[str, str]]) -> List[tuple]:
+    """
+    Leitet parent_code aus den Einrückungen ab und liefert Upsert-Parameter.
+    Kapitel (xx00000000) bilden die oberste Ebene, Positionen hängen darunter.
+    """
+    stack: List[tuple] = []  # (level, code)
+    parents: Dict[str, Optional[str]] = {}
+    levels: Dict[str, int] = {}
+    primary: Dict[str, Dict[str, str]] = {}
+
+    for (code, suffix), rec in sorted(selected.items()):
+        is_chapter = code[2:] == "00000000"
+        level = 0 if is_chapter else _parse_indent(rec.get("indent")) + 1
+
+        while stack and stack[-1][0] >= level:
+            stack.pop()
+        # Zwischenzeile mit gleichem Code (anderes Suffix) ist kein eigener Elternteil
+        parent = next((c for _lvl, c in reversed(stack) if c != code), None)
+        stack.append((level, code))
+
+        # Deklarierbare Zeile (Suffix 80) hat Vorrang vor Zwischenzeilen
+        if code not in primary or suffix == DECLARABLE_SUFFIX:
+            primary[code] = rec
+            parents[code] = parent
+            levels[code] = level
+
+    has_children = {p for p in parents.values() if p}
+
+    rows = []
+    for code, rec in primary.items():
+        rows.append(
+            (
+                code,
+                code[:8],
+                code[:2],
+                rec.get("description") or None,
+                parents[code],
+                levels[code],
+                rec["valid_from"] or None,
+                rec["valid_to"] or None,
+                0 if code in has_children else 1,
+            )
+        )
+    return rows
+
+
+def upsert_rows(conn: sqlite3.Connection, rows: List[tuple], lang: str) -> None:
+    desc_col = "description_en" if lang.startswith("en") else "description_de"
+    with conn:
+        conn.executemany(
+            f"""
+            INSERT INTO taric_reference (
+                taric_code, cn_code, hs_chapter, {desc_col},
+                parent_code, indent, valid_from, valid_to, is_leaf, legal_base
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 'EU_TARIC_IMPORT')
+            ON CONFLICT(taric_code) DO UPDATE SET
+                cn_code     = excluded.cn_code,
+                hs_chapter  = excluded.hs_chapter,
+                {desc_col}  = excluded.{desc_col},
+                parent_code = excluded.parent_code,
+                indent      = excluded.indent,
+                valid_from  = excluded.valid_from,
+                valid_to    = excluded.valid_to,
+                is_leaf     = excluded.is_leaf
+            """,
+            rows,
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("dump", type=Path, help="Nomenklatur-Datei (.csv oder .xml)")
+    parser.add_argument("--lang", default="de", help="Sprache der Beschreibungen (de/en)")
+    parser.add_argument("--delimiter", default=None, help="CSV-Trennzeichen (Standard: automatisch)")
+    args = parser.parse_args()
+
+    if not args.dump.exists():
+        raise SystemExit(f"Datei nicht gefunden: {args.dump}")
+
+    lang = args.lang.lower()
+    started = time.time()
+    print(f"[INFO] Lese {args.dump} (Sprache: {lang}) ...")
+
+    if args.dump.suffix.lower() == ".xml":
+        records = iter_xml(args.dump)
+    else:
+        records = iter_csv(args.dump, args.delimiter)
+
+    selected = select_current(records, lang)
+    rows = build_rows(selected)
+    print(f"[INFO] {len(selected)} Datensätze gelesen, {len(rows)} Codes nach Zusammenführung.")
+
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        with conn:
+            ensure_reference_schema(conn)
+        upsert_rows(conn, rows, lang)
+        total = conn.execute("SELECT COUNT(*) FROM taric_reference").fetchone()[0]
+        if rows:
+            with conn:
+                record_import(conn, lang, args.dump.name, len(rows))
+    finally:
+        conn.close()
+
+    print(f"[INFO] Import abgeschlossen in {time.time() - started:.1f}s – taric_reference enthält {total} Codes.")
+    print("[INFO] Backend neu starten oder POST /api/nomenclature/reload aufrufen, um den Index zu laden.")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\nAbgebrochen durch Benutzer.")
+        sys.exit(1)
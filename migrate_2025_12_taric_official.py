@@ -2,7 +2,7 @@
 """
 Migration: TARIC-Official-Cache + Review-Felder in taric_live.db
 
-- Legt Tabelle taric_official_cache an (falls nicht vorhanden)
+- Legt Tabelle taric_official_cache an bzw. stellt sie auf das einheitliche Schema um
 - Fügt Spalten in taric_live hinzu (falls nicht vorhanden)
 """
 
@@ -10,6 +10,8 @@ import sqlite3
 import os
 from contextlib import closing
 
+import taric_official_cache
+
 DB_PATH = os.getenv("TARIC_DB_PATH", "taric_live.db")
 
 
@@ -20,22 +22,9 @@ def column_exists(cursor, table_name: str, column_name: str) -> bool:
 
 
 def ensure_taric_official_cache(conn: sqlite3.Connection) -> None:
+    # Einheitliches Schema (inkl. Übernahme alter Formate) liegt in taric_official_cache.py
     with conn:
-        conn.execute("""
-            CREATE TABLE IF NOT EXISTS taric_official_cache (
-              id           INTEGER PRIMARY KEY AUTOINCREMENT,
-              taric_code   TEXT NOT NULL,
-              language     TEXT NOT NULL,
-              description  TEXT NOT NULL,
-              source       TEXT NOT NULL,
-              fetched_at   TEXT NOT NULL,
-              raw_payload  TEXT
-            );
-        """)
-        conn.execute("""
-            CREATE UNIQUE INDEX IF NOT EXISTS idx_taric_official_unique
-              ON taric_official_cache(taric_code, language);
-        """)
+        taric_official_cache.ensure_schema(conn)
 
 
 def ensure_taric_live_review_columns(conn: sqlite3.Connection) -> None:
@@ -48,6 +37,10 @@ def ensure_taric_live_review_columns(conn: sqlite3.Connection) -> None:
         if not column_exists(cur, "taric_live", "official_match_label"):
             conn.execute("ALTER TABLE taric_live ADD COLUMN official_match_label TEXT;")
 
+        # official_match_scored_at (score_official_match.py, für inkrementelle Läufe)
+        if not column_exists(cur, "taric_live", "official_match_scored_at"):
+            conn.execute("ALTER TABLE taric_live ADD COLUMN official_match_scored_at TEXT;")
+
         # official_reviewed_by
         if not column_exists(cur, "taric_live", "official_reviewed_by"):
             conn.execute("ALTER TABLE taric_live ADD COLUMN official_reviewed_by TEXT;")
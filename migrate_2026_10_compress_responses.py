@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Migration: raw_response_json + alternatives_json in taric_live komprimieren
+
+- Kodiert alle noch unkomprimierten Zeilen über taric_storage_codec
+- Optional: zstd-Dictionary über den vorhandenen Response-Korpus trainieren
+- Gibt einen Größenbericht (vorher/nachher, DB-Datei) aus
+- Optional: VACUUM, damit freigewordene Seiten an das Dateisystem zurückgehen
+
+Aufruf:
+    python3 migrate_2026_10_compress_responses.py                 # zlib
+    python3 migrate_2026_10_compress_responses.py --codec zstd --train-dict
+    python3 migrate_2026_10_compress_responses.py --report-only
+"""
+
+import argparse
+import os
+import sqlite3
+from contextlib import closing
+
+from taric_storage_codec import (
+    decode_text,
+    encode_text,
+    is_encoded,
+    stored_size,
+    train_zstd_dict,
+)
+
+DB_PATH = os.getenv("TARIC_DB_PATH", "taric_live.db")
+
+BATCH_SIZE = 500
+COLUMNS = ("raw_response_json", "alternatives_json")
+
+
+def _fmt_bytes(n: float) -> str:
+    for unit in ("B", "KB", "MB"):
+        if n < 1024:
+            return f"{n:.1f} {unit}"
+        n /= 1024
+    return f"{n:.1f} GB"
+
+
+def size_report(conn: sqlite3.Connection) -> dict:
+    """Summiert belegte Bytes pro Spalte und zählt komprimierte Zeilen."""
+    report = {col: {"bytes": 0, "rows": 0, "encoded": 0} for col in COLUMNS}
+    with closing(conn.cursor()) as cur:
+        cur.execute(f"SELECT {', '.join(COLUMNS)} FROM taric_live")
+        for row in cur:
+            for col, value in zip(COLUMNS, row):
+                if value is None:
+                    continue
+                report[col]["rows"] += 1
+                report[col]["bytes"] += stored_size(value)
+                if is_encoded(value):
+                    report[col]["encoded"] += 1
+
+        page_count = cur.execute("PRAGMA page_count").fetchone()[0]
+        page_size = cur.execute("PRAGMA page_size").fetchone()[0]
+        freelist = cur.execute("PRAGMA freelist_count").fetchone()[0]
+
+    report["db_file_bytes"] = page_count * page_size
+    report["db_free_bytes"] = freelist * page_size
+    return report
+
+
+def print_report(title: str, report: dict) -> None:
+    print(f"[INFO] {title}")
+    for col in COLUMNS:
+        r = report[col]
+        print(
+            f"         {col:<18} {_fmt_bytes(r['bytes']):>10}  "
+            f"({r['encoded']}/{r['rows']} komprimiert)"
+        )
+    print(f"         {'DB-Datei':<18} {_fmt_bytes(report['db_file_bytes']):>10}  "
+          f"(frei: {_fmt_bytes(report['db_free_bytes'])})")
+
+
+def train_dict_from_db(conn: sqlite3.Connection) -> None:
+    """Trainiert das zstd-Dictionary über alle vorhandenen raw_response_json-Werte."""
+    with closing(conn.cursor()) as cur:
+        cur.execute("SELECT raw_response_json FROM taric_live WHERE raw_response_json IS NOT NULL")
+        samples = []
+        for (value,) in cur:
+            text = decode_text(value)
+            if text:
+                samples.append(text.encode("utf-8"))
+    path = train_zstd_dict(samples)
+    print(f"[INFO] zstd-Dictionary trainiert ({len(samples)} Beispiele): {path}")
+
+
+def compress_rows(conn: sqlite3.Connection, codec: str) -> int:
+    """
+    Kodiert alle Zeilen, deren Felder noch als TEXT vorliegen.
+    Arbeitet in Batches, damit der Speicherbedarf konstant bleibt.
+    """
+    converted = 0
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            f"""
+            SELECT id, {', '.join(COLUMNS)}
+              FROM taric_live
+             WHERE id > ?
+             ORDER BY id
+             LIMIT ?
+            """,
+            (last_id, BATCH_SIZE),
+        ).fetchall()
+        if not rows:
+            break
+
+        updates = []
+        for row_id, raw_value, alt_value in rows:
+            last_id = row_id
+            if is_encoded(raw_value) and is_encoded(alt_value):
+                continue
+            updates.append(
+                (
+                    raw_value if is_encoded(raw_value) else encode_text(decode_text(raw_value), codec),
+                    alt_value if is_encoded(alt_value) else encode_text(decode_text(alt_value), codec),
+                    row_id,
+                )
+            )
+
+        if updates:
+            with conn:
+                conn.executemany(
+                    "UPDATE taric_live SET raw_response_json = ?, alternatives_json = ? WHERE id = ?",
+                    updates,
+                )
+            converted += len(updates)
+            print(f"[INFO] {converted} Zeilen komprimiert (bis id={last_id}) ...")
+
+    return converted
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--codec", choices=("zlib", "zstd"), default="zlib")
+    parser.add_argument("--train-dict", action="store_true",
+                        help="zstd-Dictionary vor der Migration neu trainieren")
+    parser.add_argument("--report-only", action="store_true",
+                        help="nur Größenbericht ausgeben, nichts ändern")
+    parser.add_argument("--vacuum", action="store_true",
+                        help="nach der Migration VACUUM ausführen")
+    args = parser.parse_args()
+
+    if not os.path.exists(DB_PATH):
+        raise SystemExit(f"DB '{DB_PATH}' nicht gefunden – bitte Pfad prüfen.")
+
+    print(f"[INFO] Verbinde mit DB: {DB_PATH}")
+    conn = sqlite3.connect(DB_PATH)
+
+    try:
+        before = size_report(conn)
+        print_report("Größenbericht vorher:", before)
+        if args.report_only:
+            return
+
+        if args.codec == "zstd" and args.train_dict:
+            train_dict_from_db(conn)
+
+        converted = compress_rows(conn, args.codec)
+        print(f"[INFO] Migration abgeschlossen, {converted} Zeilen umgeschrieben.")
+
+        if args.vacuum:
+            print("[INFO] VACUUM ...")
+            conn.execute("VACUUM")
+
+        after = size_report(conn)
+        print_report("Größenbericht nachher:", after)
+
+        old = sum(before[c]["bytes"] for c in COLUMNS)
+        new = sum(after[c]["bytes"] for c in COLUMNS)
+        if new:
+            print(f"[INFO] Faktor Spalten: {old / new:.1f}x ({_fmt_bytes(old)} -> {_fmt_bytes(new)})")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
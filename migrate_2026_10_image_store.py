@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Migration: flaches bilder_uploads/ -> inhaltsadressierter Image-Store
+
+- Hasht alle flach abgelegten Dateien in bilder_uploads/ (SHA-256)
+- Verschiebt sie in das Sharding-Layout ab/cd/<hash>.<ext>
+  (Duplikate werden dabei entfernt)
+- Schreibt taric_live.filename auf den neuen Store-Pfad um
+- Legt für jeden alten Dateinamen einen Alias an (Kompatibilitäts-Lookup)
+- Berechnet die Referenzzähler neu
+
+Aufruf:
+    python3 migrate_2026_10_image_store.py [--dry-run]
+"""
+
+import argparse
+import os
+import sqlite3
+from collections import defaultdict
+
+import taric_image_store
+from taric_image_store import IMAGE_DIR, sha256_file
+
+DB_PATH = os.getenv("TARIC_DB_PATH", "taric_live.db")
+
+
+def iter_flat_files():
+    """Alle Dateien direkt in IMAGE_DIR (Shard-Unterordner werden ignoriert)."""
+    for p in sorted(IMAGE_DIR.iterdir()):
+        if p.is_file() and not p.name.startswith("."):
+            yield p
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="nur zählen, nichts verschieben")
+    args = parser.parse_args()
+
+    if not os.path.exists(DB_PATH):
+        raise SystemExit(f"DB '{DB_PATH}' nicht gefunden – bitte Pfad prüfen.")
+    if not IMAGE_DIR.is_dir():
+        raise SystemExit(f"Bildverzeichnis '{IMAGE_DIR}' nicht gefunden.")
+
+    print(f"[INFO] Verbinde mit DB: {DB_PATH}")
+    print(f"[INFO] Bildverzeichnis: {IMAGE_DIR}")
+    conn = sqlite3.connect(DB_PATH)
+
+    try:
+        with conn:
+            taric_image_store.ensure_image_store_schema(conn)
+
+        files = list(iter_flat_files())
+        by_hash = defaultdict(list)
+        total_bytes = 0
+        for idx, path in enumerate(files, start=1):
+            by_hash[sha256_file(path)].append(path)
+            total_bytes += path.stat().st_size
+            if idx % 1000 == 0:
+                print(f"[INFO] {idx}/{len(files)} Dateien gehasht ...")
+
+        dup_files = sum(len(paths) - 1 for paths in by_hash.values())
+        dup_bytes = sum(
+            p.stat().st_size for paths in by_hash.values() for p in paths[1:]
+        )
+        print(
+            f"[INFO] {len(files)} Dateien, {len(by_hash)} eindeutige Inhalte, "
+            f"{dup_files} Duplikate ({dup_bytes / 1024 / 1024:.1f} MB von "
+            f"{total_bytes / 1024 / 1024:.1f} MB)"
+        )
+
+        if args.dry_run:
+            print("[INFO] Dry-Run – keine Änderungen.")
+            return
+
+        moved = 0
+        for sha256, paths in by_hash.items():
+            with conn:
+                for path in paths:
+                    legacy_name = path.name
+                    new_rel, _, _ = taric_image_store.put_file(
+                        conn, path, move=True, sha256=sha256
+                    )
+                    taric_image_store.add_alias(conn, legacy_name, sha256)
+                    conn.execute(
+                        "UPDATE taric_live SET filename = ? WHERE filename = ?",
+                        (new_rel, legacy_name),
+                    )
+                    moved += 1
+            if moved // 1000 != (moved - len(paths)) // 1000:
+                print(f"[INFO] {moved}/{len(files)} Dateien migriert ...")
+
+        with conn:
+            taric_image_store.recount_refs(conn)
+
+        missing = conn.execute(
+            """
+            SELECT COUNT(*) FROM taric_live
+             WHERE filename IS NOT NULL
+               AND filename NOT IN (SELECT rel_path FROM image_store)
+            """
+        ).fetchone()[0]
+
+        print(f"[INFO] Migration abgeschlossen: {moved} Dateien verschoben, {dup_files} Duplikate entfernt.")
+        if missing:
+            print(f"[WARN] {missing} taric_live-Zeilen verweisen auf Dateien, die nicht gefunden wurden.")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
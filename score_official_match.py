@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Batch-Job: official_match_score / official_match_label in taric_live füllen
+
+Funktion:
+- Vergleicht short_reason (Modellbegründung) mit der offiziellen Beschreibung
+  des vorhergesagten Codes (taric_reference, sonst taric_official_cache)
+- Ähnlichkeit = Kosinus über TF-IDF-gewichtete Zeichen-n-Gramme (3/4),
+  vollständig vektorisiert mit NumPy (dünne COO-Arrays, Hashing-Trick),
+  tausende Zeilen pro Batch ohne Python-Schleife je Zeile
+- Inkrementell: nur unbewertete Zeilen oder solche, deren offizielle
+  Beschreibung nach der letzten Bewertung neu geladen (Cache) bzw. neu
+  importiert wurde (taric_reference_imports)
+- Zeilen ohne Begründung erhalten das Label no_reason und keinen Score
+- Zurückschreiben per executemany, ein Commit je Batch
+
+Niedrige Scores = Begründung passt nicht zum Code -> Kandidaten für die Prüfung
+(sortieren nach official_match_score ASC).
+
+Verwendung:
+    python3 score_official_match.py              # inkrementell
+    python3 score_official_match.py --full       # alle Zeilen neu bewerten
+    python3 score_official_match.py --batch-size 5000
+"""
+
+import argparse
+import datetime
+import os
+import re
+import sqlite3
+import sys
+import time
+from pathlib import Path
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+import taric_nomenclature
+import taric_official_cache
+from migrate_2025_12_taric_official import ensure_taric_live_review_columns
+
+
+# ---------------------------------------------------------------------------
+# Basis-Konfiguration
+# ---------------------------------------------------------------------------
+
+BASE_DIR = Path(__file__).resolve().parent
+DB_PATH = Path(os.getenv("TARIC_DB_PATH", str(BASE_DIR / "taric_live.db")))
+
+BATCH_SIZE = 2000
+
+# Zeichen-n-Gramme und Größe des Hash-Raums
+NGRAM_SIZES = (3, 4)
+N_FEATURES = 1 << 20
+
+# Schwellen für official_match_label
+LABEL_MATCH = 0.15
+LABEL_PARTIAL = 0.05
+LABEL_NO_OFFICIAL = "no_official"
+LABEL_NO_REASON = "no_reason"
+
+_NON_WORD = re.compile(r"[\W_]+")
+
+# Offizielle Beschreibung je Zeile: lokale Nomenklatur vor Cache (10-stellig vor 8-stellig)
+SELECT_SQL = """
+    SELECT id, short_reason, official_description
+    FROM (
+        SELECT
+            l.id AS id,
+            l.short_reason AS short_reason,
+            l.official_match_label AS label,
+            l.official_match_scored_at AS scored_at,
+            COALESCE(
+                r.description_de,
+                (SELECT c.description FROM taric_official_cache c
+                  WHERE c.taric_code IN (l.taric_code, substr(l.taric_code, 1, 8))
+                    AND c.language = 'DE' AND c.description IS NOT NULL
+                  ORDER BY c.digits DESC, c.fetched_at DESC LIMIT 1)
+            ) AS official_description,
+            (SELECT MAX(c.fetched_at) FROM taric_official_cache c
+              WHERE c.taric_code IN (l.taric_code, substr(l.taric_code, 1, 8))
+                AND c.language = 'DE') AS official_fetched_at,
+            CASE WHEN r.taric_code IS NOT NULL
+                 THEN (SELECT MAX(i.imported_at) FROM taric_reference_imports i)
+            END AS reference_imported_at
+        FROM taric_live l
+        LEFT JOIN taric_reference r ON r.taric_code = l.taric_code
+        WHERE l.id > ?
+    )
+    WHERE ? = 1
+       OR scored_at IS NULL
+       OR (label = 'no_official' AND official_description IS NOT NULL)
+       OR (official_fetched_at IS NOT NULL AND official_fetched_at > scored_at)
+       OR (reference_imported_at IS NOT NULL AND reference_imported_at > scored_at)
+       OR (COALESCE(label, '') <> 'no_reason' AND TRIM(COALESCE(short_reason, '')) = '')
+    ORDER BY id
+    LIMIT ?
+"""
+
+UPDATE_SQL = """
+    UPDATE taric_live
+    SET official_match_score = ?, official_match_label = ?, official_match_scored_at = ?
+    WHERE id = ?
+"""
+
+
+# ---------------------------------------------------------------------------
+# Vektorisierung
+# ---------------------------------------------------------------------------
+
+
+def _normalize(texts: Sequence[str]) -> List[str]:
+    # Leerzeichen als Wortgrenze, damit n-Gramme an Wortanfang/-ende eigene Merkmale sind
+    return [" " + _NON_WORD.sub(" ", (t or "").lower()).strip() + " " for t in texts]
+
+
+def ngram_features(texts: Sequence[str]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Dünne Termfrequenz-Matrix im COO-Format: (doc, feature, count), sortiert nach
+    (doc, feature). n-Gramme werden über alle Texte gleichzeitig gehasht.
+    """
+    padded = _normalize(texts)
+    lengths = np.fromiter((len(t) for t in padded), dtype=np.int64, count=len(padded))
+    chars = np.frombuffer("".join(padded).encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+    doc_of_char = np.repeat(np.arange(len(padded), dtype=np.int64), lengths)
+
+    keys = []
+    for n in NGRAM_SIZES:
+        count = len(chars) - n + 1
+        if count <= 0:
+            continue
+        # n-Gramme, die über eine Textgrenze reichen, verwerfen
+        valid = doc_of_char[:count] == doc_of_char[n - 1:n - 1 + count]
+        h = np.full(count, np.uint64(n), dtype=np.uint64)
+        for k in range(n):
+            h = h * np.uint64(1000003) + chars[k:k + count]  # Überlauf (mod 2^64) ist gewollt
+        feature = (h % np.uint64(N_FEATURES)).astype(np.int64)
+        keys.append(doc_of_char[:count][valid] * N_FEATURES + feature[valid])
+
+    if not keys:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, empty.astype(np.float64)
+    unique, counts = np.unique(np.concatenate(keys), return_counts=True)
+    return unique // N_FEATURES, unique % N_FEATURES, counts.astype(np.float64)
+
+
+def tfidf(doc: np.ndarray, feature: np.ndarray, count: np.ndarray, n_docs: int) -> np.ndarray:
+    """Sublineare TF * geglättete IDF, je Dokument L2-normiert. Rückgabe: Gewichte je COO-Eintrag."""
+    _, inverse, df = np.unique(feature, return_inverse=True, return_counts=True)
+    idf = np.log((1.0 + n_docs) / (1.0 + df)) + 1.0
+    weight = (1.0 + np.log(count)) * idf[inverse]
+    norms = np.sqrt(np.bincount(doc, weights=weight * weight, minlength=n_docs))
+    norms[norms == 0] = 1.0
+    return weight / norms[doc]
+
+
+def pair_similarity(left: Sequence[str], right: Sequence[str]) -> np.ndarray:
+    """Kosinus-Ähnlichkeit zwischen left[i] und right[i] für alle i auf einmal."""
+    n = len(left)
+    if n == 0:
+        return np.empty(0)
+    doc, feature, count = ngram_features(list(left) + list(right))
+    weight = tfidf(doc, feature, count, 2 * n)
+
+    # Beide Seiten auf den Paar-Index abbilden und gemeinsame Merkmale per Schnittmenge finden
+    is_left = doc < n
+    key_left = doc[is_left] * N_FEATURES + feature[is_left]
+    key_right = (doc[~is_left] - n) * N_FEATURES + feature[~is_left]
+    common, idx_left, idx_right = np.intersect1d(
+        key_left, key_right, assume_unique=True, return_indices=True
+    )
+    products = weight[is_left][idx_left] * weight[~is_left][idx_right]
+    return np.clip(np.bincount(common // N_FEATURES, weights=products, minlength=n), 0.0, 1.0)
+
+
+def labels_for(scores: np.ndarray) -> np.ndarray:
+    return np.where(scores >= LABEL_MATCH, "match", np.where(scores >= LABEL_PARTIAL, "partial", "mismatch"))
+
+
+# ---------------------------------------------------------------------------
+# Batch-Lauf
+# ---------------------------------------------------------------------------
+
+
+def ensure_schema(conn: sqlite3.Connection) -> None:
+    with conn:
+        taric_nomenclature.ensure_reference_schema(conn)
+        taric_official_cache.ensure_schema(conn)
+        ensure_taric_live_review_columns(conn)
+
+
+def score_batch(rows: List[Tuple[int, str, str]], scored_at: str) -> List[Tuple]:
+    """
+    Parameter für UPDATE_SQL; Zeilen ohne Begründung bzw. ohne offizielle
+    Beschreibung erhalten nur das Label (Score NULL statt 0.0 = "mismatch").
+    """
+    params = []
+    with_official = []
+    for row in rows:
+        if not (row[1] or "").strip():
+            params.append((None, LABEL_NO_REASON, scored_at, row[0]))
+        elif not row[2]:
+            params.append((None, LABEL_NO_OFFICIAL, scored_at, row[0]))
+        else:
+            with_official.append(row)
+    if with_official:
+        scores = pair_similarity([r[1] for r in with_official], [r[2] for r in with_official])
+        labels = labels_for(scores)
+        params.extend(
+            (round(float(s), 4), str(lab), scored_at, r[0])
+            for s, lab, r in zip(scores, labels, with_official)
+        )
+    return params
+
+
+def run(conn: sqlite3.Connection, full: bool = False, batch_size: int = BATCH_SIZE) -> int:
+    # Gleiches Format wie taric_official_cache.fetched_at (UTC), damit der Vergleich greift
+    scored_at = datetime.datetime.utcnow().isoformat(timespec="seconds") + "Z"
+    last_id = 0
+    total = 0
+    while True:
+        rows = conn.execute(SELECT_SQL, (last_id, 1 if full else 0, batch_size)).fetchall()
+        if not rows:
+            break
+        started = time.perf_counter()
+        params = score_batch(rows, scored_at)
+        with conn:
+            conn.executemany(UPDATE_SQL, params)
+        last_id = rows[-1][0]
+        total += len(rows)
+        print(f"[INFO] {len(rows)} Zeilen bewertet (bis id {last_id}) in {time.perf_counter() - started:.2f}s")
+    return total
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--full", action="store_true", help="alle Zeilen neu bewerten")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    if not DB_PATH.exists():
+        raise SystemExit(f"DB '{DB_PATH}' nicht gefunden – bitte Pfad prüfen.")
+
+    print(f"[INFO] Verbinde mit DB: {DB_PATH}")
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        ensure_schema(conn)
+        total = run(conn, full=args.full, batch_size=max(args.batch_size, 1))
+        print(f"[INFO] Fertig: {total} Zeilen bewertet.")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\nAbgebrochen durch Benutzer.")
+        sys.exit(1)
@@ -0,0 +1,224 @@
+"""
+taric_analytics.py
+
+Verantwortung:
+- Modellqualität aus taric_evaluation berechnen (statt ad-hoc in auswertung.html)
+- Spaltenweises Laden der bewerteten Fälle (pandas) und vektorisierte Kennzahlen (NumPy):
+    * Genauigkeit je Stellen-Ebene (2/4/6/8/10 korrekte Stellen)
+    * Genauigkeit je HS-Kapitel
+    * Kalibrierung (Reliability-Kurve + ECE) der Modell-`confidence`
+    * Vergleich je Modell (taric_live.model_name)
+- Ergebnis-Cache, der bei neuen Bewertungen invalidiert wird
+"""
+
+from typing import Any, Dict, Optional, Tuple
+import logging
+import sqlite3
+import threading
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+DIGIT_LEVELS = np.array([2, 4, 6, 8, 10])
+CALIBRATION_BINS = 10
+UNKNOWN_MODEL = "unbekannt"
+
+_cache_lock = threading.Lock()
+_cache: Dict[Tuple, Dict[str, Any]] = {}
+_cache_generation = 0
+
+
+def invalidate_cache() -> None:
+    """Verwirft alle gecachten Auswertungen (z.B. nach save_evaluation)."""
+    global _cache_generation
+    with _cache_lock:
+        _cache.clear()
+        _cache_generation += 1
+
+
+def _fingerprint(conn: sqlite3.Connection) -> Tuple:
+    """
+    Günstiger Fingerabdruck über taric_evaluation, damit auch Bewertungen aus
+    anderen Prozessen den Cache invalidieren.
+    """
+    row = conn.execute(
+        "SELECT COUNT(*), MAX(id), MAX(reviewed_at) FROM taric_evaluation"
+    ).fetchone()
+    return tuple(row)
+
+
+def load_reviewed_frame(conn: sqlite3.Connection) -> pd.DataFrame:
+    """Lädt alle bewerteten Fälle spaltenweise in einen DataFrame."""
+    df = pd.read_sql_query(
+        """
+        SELECT
+            l.id                   AS taric_live_id,
+            l.taric_code           AS taric_code,
+            l.hs_chapter           AS hs_chapter,
+            l.confidence           AS confidence,
+            l.model_name           AS model_name,
+            e.correct_digits       AS correct_digits,
+            e.superviser_bewertung AS superviser_bewertung
+        FROM taric_evaluation e
+        JOIN taric_live l ON l.id = e.taric_live_id
+        WHERE e.correct_digits IS NOT NULL
+        """,
+        conn,
+    )
+
+    # Kapitel notfalls aus dem TARIC-Code ableiten
+    chapter = df["hs_chapter"].astype("string").str.strip().str[:2]
+    chapter = chapter.fillna(df["taric_code"].astype("string").str[:2])
+    df["hs_chapter"] = chapter.fillna("??")
+
+    df["model_name"] = df["model_name"].fillna(UNKNOWN_MODEL)
+    df["confidence"] = pd.to_numeric(df["confidence"], errors="coerce").clip(0.0, 1.0)
+    df["correct_digits"] = pd.to_numeric(df["correct_digits"], errors="coerce").fillna(0)
+    return df
+
+
+def _level_matrix(correct_digits: np.ndarray) -> np.ndarray:
+    """Bool-Matrix (n x Ebenen): True, wenn mind. so viele Stellen korrekt sind."""
+    return correct_digits[:, None] >= DIGIT_LEVELS[None, :]
+
+
+def _calibration(confidence: np.ndarray, correct: np.ndarray) -> Dict[str, Any]:
+    """Reliability-Kurve und Expected Calibration Error in einem Durchlauf."""
+    mask = ~np.isnan(confidence)
+    conf = confidence[mask]
+    hit = correct[mask].astype(float)
+    if conf.size == 0:
+        return {"bins": [], "ece": None, "n": 0}
+
+    bin_idx = np.minimum((conf * CALIBRATION_BINS).astype(int), CALIBRATION_BINS - 1)
+    counts = np.bincount(bin_idx, minlength=CALIBRATION_BINS)
+    conf_sum = np.bincount(bin_idx, weights=conf, minlength=CALIBRATION_BINS)
+    hit_sum = np.bincount(bin_idx, weights=hit, minlength=CALIBRATION_BINS)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean_conf = conf_sum / counts
+        accuracy = hit_sum / counts
+
+    filled = counts > 0
+    ece = float(np.sum(counts[filled] * np.abs(accuracy[filled] - mean_conf[filled])) / conf.size)
+
+    edges = np.linspace(0.0, 1.0, CALIBRATION_BINS + 1)
+    bins = [
+        {
+            "lower": round(float(edges[i]), 2),
+            "upper": round(float(edges[i + 1]), 2),
+            "n": int(counts[i]),
+            "mean_confidence": float(mean_conf[i]) if filled[i] else None,
+            "accuracy": float(accuracy[i]) if filled[i] else None,
+        }
+        for i in range(CALIBRATION_BINS)
+    ]
+    return {"bins": bins, "ece": ece, "n": int(conf.size)}
+
+
+def _grouped(df: pd.DataFrame, levels: np.ndarray, key: str) -> list:
+    """Genauigkeit je Ebene + Kennzahlen, gruppiert nach `key` (vektorisiert)."""
+    level_cols = [f"acc_{lvl}" for lvl in DIGIT_LEVELS]
+    frame = pd.DataFrame(levels, columns=level_cols, index=df.index)
+    frame[key] = df[key].values
+    frame["confidence"] = df["confidence"].values
+    frame["correct_digits"] = df["correct_digits"].values
+    frame["superviser_bewertung"] = pd.to_numeric(df["superviser_bewertung"], errors="coerce").values
+
+    agg = frame.groupby(key, sort=False).agg(
+        n=("correct_digits", "size"),
+        mean_correct_digits=("correct_digits", "mean"),
+        mean_confidence=("confidence", "mean"),
+        mean_superviser_bewertung=("superviser_bewertung", "mean"),
+        **{col: (col, "mean") for col in level_cols},
+    )
+    agg = agg.sort_values("n", ascending=False)
+
+    result = []
+    for name, row in agg.iterrows():
+        result.append(
+            {
+                key: name,
+                "n": int(row["n"]),
+                "mean_correct_digits": float(row["mean_correct_digits"]),
+                "mean_confidence": None if pd.isna(row["mean_confidence"]) else float(row["mean_confidence"]),
+                "mean_superviser_bewertung": None
+                if pd.isna(row["mean_superviser_bewertung"])
+                else float(row["mean_superviser_bewertung"]),
+                "accuracy_by_level": {
+                    str(lvl): float(row[f"acc_{lvl}"]) for lvl in DIGIT_LEVELS
+                },
+            }
+        )
+    return result
+
+
+def compute_metrics(df: pd.DataFrame, target_level: int = 10) -> Dict[str, Any]:
+    """
+    Berechnet alle Kennzahlen auf einem DataFrame aus load_reviewed_frame.
+    `target_level` legt fest, ab wie vielen korrekten Stellen ein Fall für die
+    Kalibrierung als "richtig" gilt.
+    """
+    n = len(df)
+    if n == 0:
+        return {
+            "n_reviewed": 0,
+            "accuracy_by_level": {str(lvl): None for lvl in DIGIT_LEVELS},
+            "by_chapter": [],
+            "by_model": [],
+            "calibration": {"bins": [], "ece": None, "n": 0},
+            "calibration_target_level": target_level,
+        }
+
+    correct_digits = df["correct_digits"].to_numpy(dtype=float)
+    levels = _level_matrix(correct_digits)
+    confidence = df["confidence"].to_numpy(dtype=float)
+
+    calibration = _calibration(confidence, correct_digits >= target_level)
+
+    by_model = _grouped(df, levels, "model_name")
+    for entry in by_model:
+        sel = (df["model_name"] == entry["model_name"]).to_numpy()
+        entry["ece"] = _calibration(confidence[sel], correct_digits[sel] >= target_level)["ece"]
+
+    return {
+        "n_reviewed": n,
+        "accuracy_by_level": {
+            str(lvl): float(acc) for lvl, acc in zip(DIGIT_LEVELS, levels.mean(axis=0))
+        },
+        "by_chapter": _grouped(df, levels, "hs_chapter"),
+        "by_model": by_model,
+        "calibration": calibration,
+        "calibration_target_level": target_level,
+    }
+
+
+def get_evaluation_metrics(
+    conn: sqlite3.Connection,
+    target_level: int = 10,
+    force: bool = False,
+) -> Dict[str, Any]:
+    """
+    Liefert die Kennzahlen aus dem Cache oder berechnet sie neu. Der Cache ist
+    an den Fingerabdruck von taric_evaluation gebunden.
+    """
+    fingerprint = _fingerprint(conn)
+    key = (fingerprint, target_level)
+
+    with _cache_lock:
+        generation = _cache_generation
+        cached: Optional[Dict[str, Any]] = None if force else _cache.get(key)
+    if cached is not None:
+        return {**cached, "from_cache": True}
+
+    metrics = compute_metrics(load_reviewed_frame(conn), target_level=target_level)
+
+    with _cache_lock:
+        # Während der Berechnung invalidiert -> Ergebnis nicht cachen
+        if generation == _cache_generation:
+            for stale in [k for k in _cache if k[0] != fingerprint]:
+                del _cache[stale]
+            _cache[key] = metrics
+    return {**metrics, "from_cache": False}
@@ -1,9 +1,11 @@
+import argparse
 import os
 import glob
 import json
 import sqlite3
 import time
 import mimetypes
+from pathlib import Path
 
 import google.generativeai as genai
 
@@ -157,17 +159,40 @@ def classify_and_store(conn: sqlite3.Connection, model, image_path: str) -> None
     conn.commit()
 
 
+def classify_into_live(image_paths: list) -> None:
+    """
+    Variante --live: gleiche Pipeline wie das Backend (/classify) im selben Prozess
+    über taric_classify – Bild-Store per Hardlink, Prüfung gegen die Nomenklatur,
+    Speicherung in taric_live statt taric_labels.
+    """
+    import taric_classify
+
+    taric_classify.init()
+    for i, path in enumerate(image_paths, start=1):
+        print(f"[{i}/{len(image_paths)}] Verarbeite {path} ...")
+        try:
+            result = taric_classify.classify_path(Path(path))
+        except taric_classify.ClassifyError as e:
+            print(f"Fehler bei {path}: {e.message}")
+        else:
+            print(f"  -> taric_live #{result['id']}: {result['taric_code']}")
+        time.sleep(0.4)  # kleine Pause gegen Rate-Limits
+
+    print("Fertig. Ergebnisse liegen in:", taric_classify.DB_PATH)
+
+
 # -----------------------
 # Hauptprogramm
 # -----------------------
 
 def main():
-    # Modell initialisieren
-    model = configure_gemini()
-
-    # DB öffnen/erzeugen
-    conn = sqlite3.connect(DB_PATH)
-    create_db(conn)
+    parser = argparse.ArgumentParser(description="TARIC-Klassifikation aller Bilder im Ordner 'bilder'")
+    parser.add_argument(
+        "--live",
+        action="store_true",
+        help="über taric_classify in taric_live speichern (wie /classify) statt in taric_dataset.db",
+    )
+    args = parser.parse_args()
 
     # Alle unterstützten Bild-Dateien einsammeln
     image_paths = sorted(
@@ -180,9 +205,19 @@ def main():
 
     if not image_paths:
         print("Keine Bilder im Ordner 'bilder' gefunden.")
-        conn.close()
         return
 
+    if args.live:
+        classify_into_live(image_paths)
+        return
+
+    # Modell initialisieren
+    model = configure_gemini()
+
+    # DB öffnen/erzeugen
+    conn = sqlite3.connect(DB_PATH)
+    create_db(conn)
+
     # Zum Testen ggf. begrenzen:
     # image_paths = image_paths[:5]
 
@@ -0,0 +1,185 @@
+"""
+taric_bulk_journal.py
+
+Verantwortung:
+- Zustands-Journal für bulk-evaluation.py (SQLite, eigene Datei neben den Bulk-Ordnern)
+- Schlüssel = SHA-256 des Dateiinhalts, unabhängig von Dateiname und Ordner
+- Zustände: pending -> in_flight -> done / error (inkl. taric_live-ID bzw. Fehlercode)
+- Bildmaße/Größenklasse und Token-Verbrauch je Bild als Historie für die
+  Budget-Schätzung (taric_token_budget.py)
+
+Damit sind Läufe wiederholbar, ohne doppelt abzurechnen: ein Bild, das schon
+"done" ist, wird nicht erneut an /classify geschickt – auch wenn der Lauf vor
+dem Verschieben der Datei abgebrochen ist. "in_flight" nach einem Absturz
+bedeutet, dass die Antwort verloren ging; die Datei wird erneut gesendet.
+"""
+
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import sqlite3
+import threading
+import time
+
+from taric_storage_codec import encode_json, decode_json
+
+PENDING = "pending"
+IN_FLIGHT = "in_flight"
+DONE = "done"
+ERROR = "error"
+
+SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS bulk_journal (
+    content_sha256 TEXT PRIMARY KEY,
+    filename       TEXT NOT NULL,
+    state          TEXT NOT NULL,
+    attempts       INTEGER NOT NULL DEFAULT 0,
+    taric_live_id  INTEGER,
+    error_code     TEXT,
+    error_message  TEXT,
+    response_json  TEXT,
+    created_at     TEXT NOT NULL,
+    updated_at     TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_bulk_journal_state ON bulk_journal(state, error_code);
+"""
+
+# Nachträglich ergänzte Spalten (Budget-Schätzung)
+EXTRA_COLUMNS = {
+    "image_width": "INTEGER",
+    "image_height": "INTEGER",
+    "size_bucket": "TEXT",
+    "total_tokens": "INTEGER",
+}
+
+
+def _now() -> str:
+    return time.strftime("%Y-%m-%d %H:%M:%S")
+
+
+class BulkJournal:
+    """Thread-safe: eine Verbindung, Schreibzugriffe hinter einem Lock, Autocommit."""
+
+    def __init__(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA_SQL)
+        cols = {row[1] for row in self._conn.execute("PRAGMA table_info(bulk_journal)")}
+        for name, sql_type in EXTRA_COLUMNS.items():
+            if name not in cols:
+                self._conn.execute(f"ALTER TABLE bulk_journal ADD COLUMN {name} {sql_type}")
+        self._lock = threading.Lock()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def get(self, sha256: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM bulk_journal WHERE content_sha256 = ?", (sha256,)
+            ).fetchone()
+        if row is None:
+            return None
+        entry = dict(row)
+        entry["response"] = decode_json(entry.pop("response_json"))
+        return entry
+
+    def register(self, sha256: str, filename: str, width: Optional[int] = None,
+                 height: Optional[int] = None, size_bucket: Optional[str] = None) -> None:
+        """Neue Datei als pending anlegen; bestehende Einträge behalten ihren Zustand."""
+        now = _now()
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT INTO bulk_journal (
+                    content_sha256, filename, state, image_width, image_height, size_bucket,
+                    created_at, updated_at
+                )
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(content_sha256) DO UPDATE SET
+                    filename     = excluded.filename,
+                    image_width  = COALESCE(excluded.image_width, image_width),
+                    image_height = COALESCE(excluded.image_height, image_height),
+                    size_bucket  = COALESCE(excluded.size_bucket, size_bucket)
+                """,
+                (sha256, filename, PENDING, width, height, size_bucket, now, now),
+            )
+
+    def claim(self, sha256: str) -> None:
+        """Direkt vor dem Senden: in_flight, Versuch zählen."""
+        with self._lock:
+            self._conn.execute(
+                """
+                UPDATE bulk_journal
+                SET state = ?, attempts = attempts + 1, updated_at = ?
+                WHERE content_sha256 = ?
+                """,
+                (IN_FLIGHT, _now(), sha256),
+            )
+
+    def mark_pending(self, sha256: str) -> None:
+        self._set(sha256, PENDING)
+
+    def mark_done(self, sha256: str, taric_live_id: Optional[int], response: Optional[dict]) -> None:
+        usage = (response or {}).get("usage") or {}
+        self._set(
+            sha256, DONE, taric_live_id=taric_live_id, response_json=encode_json(response),
+            total_tokens=usage.get("total_tokens"), error_code=None, error_message=None,
+        )
+
+    def mark_error(self, sha256: str, error_code: Optional[str], error_message: Optional[str]) -> None:
+        self._set(sha256, ERROR, error_code=error_code or "UNKNOWN", error_message=error_message)
+
+    def _set(self, sha256: str, state: str, **fields: Any) -> None:
+        assignments = ", ".join(["state = ?", "updated_at = ?"] + [f"{name} = ?" for name in fields])
+        sql = f"UPDATE bulk_journal SET {assignments} WHERE content_sha256 = ?"
+        with self._lock:
+            self._conn.execute(sql, (state, _now(), *fields.values(), sha256))
+
+    def errors(self, codes: Optional[Iterable[str]] = None) -> List[Dict[str, Any]]:
+        """Einträge im Zustand error, optional nur mit den angegebenen Fehlercodes."""
+        sql = "SELECT content_sha256, filename, error_code, attempts FROM bulk_journal WHERE state = ?"
+        params: List[Any] = [ERROR]
+        codes = list(codes or [])
+        if codes:
+            sql += f" AND error_code IN ({','.join('?' * len(codes))})"
+            params.extend(codes)
+        with self._lock:
+            return [dict(r) for r in self._conn.execute(sql, params)]
+
+    def bucket_history(self) -> Dict[str, Tuple[int, float]]:
+        """{size_bucket: (anzahl, summe total_tokens)} über alle abgeschlossenen Bilder."""
+        with self._lock:
+            rows = self._conn.execute(
+                """
+                SELECT size_bucket, COUNT(*), SUM(total_tokens)
+                FROM bulk_journal
+                WHERE state = ? AND total_tokens IS NOT NULL AND size_bucket IS NOT NULL
+                GROUP BY size_bucket
+                """,
+                (DONE,),
+            ).fetchall()
+        return {bucket: (count, float(total)) for bucket, count, total in rows}
+
+    def tokens_today(self) -> int:
+        """Token-Verbrauch der Bulk-Läufe seit Mitternacht (Ortszeit)."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COALESCE(SUM(total_tokens), 0) FROM bulk_journal WHERE state = ? AND updated_at >= ?",
+                (DONE, time.strftime("%Y-%m-%d 00:00:00")),
+            ).fetchone()
+        return int(row[0])
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            states = dict(self._conn.execute("SELECT state, COUNT(*) FROM bulk_journal GROUP BY state").fetchall())
+            errors = dict(
+                self._conn.execute(
+                    "SELECT error_code, COUNT(*) FROM bulk_journal WHERE state = ? GROUP BY error_code",
+                    (ERROR,),
+                ).fetchall()
+            )
+        return {"states": states, "errors": errors}
@@ -0,0 +1,241 @@
+"""
+taric_bulk_runs.py
+
+Verantwortung:
+- Strukturierte Lauf-Statistik für bulk-evaluation.py (SQLite, gleiche Datei
+  wie das Bulk-Journal)
+- bulk_runs: ein Eintrag je Lauf (Start/Ende, Modus, Worker, Abschlussstatus)
+- bulk_run_files: ein Eintrag je Datei-Ergebnis (Status, Fehlercode, Latenz,
+  Bytes, Tokens, Versuche)
+- Auswertung: Durchsatz, Latenz-Perzentile, Fehlerverteilung und Token-Summen
+  je Lauf – je Kennzahl eine Aggregat-Abfrage über den Zeitraum
+
+Ersetzt das Auswerten von data/taric_bulk_log.csv bzw. logs/bulk_runs/ von Hand;
+die CSV wird weiterhin geschrieben.
+"""
+
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+import sqlite3
+import threading
+import time
+
+RUNNING = "running"
+COMPLETED = "completed"
+STOPPED = "stopped"
+FAILED = "failed"
+
+SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS bulk_runs (
+    run_id         INTEGER PRIMARY KEY AUTOINCREMENT,
+    started_at     TEXT NOT NULL,
+    finished_at    TEXT,
+    status         TEXT NOT NULL,
+    mode           TEXT NOT NULL,
+    backend        TEXT,
+    workers        INTEGER,
+    files_planned  INTEGER,
+    http_requests  INTEGER,
+    http_connections INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_bulk_runs_started ON bulk_runs(started_at);
+
+CREATE TABLE IF NOT EXISTS bulk_run_files (
+    id                INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id            INTEGER NOT NULL REFERENCES bulk_runs(run_id),
+    filename          TEXT NOT NULL,
+    content_sha256    TEXT,
+    status            TEXT NOT NULL,
+    error_code        TEXT,
+    latency_ms        REAL,
+    bytes             INTEGER,
+    attempts          INTEGER,
+    prompt_tokens     INTEGER,
+    completion_tokens INTEGER,
+    total_tokens      INTEGER,
+    finished_at       TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_bulk_run_files_run ON bulk_run_files(run_id, status, error_code);
+CREATE INDEX IF NOT EXISTS idx_bulk_run_files_latency ON bulk_run_files(run_id, latency_ms);
+CREATE INDEX IF NOT EXISTS idx_bulk_run_files_finished ON bulk_run_files(finished_at);
+"""
+
+# Läufe im Auswertungszeitraum; wird in jede Kennzahl-Abfrage eingesetzt
+_RUNS_IN_RANGE = "SELECT run_id FROM bulk_runs WHERE started_at >= ?"
+
+THROUGHPUT_SQL = f"""
+    SELECT r.run_id, r.started_at, r.status, r.mode, r.workers,
+           COUNT(f.id) AS files,
+           SUM(f.latency_ms IS NOT NULL) AS sent,
+           COALESCE(SUM(f.bytes), 0) AS bytes,
+           (julianday(COALESCE(r.finished_at, MAX(f.finished_at))) - julianday(r.started_at)) * 86400.0
+               AS duration_s
+    FROM bulk_runs r
+    LEFT JOIN bulk_run_files f ON f.run_id = r.run_id
+    WHERE r.run_id IN ({_RUNS_IN_RANGE})
+    GROUP BY r.run_id
+    ORDER BY r.run_id
+"""
+
+# Perzentile nach Nearest-Rank: kleinster Wert mit Rang >= p * n
+LATENCY_SQL = f"""
+    SELECT run_id,
+           MIN(CASE WHEN rn >= 0.50 * n THEN latency_ms END) AS p50,
+           MIN(CASE WHEN rn >= 0.90 * n THEN latency_ms END) AS p90,
+           MIN(CASE WHEN rn >= 0.99 * n THEN latency_ms END) AS p99,
+           MAX(latency_ms) AS max_ms,
+           AVG(latency_ms) AS avg_ms
+    FROM (
+        SELECT run_id, latency_ms,
+               ROW_NUMBER() OVER (PARTITION BY run_id ORDER BY latency_ms) AS rn,
+               COUNT(*) OVER (PARTITION BY run_id) AS n
+        FROM bulk_run_files
+        WHERE latency_ms IS NOT NULL AND run_id IN ({_RUNS_IN_RANGE})
+    )
+    GROUP BY run_id
+"""
+
+ERRORS_SQL = f"""
+    SELECT run_id, status, COALESCE(error_code, '') AS error_code, COUNT(*) AS files
+    FROM bulk_run_files
+    WHERE run_id IN ({_RUNS_IN_RANGE})
+    GROUP BY run_id, status, error_code
+    ORDER BY run_id, files DESC
+"""
+
+TOKENS_SQL = f"""
+    SELECT run_id,
+           COALESCE(SUM(prompt_tokens), 0) AS prompt_tokens,
+           COALESCE(SUM(completion_tokens), 0) AS completion_tokens,
+           COALESCE(SUM(total_tokens), 0) AS total_tokens,
+           AVG(total_tokens) AS avg_tokens
+    FROM bulk_run_files
+    WHERE run_id IN ({_RUNS_IN_RANGE})
+    GROUP BY run_id
+"""
+
+
+def _now() -> str:
+    return time.strftime("%Y-%m-%d %H:%M:%S")
+
+
+class BulkRunLog:
+    """Thread-safe: eine Verbindung, Schreibzugriffe hinter einem Lock, Autocommit."""
+
+    def __init__(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA_SQL)
+        self._lock = threading.Lock()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def start_run(self, mode: str, backend: Optional[str], workers: int, files_planned: int) -> int:
+        with self._lock:
+            cur = self._conn.execute(
+                """
+                INSERT INTO bulk_runs (started_at, status, mode, backend, workers, files_planned)
+                VALUES (?, ?, ?, ?, ?, ?)
+                """,
+                (_now(), RUNNING, mode, backend, workers, files_planned),
+            )
+            return int(cur.lastrowid)
+
+    def finish_run(self, run_id: int, status: str, http_requests: Optional[int] = None,
+                   http_connections: Optional[int] = None) -> None:
+        with self._lock:
+            self._conn.execute(
+                """
+                UPDATE bulk_runs
+                SET finished_at = ?, status = ?, http_requests = ?, http_connections = ?
+                WHERE run_id = ?
+                """,
+                (_now(), status, http_requests, http_connections, run_id),
+            )
+
+    def record_file(
+        self,
+        run_id: int,
+        filename: str,
+        content_sha256: Optional[str],
+        status: str,
+        error_code: Optional[str] = None,
+        latency_ms: Optional[float] = None,
+        size: Optional[int] = None,
+        attempts: Optional[int] = None,
+        response: Optional[dict] = None,
+    ) -> None:
+        usage = (response or {}).get("usage") or {}
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT INTO bulk_run_files (
+                    run_id, filename, content_sha256, status, error_code, latency_ms, bytes,
+                    attempts, prompt_tokens, completion_tokens, total_tokens, finished_at
+                )
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    run_id, filename, content_sha256, status, error_code,
+                    None if latency_ms is None else round(latency_ms, 1), size, attempts,
+                    usage.get("prompt_tokens"), usage.get("completion_tokens"), usage.get("total_tokens"),
+                    _now(),
+                ),
+            )
+
+    def report(self, since: str) -> Dict[int, Dict[str, Any]]:
+        """
+        Kennzahlen je Lauf ab since ("YYYY-MM-DD HH:MM:SS"):
+        {run_id: {"run": {...}, "latency": {...}, "errors": [...], "tokens": {...}}}
+        """
+        with self._lock:
+            runs = self._conn.execute(THROUGHPUT_SQL, (since,)).fetchall()
+            latency = self._conn.execute(LATENCY_SQL, (since,)).fetchall()
+            errors = self._conn.execute(ERRORS_SQL, (since,)).fetchall()
+            tokens = self._conn.execute(TOKENS_SQL, (since,)).fetchall()
+
+        result: Dict[int, Dict[str, Any]] = {
+            row["run_id"]: {"run": dict(row), "latency": {}, "errors": [], "tokens": {}} for row in runs
+        }
+        for row in latency:
+            result[row["run_id"]]["latency"] = dict(row)
+        for row in errors:
+            result[row["run_id"]]["errors"].append(dict(row))
+        for row in tokens:
+            result[row["run_id"]]["tokens"] = dict(row)
+        return result
+
+
+def format_report(report: Dict[int, Dict[str, Any]]) -> List[str]:
+    """Textausgabe für bulk-evaluation.py --report."""
+    lines: List[str] = []
+    for run_id, entry in report.items():
+        run = entry["run"]
+        duration = max(run["duration_s"] or 0.0, 0.0)
+        per_minute = run["sent"] * 60.0 / duration if duration > 0 else 0.0
+        lines.append(
+            f"Lauf #{run_id} {run['started_at']} [{run['status']}, {run['mode']}, "
+            f"{run['workers']} Worker]: {run['files']} Datei(en), {run['sent']} gesendet "
+            f"in {duration:.0f}s ≈ {per_minute:.1f}/min, {run['bytes'] / 1e6:.1f} MB"
+        )
+        lat = entry["latency"]
+        if lat:
+            lines.append(
+                f"  Latenz ms: p50 {lat['p50']:.0f}, p90 {lat['p90']:.0f}, p99 {lat['p99']:.0f}, "
+                f"max {lat['max_ms']:.0f}, Ø {lat['avg_ms']:.0f}"
+            )
+        tok = entry["tokens"]
+        if tok and tok["total_tokens"]:
+            lines.append(
+                f"  Tokens: {tok['total_tokens']} gesamt (Prompt {tok['prompt_tokens']}, "
+                f"Antwort {tok['completion_tokens']}), Ø {tok['avg_tokens']:.0f} je Datei"
+            )
+        for err in entry["errors"]:
+            code = f" {err['error_code']}" if err["error_code"] else ""
+            lines.append(f"  {err['status']}{code}: {err['files']}")
+    return lines
@@ -0,0 +1,540 @@
+"""
+taric_classify.py
+
+Verantwortung:
+- Die Klassifikations-Pipeline als Bibliothek (bisher in backend.py /classify):
+    Bild in den Store -> Gemini -> Prüfung gegen die Nomenklatur -> taric_live
+- classify_bytes(): für Uploads (Backend)
+- classify_path(): für Dateien auf der Platte (bulk-evaluation.py, taric_batch_gemini.py);
+  das Bild wird nur einmal gelesen und per Hardlink in den Store übernommen
+  (Kopie nur, wenn kein Hardlink möglich ist, z.B. anderes Dateisystem)
+- Gemeinsam für alle Aufrufer im selben Prozess: Modell-Scheduler mit
+  Prioritäts-Spuren (taric_lanes.py: interactive vor bulk/batch),
+  Schreib-Lock für taric_live, Nomenklatur-Index
+
+Fehler werden als ClassifyError mit HTTP-Status gemeldet (429 = Gemini-Kontingent
+erschöpft bzw. kein freier Platz in der bulk/batch-Spur), damit Backend und Skripte sie gleich behandeln. Das Backend hängt
+Event-Bus und Prefetcher über add_store_hook() an.
+"""
+
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+import copy
+import json
+import mimetypes
+import os
+import sqlite3
+import threading
+import time
+import traceback
+
+import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
+
+from taric_storage_codec import encode_json
+import taric_image_store
+import taric_lanes
+import taric_nomenclature
+import taric_thumbnails
+import taric_validation
+
+# --------------------------------------------------
+# Basis-Konfiguration
+# --------------------------------------------------
+
+BASE_DIR = Path(__file__).resolve().parent
+DB_PATH = Path(os.getenv("TARIC_DB_PATH", str(BASE_DIR / "taric_live.db")))
+
+IMAGE_DIR = taric_image_store.IMAGE_DIR
+
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+# GEMINI_MODEL_NAME = os.getenv("GEMINI_MODEL_NAME", "gemini-2.5-flash")
+GEMINI_MODEL_NAME = os.getenv("GEMINI_MODEL_NAME", "gemini-2.5-flash-lite")
+
+# Erlaubte Bildformate (inkl. WEBP)
+ALLOWED_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp"}
+ALLOWED_MIME_TYPES = {
+    "image/jpeg",
+    "image/png",
+    "image/webp",
+}
+
+if GEMINI_API_KEY:
+    genai.configure(api_key=GEMINI_API_KEY)
+else:
+    print("WARNUNG: GEMINI_API_KEY ist nicht gesetzt. /classify wird nicht funktionieren.")
+
+# Max. gleichzeitige Modellaufrufe je Prozess (Backend bzw. In-Process-Bulk)
+GEMINI_CONCURRENCY = int(os.getenv("TARIC_GEMINI_CONCURRENCY", "8"))
+
+# Davon immer für interaktive Anfragen (Web-UI) freigehalten; bulk/batch teilen
+# sich den Rest nach Gewicht und geben nach TARIC_LANE_MAX_WAIT Sekunden mit 429 auf
+GEMINI_INTERACTIVE_RESERVED = int(
+    os.getenv("TARIC_GEMINI_INTERACTIVE_RESERVED", str(max(GEMINI_CONCURRENCY // 4, 1)))
+)
+LANE_WEIGHTS = taric_lanes.parse_weights(os.getenv("TARIC_LANE_WEIGHTS", "bulk:3,batch:1"))
+LANE_MAX_WAIT = float(os.getenv("TARIC_LANE_MAX_WAIT", "30"))
+
+# Gezielte Rückfrage bei ungültigem Code (nur Text, mit gültigen Nachbar-Codes statt neuem Bildaufruf)
+VALIDATION_FOLLOWUP = os.getenv("TARIC_VALIDATION_FOLLOWUP", "1") == "1"
+
+# Systemprompt für das Modell (unverändert aus deiner Version)
+SYSTEM_PROMPT = """
+Du bist ein erfahrener EU-Zoll- und TARIC-Experte.
+Deine Aufgabe ist es, anhand eines Produktfotos den wahrscheinlichsten TARIC-Code
+für die Ware zu bestimmen.
+
+Rahmenbedingungen:
+- Verwende die Struktur der EU TARIC-Datenbank.
+- Gehe schrittweise vor:
+  1. Beschreibe kurz, was auf dem Bild zu sehen ist (Art der Ware, Material,
+     Verwendungszweck, besondere Merkmale).
+  2. Bestimme erst die wahrscheinliche HS-Position (4-stellig),
+     dann die 6-stellige Unterposition, anschließend die 8-stellige KN-Position
+     und zuletzt den 10-stelligen TARIC-Code.
+  3. Prüfe, ob besondere zollrechtliche Regelungen greifen könnten
+     (Medizinprodukt, Lebensmittel, Elektronik, Textil usw.).
+
+Ausgabeformat (immer als gültiges JSON, ohne zusätzlichen Text):
+
+{
+  "taric_code": "XXXXXXXXXX",
+  "cn_code": "XXXXXXXX",
+  "hs_chapter": "XX",
+  "confidence": 0.0,
+  "short_reason": "kurze Begründung in 2–4 Sätzen",
+  "possible_alternatives": [
+    {
+      "taric_code": "YYYYYYYYYY",
+      "short_reason": "warum dieser Code ebenfalls in Frage kommt"
+    }
+  ]
+}
+
+Regeln:
+- Antworte ausschließlich in diesem JSON-Format.
+- Wenn du sehr unsicher bist, gib trotzdem den besten Schätzwert und senke 'confidence'.
+- Verwende nur plausible TARIC-Codes, die formal zur beschriebenen Ware passen.
+
+Wichtig:
+- Nur das JSON-Objekt zurückgeben, keine zusätzliche Erklärung, kein Markdown,
+  keine Codeblöcke.
+"""
+
+USER_TEXT = "Bestimme für dieses Produktfoto den TARIC-Code und gib nur das JSON aus."
+
+
+gemini_scheduler = taric_lanes.LaneScheduler(
+    GEMINI_CONCURRENCY, GEMINI_INTERACTIVE_RESERVED, LANE_WEIGHTS, LANE_MAX_WAIT
+)
+_db_write_lock = threading.Lock()
+_store_hooks: List[Callable[[Dict[str, Any]], None]] = []
+
+
+class ClassifyError(Exception):
+    """Fehler in der Pipeline; status entspricht dem HTTP-Status von /classify."""
+
+    def __init__(self, status: int, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+# --------------------------------------------------
+# DB-Helfer
+# --------------------------------------------------
+
+
+def get_conn() -> sqlite3.Connection:
+    """Öffnet eine SQLite-Connection mit Row-Access per Spaltennamen."""
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def init() -> None:
+    """
+    Für den Skriptbetrieb: Store-/Referenz-Tabellen sicherstellen und den
+    Nomenklatur-Index laden (im Backend erledigt das init_db beim Start).
+    """
+    conn = get_conn()
+    try:
+        found = conn.execute(
+            "SELECT name FROM sqlite_master WHERE type='table' AND name='taric_live'"
+        ).fetchone()
+        if not found:
+            raise RuntimeError(f"Tabelle taric_live fehlt in {DB_PATH} – Backend einmal starten.")
+        cols = {row["name"] for row in conn.execute("PRAGMA table_info(taric_live)")}
+        if "validation_json" not in cols:
+            conn.execute("ALTER TABLE taric_live ADD COLUMN validation_json TEXT")
+        taric_image_store.ensure_image_store_schema(conn)
+        conn.commit()
+        if len(taric_nomenclature.get_index()) == 0:
+            taric_nomenclature.load_index(conn)
+    finally:
+        conn.close()
+    IMAGE_DIR.mkdir(parents=True, exist_ok=True)
+
+
+def add_store_hook(hook: Callable[[Dict[str, Any]], None]) -> None:
+    """hook(event) wird nach jeder gespeicherten Klassifikation aufgerufen."""
+    _store_hooks.append(hook)
+
+
+# --------------------------------------------------
+# Modell-Helfer
+# --------------------------------------------------
+
+
+def extract_json_from_text(raw: str) -> dict:
+    """
+    Extrahiert ein JSON-Objekt aus einer generierten Text-Antwort.
+    Entfernt ggf. Markdown-Codeblöcke (```json ... ```).
+    """
+    if not raw:
+        raise ValueError("Leere Modell-Antwort")
+
+    txt = raw.strip()
+
+    # Markdown-Codeblock entfernen
+    if txt.startswith("```"):
+        lines = txt.splitlines()
+        if lines and lines[0].startswith("```"):
+            lines = lines[1:]
+        if lines and lines[-1].startswith("```"):
+            lines = lines[:-1]
+        txt = "\n".join(lines).strip()
+
+    # Versuchen, das JSON anhand der äußeren Klammern zu finden
+    start = txt.find("{")
+    end = txt.rfind("}")
+    if start == -1 or end == -1 or end <= start:
+        raise ValueError("Keine JSON-Klammern in Modell-Antwort gefunden")
+
+    json_str = txt[start : end + 1]
+    return json.loads(json_str)
+
+
+def classify_with_gemini(
+    image_bytes: bytes, filename: str, content_type: Optional[str],
+    lane: str = taric_lanes.INTERACTIVE,
+) -> dict:
+    """
+    Ruft das Gemini-Modell mit Bild + Systemprompt auf und gibt ein
+    JSON-ähnliches Dict mit Standardfeldern + optionalem 'usage'-Block zurück.
+    """
+    if not GEMINI_API_KEY:
+        raise RuntimeError("GEMINI_API_KEY ist nicht gesetzt")
+
+    model = genai.GenerativeModel(GEMINI_MODEL_NAME)
+
+    # MIME-Type bestimmen; WEBP explizit zulassen. Bei unbekanntem oder
+    # leerem Typ wird defensiv image/jpeg verwendet.
+    mime = content_type or "image/jpeg"
+    if mime not in ALLOWED_MIME_TYPES:
+        mime = "image/jpeg"
+
+    with gemini_scheduler.slot(lane):
+        result = model.generate_content(
+            [
+                SYSTEM_PROMPT,
+                {
+                    "mime_type": mime,
+                    "data": image_bytes,
+                },
+            ]
+        )
+
+    raw_text = getattr(result, "text", None)
+    if not raw_text:
+        raise RuntimeError("Modell-Antwort war leer")
+
+    parsed = extract_json_from_text(raw_text)
+
+    # Token-Nutzung (usage_metadata) nach Möglichkeit übernehmen.
+    usage = getattr(result, "usage_metadata", None)
+    if usage is not None:
+        parsed["usage"] = {
+            "prompt_tokens": getattr(usage, "prompt_token_count", None),
+            "completion_tokens": getattr(usage, "candidates_token_count", None),
+            "total_tokens": getattr(usage, "total_token_count", None),
+        }
+
+    # Standardfelder absichern
+    parsed.setdefault("taric_code", None)
+    parsed.setdefault("cn_code", None)
+    parsed.setdefault("hs_chapter", None)
+    parsed.setdefault("confidence", 0.0)
+    parsed.setdefault("short_reason", "")
+    parsed.setdefault("possible_alternatives", [])
+
+    return parsed
+
+
+def _followup_with_gemini(prompt: str, lane: str = taric_lanes.INTERACTIVE) -> dict:
+    """Text-Rückfrage an das Modell; Rückgabe wie classify_with_gemini (inkl. usage)."""
+    model = genai.GenerativeModel(GEMINI_MODEL_NAME)
+    with gemini_scheduler.slot(lane):
+        result = model.generate_content([prompt])
+
+    raw_text = getattr(result, "text", None)
+    if not raw_text:
+        raise RuntimeError("Modell-Antwort war leer")
+
+    parsed = extract_json_from_text(raw_text)
+    usage = getattr(result, "usage_metadata", None)
+    if usage is not None:
+        parsed["usage"] = {
+            "prompt_tokens": getattr(usage, "prompt_token_count", None),
+            "completion_tokens": getattr(usage, "candidates_token_count", None),
+            "total_tokens": getattr(usage, "total_token_count", None),
+        }
+    return parsed
+
+
+def validate_classification(result: dict, lane: str = taric_lanes.INTERACTIVE) -> dict:
+    """
+    Prüft die Modellantwort gegen die lokale Nomenklatur (taric_validation).
+    cn_code/hs_chapter werden lokal korrigiert, ungültige Alternativen verworfen.
+    Nur bei ungültigem taric_code folgt eine Text-Rückfrage mit gültigen
+    Nachbar-Codes. Das Ergebnis steht in result["validation"].
+    """
+    index = taric_nomenclature.get_index()
+    report = taric_validation.validate(result, index)
+    validation = report.to_dict()
+
+    if report.needs_followup and VALIDATION_FOLLOWUP and GEMINI_API_KEY:
+        options = taric_validation.candidates(report.taric_code or "", index)
+        validation["followup_candidates"] = len(options)
+        if options:
+            original_code = result.get("taric_code")
+            try:
+                followup = _followup_with_gemini(
+                    taric_validation.build_followup_prompt(result, report, options), lane
+                )
+            except Exception as e:
+                traceback.print_exc()
+                validation["followup_error"] = str(e)
+            else:
+                # Token-Nutzung der Rückfrage zur ursprünglichen addieren
+                usage = result.get("usage") or {}
+                for key, value in (followup.get("usage") or {}).items():
+                    if value is not None:
+                        usage[key] = (usage.get(key) or 0) + value
+                if usage:
+                    result["usage"] = usage
+
+                if taric_validation.apply_followup(result, followup, options):
+                    validation["status"] = "corrected"
+                    validation["original_taric_code"] = original_code
+                    validation["taric_code"] = result["taric_code"]
+
+    if validation["status"] == "invalid":
+        print(f"LOG: [VALIDATION] Ungültiger TARIC-Code {result.get('taric_code')}: {validation['issues']}")
+    result["validation"] = validation
+    return result
+
+
+def _validation_record(result: dict) -> Optional[dict]:
+    """Prüfbericht plus das geprüfte Ergebnis (korrigierte Felder, Rückfrage-Tokens)."""
+    validation = result.get("validation")
+    if not validation:
+        return None
+    record = dict(validation)
+    record["result"] = {
+        key: result.get(key)
+        for key in ("taric_code", "cn_code", "hs_chapter", "confidence", "short_reason",
+                    "possible_alternatives", "usage")
+    }
+    return record
+
+
+def store_classification(filename: str, data: dict, validation: Optional[dict] = None) -> int:
+    """
+    Speichert das Klassifikationsergebnis in taric_live und gibt die neue ID zurück.
+    Der Referenzzähler des Bildes im Image-Store wird in derselben Transaktion erhöht.
+    data ist die unveränderte Modellantwort (inkl. usage): sie landet in den
+    Ergebnisspalten und komplett in raw_response_json, damit Auswertungen das
+    Modell messen. Prüfbericht und ggf. korrigierter Code stehen getrennt in
+    validation_json. Beide Felder werden über taric_storage_codec komprimiert
+    (Format-Marker, Alt-Zeilen bleiben lesbar).
+    """
+    confidence = data.get("confidence")
+    try:
+        confidence_val = float(confidence) if confidence is not None else None
+    except (TypeError, ValueError):
+        confidence_val = None
+
+    created_at = time.strftime("%Y-%m-%d %H:%M:%S")
+
+    with _db_write_lock:
+        conn = get_conn()
+        try:
+            cur = conn.cursor()
+            cur.execute(
+                """
+                INSERT INTO taric_live (
+                    created_at,
+                    filename,
+                    taric_code,
+                    cn_code,
+                    hs_chapter,
+                    confidence,
+                    short_reason,
+                    alternatives_json,
+                    raw_response_json,
+                    model_name,
+                    validation_json
+                )
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    created_at,
+                    filename,
+                    data.get("taric_code"),
+                    data.get("cn_code"),
+                    data.get("hs_chapter"),
+                    confidence_val,
+                    data.get("short_reason"),
+                    encode_json(data.get("possible_alternatives") or []),
+                    encode_json(data),
+                    GEMINI_MODEL_NAME,
+                    encode_json(validation) if validation else None,
+                ),
+            )
+            new_id = cur.lastrowid
+            taric_image_store.add_ref(conn, filename)
+            conn.commit()
+        finally:
+            conn.close()
+
+    event = {
+        "taric_live_id": new_id,
+        "filename": filename,
+        "created_at": created_at,
+        "taric_code": data.get("taric_code"),
+        "cn_code": data.get("cn_code"),
+        "hs_chapter": data.get("hs_chapter"),
+        "confidence": confidence_val,
+        "short_reason": data.get("short_reason"),
+        "alternatives": data.get("possible_alternatives") or [],
+    }
+    for hook in _store_hooks:
+        try:
+            hook(event)
+        except Exception:
+            traceback.print_exc()
+    return new_id
+
+
+# --------------------------------------------------
+# Pipeline
+# --------------------------------------------------
+
+
+def _check_suffix(name: str) -> str:
+    suffix = Path(name).suffix.lower() or ".jpg"
+    if suffix not in ALLOWED_EXTENSIONS:
+        raise ClassifyError(
+            400,
+            f"Dateiformat {suffix} wird nicht unterstützt. "
+            f"Erlaubt sind: {', '.join(sorted(ALLOWED_EXTENSIONS))}",
+        )
+    return suffix
+
+
+def _classify_stored(
+    data: bytes, filename: str, original_name: str, content_type: Optional[str], lane: str
+) -> Dict[str, Any]:
+    """Modell, Prüfung und Speicherung für ein bereits im Store liegendes Bild."""
+    # Vorschaubilder für die Evaluations-UI im Hintergrund erzeugen
+    taric_thumbnails.schedule_all(IMAGE_DIR / filename)
+
+    try:
+        model_result = classify_with_gemini(data, filename=original_name, content_type=content_type, lane=lane)
+    except taric_lanes.LaneTimeout as e:
+        # Kapazität für interaktive Anfragen reserviert: wie ein Kontingent-Engpass melden
+        raise ClassifyError(429, str(e)) from e
+    except google_exceptions.ResourceExhausted as e:
+        # Kontingent erschöpft: als 429 melden, damit Clients (bulk-evaluation) drosseln
+        raise ClassifyError(429, f"Gemini-Kontingent erschöpft: {e}") from e
+    except Exception as e:
+        traceback.print_exc()
+        raise ClassifyError(500, f"Fehler bei Modellaufruf: {e}") from e
+
+    # Unveränderte Modellantwort für taric_live; die Prüfung arbeitet auf einer Kopie
+    raw_result = copy.deepcopy(model_result)
+
+    # Code gegen lokale Nomenklatur prüfen, ggf. gezielte Rückfrage
+    try:
+        model_result = validate_classification(model_result, lane)
+    except Exception:
+        traceback.print_exc()
+
+    new_id = store_classification(filename, raw_result, _validation_record(model_result))
+
+    return {
+        "id": new_id,
+        "filename": filename,
+        "taric_code": model_result.get("taric_code"),
+        "cn_code": model_result.get("cn_code"),
+        "hs_chapter": model_result.get("hs_chapter"),
+        "confidence": model_result.get("confidence"),
+        "short_reason": model_result.get("short_reason"),
+        "possible_alternatives": model_result.get("possible_alternatives"),
+        "usage": model_result.get("usage"),
+        "validation": model_result.get("validation"),
+    }
+
+
+def classify_bytes(
+    data: bytes, original_name: str, content_type: Optional[str] = None,
+    lane: str = taric_lanes.INTERACTIVE,
+) -> Dict[str, Any]:
+    """
+    Upload-Variante: Bytes inhaltsadressiert speichern (Duplikate nur einmal),
+    dann klassifizieren. Rückgabe wie die JSON-Antwort von /classify.
+    """
+    if not GEMINI_API_KEY:
+        raise ClassifyError(503, "GEMINI_API_KEY ist nicht gesetzt.")
+    if not data:
+        raise ClassifyError(400, "Leere Datei erhalten.")
+    suffix = _check_suffix(original_name or "upload.jpg")
+
+    with _db_write_lock:
+        conn = get_conn()
+        try:
+            filename, _sha256, _is_new = taric_image_store.put_bytes(conn, data, suffix)
+            conn.commit()
+        finally:
+            conn.close()
+
+    return _classify_stored(data, filename, original_name, content_type, lane)
+
+
+def classify_path(path: Path, link: bool = True, lane: str = taric_lanes.BATCH) -> Dict[str, Any]:
+    """
+    Datei-Variante für Skripte im selben Prozess: einmal lesen (Hash + Modell),
+    per Hardlink in den Store (link=False: Kopie). Die Quelldatei bleibt
+    unverändert und kann danach verschoben werden. Standard-Spur: batch.
+    """
+    path = Path(path)
+    if not GEMINI_API_KEY:
+        raise ClassifyError(503, "GEMINI_API_KEY ist nicht gesetzt.")
+    _check_suffix(path.name)
+    data = path.read_bytes()
+    if not data:
+        raise ClassifyError(400, "Leere Datei erhalten.")
+
+    with _db_write_lock:
+        conn = get_conn()
+        try:
+            filename, _sha256, _is_new = taric_image_store.put_file(
+                conn, path, link=link, sha256=taric_image_store.sha256_bytes(data)
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    content_type = mimetypes.guess_type(path.name)[0]
+    return _classify_stored(data, filename, path.name, content_type, lane)
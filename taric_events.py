@@ -0,0 +1,155 @@
+"""
+taric_events.py
+
+Verantwortung:
+- Prozessinterner Event-Bus für neue Klassifikationen und Bewertungen
+- Ringpuffer der letzten Events, damit Clients per Last-Event-ID fortsetzen können
+- Formatierung als Server-Sent Events (text/event-stream)
+
+Events werden nach dem Commit in store_classification / upsert_evaluations
+veröffentlicht. publish() ist thread-safe und kann auch aus Worker-Threads
+aufgerufen werden.
+"""
+
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Set, Tuple
+import asyncio
+import json
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Anzahl Events, die für Resume im Speicher gehalten werden
+BUFFER_SIZE = 2000
+
+# Max. wartende Events pro Client; langsame Clients werden getrennt
+SUBSCRIBER_QUEUE_SIZE = 500
+
+# Kommentarzeile als Keep-Alive (hält Cloudflare-Tunnel/Proxies offen)
+HEARTBEAT_SECONDS = 15.0
+
+Event = Tuple[int, str, Dict[str, Any]]
+
+
+class EventBus:
+    def __init__(self, buffer_size: int = BUFFER_SIZE) -> None:
+        self._lock = threading.Lock()
+        self._buffer: Deque[Event] = deque(maxlen=buffer_size)
+        # IDs starten bei der Startzeit in ms: nach einem Neustart sind alte
+        # Client-IDs kleiner als alles im Puffer -> Client erhält "reset".
+        self._next_id = int(time.time() * 1000)
+        self._subscribers: Set[Tuple[asyncio.AbstractEventLoop, asyncio.Queue]] = set()
+
+    def publish(self, event_type: str, data: Dict[str, Any]) -> int:
+        """Veröffentlicht ein Event an alle verbundenen Clients."""
+        with self._lock:
+            self._next_id += 1
+            event = (self._next_id, event_type, data)
+            self._buffer.append(event)
+            subscribers = list(self._subscribers)
+
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._deliver, loop, queue, event)
+            except RuntimeError:
+                # Event-Loop bereits geschlossen
+                self._unsubscribe(loop, queue)
+        return event[0]
+
+    def _deliver(self, loop: asyncio.AbstractEventLoop, queue: asyncio.Queue, event: Event) -> None:
+        if queue.qsize() >= SUBSCRIBER_QUEUE_SIZE:
+            logger.warning("SSE-Client zu langsam – Verbindung wird getrennt.")
+            self._unsubscribe(loop, queue)
+            # Sentinel: Stream beenden, Client verbindet neu und setzt per Last-Event-ID fort
+            queue.put_nowait(None)
+            return
+        queue.put_nowait(event)
+
+    def _unsubscribe(self, loop: asyncio.AbstractEventLoop, queue: asyncio.Queue) -> None:
+        with self._lock:
+            self._subscribers.discard((loop, queue))
+
+    def _backlog(self, last_event_id: Optional[int]) -> Tuple[bool, List[Event]]:
+        """(resume_moeglich, Events mit id > last_event_id) aus dem Puffer."""
+        with self._lock:
+            buffered = list(self._buffer)
+            current = self._next_id
+        if last_event_id is None:
+            return True, []
+        if last_event_id > current:
+            return False, []
+        if buffered and last_event_id < buffered[0][0] - 1:
+            return False, []
+        if not buffered and last_event_id < current:
+            return False, []
+        return True, [e for e in buffered if e[0] > last_event_id]
+
+    async def subscribe(
+        self,
+        last_event_id: Optional[int] = None,
+        types: Optional[Set[str]] = None,
+    ) -> AsyncIterator[str]:
+        """
+        Asynchroner Generator mit fertig formatierten SSE-Nachrichten.
+        Erst werden verpasste Events aus dem Puffer nachgeliefert, dann live.
+        """
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        with self._lock:
+            self._subscribers.add((loop, queue))
+
+        try:
+            yield "retry: 3000\n\n"
+
+            resumable, backlog = self._backlog(last_event_id)
+            last_sent = last_event_id or 0
+            if not resumable:
+                # Client muss seinen Stand komplett neu laden
+                with self._lock:
+                    last_sent = self._next_id
+                yield format_sse(last_sent, "reset", {"reason": "resume_not_possible"})
+
+            for event in backlog:
+                if types is None or event[1] in types:
+                    yield format_sse(*event)
+                last_sent = event[0]
+
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                if event is None:
+                    break
+                if event[0] <= last_sent:
+                    continue  # bereits über den Puffer ausgeliefert
+                last_sent = event[0]
+                if types is None or event[1] in types:
+                    yield format_sse(*event)
+        finally:
+            self._unsubscribe(loop, queue)
+
+    @property
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len(self._subscribers)
+
+
+def format_sse(event_id: int, event_type: str, data: Dict[str, Any]) -> str:
+    payload = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+    return f"id: {event_id}\nevent: {event_type}\ndata: {payload}\n\n"
+
+
+def parse_last_event_id(value: Optional[str]) -> Optional[int]:
+    if not value:
+        return None
+    try:
+        return int(value.strip())
+    except ValueError:
+        return None
+
+
+bus = EventBus()
@@ -0,0 +1,137 @@
+"""
+taric_http.py
+
+Verantwortung:
+- Ein gemeinsamer httpx.AsyncClient für die Laufzeit des Backends
+  (Connection-Pool, Keep-Alive, HTTP/2 falls Paket `h2` installiert ist)
+- Obergrenze gleichzeitiger Anfragen an die EU-TARIC-Seite
+- Single-Flight: gleichzeitige Anfragen mit demselben Schlüssel teilen sich
+  einen einzigen Upstream-Abruf
+
+Der Client wird im Lifespan des Backends geöffnet (start_client) und beim
+Beenden geschlossen (close_client). get_client() legt ihn bei Bedarf an,
+z.B. wenn das Modul außerhalb von FastAPI genutzt wird.
+"""
+
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+import asyncio
+import logging
+import os
+
+import httpx
+
+try:
+    import h2  # noqa: F401  (optional, nicht in requirements.txt)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Max. gleichzeitige Abrufe bei ec.europa.eu (darüber wird gewartet)
+UPSTREAM_CONCURRENCY = int(os.getenv("TARIC_UPSTREAM_CONCURRENCY", "4"))
+
+TIMEOUT = httpx.Timeout(20.0, connect=10.0)
+LIMITS = httpx.Limits(
+    max_connections=UPSTREAM_CONCURRENCY * 2,
+    max_keepalive_connections=UPSTREAM_CONCURRENCY,
+    keepalive_expiry=60.0,
+)
+HEADERS = {"User-Agent": "TARIC-Gemini-Backend/1.0"}
+
+_client: Optional[httpx.AsyncClient] = None
+_upstream_limit = asyncio.Semaphore(UPSTREAM_CONCURRENCY)
+
+
+def start_client() -> httpx.AsyncClient:
+    """Erzeugt den gemeinsamen Client (idempotent)."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            http2=HTTP2_AVAILABLE,
+            timeout=TIMEOUT,
+            limits=LIMITS,
+            headers=HEADERS,
+            follow_redirects=True,
+        )
+        logger.info(
+            "HTTP-Client gestartet (HTTP/2: %s, max. %s parallele Upstream-Abrufe)",
+            HTTP2_AVAILABLE,
+            UPSTREAM_CONCURRENCY,
+        )
+    return _client
+
+
+def get_client() -> httpx.AsyncClient:
+    return start_client()
+
+
+async def close_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+async def fetch_text(url: str, params: Optional[Dict[str, Any]] = None) -> Tuple[str, str, str]:
+    """
+    GET über den gemeinsamen Client, begrenzt durch UPSTREAM_CONCURRENCY.
+    Rückgabe: (text, requested_url, final_url). Wirft httpx.HTTPStatusError bei 4xx/5xx.
+    """
+    async with _upstream_limit:
+        resp = await get_client().get(url, params=params)
+    requested_url = str(resp.request.url)
+    resp.raise_for_status()
+    return resp.text, requested_url, str(resp.url)
+
+
+def upstream_saturated() -> bool:
+    """True, solange alle Upstream-Plätze belegt sind (für niedrig priorisierte Arbeit)."""
+    return _upstream_limit.locked()
+
+
+class SingleFlight:
+    """
+    Fasst gleichzeitige Aufrufe mit demselben Schlüssel zusammen: der erste
+    Aufruf startet die Arbeit, alle weiteren warten auf dasselbe Ergebnis
+    (bzw. dieselbe Exception).
+    """
+
+    def __init__(self) -> None:
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.started = 0
+        self.coalesced = 0
+
+    async def run(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Any:
+        future = self._inflight.get(key)
+        if future is None:
+            self.started += 1
+            future = asyncio.ensure_future(factory())
+            self._inflight[key] = future
+            future.add_done_callback(lambda f: self._done(key, f))
+        else:
+            self.coalesced += 1
+        # shield: bricht ein wartender Client ab, läuft der Abruf für die anderen weiter
+        return await asyncio.shield(future)
+
+    def _done(self, key: Hashable, future: asyncio.Future) -> None:
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
+        if not future.cancelled() and future.exception() is not None:
+            # Exception als abgerufen markieren, auch wenn kein Aufrufer mehr wartet
+            logger.debug("Upstream-Abruf für %s fehlgeschlagen: %s", key, future.exception())
+
+    @property
+    def inflight(self) -> int:
+        return len(self._inflight)
+
+
+def stats(single_flight: SingleFlight) -> Dict[str, Any]:
+    return {
+        "http2": HTTP2_AVAILABLE,
+        "upstream_concurrency": UPSTREAM_CONCURRENCY,
+        "client_open": _client is not None and not _client.is_closed,
+        "inflight": single_flight.inflight,
+        "started": single_flight.started,
+        "coalesced": single_flight.coalesced,
+    }
@@ -0,0 +1,327 @@
+"""
+taric_image_store.py
+
+Verantwortung:
+- Inhaltsadressierte Ablage der Upload-Bilder (SHA-256) statt flachem Ordner
+- Zweistufiges Sharding: bilder_uploads/ab/cd/abcd…ef.webp
+- Referenzzählung aus taric_live (Tabelle image_store)
+- Kompatibilitäts-Lookup für alte, flache `filename`-Werte (Tabelle image_alias)
+- Aufräumen unreferenzierter Objekte (z.B. Uploads mit fehlgeschlagenem
+  Modellaufruf):
+
+    python3 taric_image_store.py --gc [--min-age-hours 24] [--dry-run]
+
+Der relative Pfad (z.B. "ab/cd/abcd….webp") wird als `filename` in taric_live
+gespeichert. Damit funktionieren bestehende Pfade der Form
+`bilder_uploads/${filename}` im Frontend unverändert weiter.
+"""
+
+from pathlib import Path
+from typing import List, Optional, Tuple
+import argparse
+import hashlib
+import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).resolve().parent
+
+# Gleicher Ordner wie bisher – die Shards liegen als Unterordner darin
+IMAGE_DIR = Path(os.getenv("TARIC_IMAGE_DIR", str(BASE_DIR / "bilder_uploads")))
+
+# Gleiche DB wie Backend/taric_classify (nur für den GC-Aufruf von der Kommandozeile)
+DB_PATH = Path(os.getenv("TARIC_DB_PATH", str(BASE_DIR / "taric_live.db")))
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def ensure_image_store_schema(conn: sqlite3.Connection) -> None:
+    """Legt image_store und image_alias an (idempotent)."""
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS image_store (
+            sha256      TEXT PRIMARY KEY,
+            rel_path    TEXT NOT NULL UNIQUE,
+            size_bytes  INTEGER NOT NULL,
+            ref_count   INTEGER NOT NULL DEFAULT 0,
+            created_at  TEXT NOT NULL
+        );
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS image_alias (
+            legacy_filename TEXT PRIMARY KEY,
+            sha256          TEXT NOT NULL
+        );
+        """
+    )
+
+
+def sha256_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def sha256_file(path: Path) -> str:
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def rel_path_for(sha256: str, suffix: str) -> str:
+    """Sharded relativer Pfad: 'ab/cd/<sha256><suffix>'."""
+    return f"{sha256[:2]}/{sha256[2:4]}/{sha256}{suffix.lower()}"
+
+
+def is_store_path(filename: str) -> bool:
+    """True, wenn filename bereits ein Store-Pfad (ab/cd/<hash>.ext) ist."""
+    parts = (filename or "").split("/")
+    return (
+        len(parts) == 3
+        and len(parts[0]) == 2
+        and len(parts[1]) == 2
+        and parts[2][:4] == parts[0] + parts[1]
+    )
+
+
+def _existing_rel_path(conn: sqlite3.Connection, sha256: str) -> Optional[str]:
+    """Store-Pfad eines bereits registrierten Inhalts (auch bei anderer Endung)."""
+    row = conn.execute(
+        "SELECT rel_path FROM image_store WHERE sha256 = ?", (sha256,)
+    ).fetchone()
+    return row[0] if row else None
+
+
+def _register(conn: sqlite3.Connection, sha256: str, rel_path: str, size: int) -> None:
+    """
+    Trägt ein Objekt in image_store ein. Bei einem noch unreferenzierten Objekt
+    wird created_at erneuert, damit collect_garbage() es nicht entfernt, während
+    der neue Upload noch auf das Modell wartet.
+    """
+    conn.execute(
+        """
+        INSERT INTO image_store (sha256, rel_path, size_bytes, ref_count, created_at)
+        VALUES (?, ?, ?, 0, ?)
+        ON CONFLICT(sha256) DO UPDATE SET created_at = excluded.created_at
+         WHERE image_store.ref_count = 0
+        """,
+        (sha256, rel_path, size, time.strftime("%Y-%m-%d %H:%M:%S")),
+    )
+
+
+def put_bytes(conn: sqlite3.Connection, data: bytes, suffix: str) -> Tuple[str, str, bool]:
+    """
+    Legt Bildbytes im Store ab (atomar über temporäre Datei + os.replace).
+    Gleiche Inhalte werden nur einmal gespeichert.
+
+    :return: (rel_path, sha256, is_new)
+    """
+    sha256 = sha256_bytes(data)
+    existing = _existing_rel_path(conn, sha256)
+    rel_path = existing or rel_path_for(sha256, suffix)
+    target = IMAGE_DIR / rel_path
+
+    if not target.exists():
+        target.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=target.parent, prefix=".tmp_")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_name, target)
+        except Exception:
+            Path(tmp_name).unlink(missing_ok=True)
+            raise
+
+    _register(conn, sha256, rel_path, len(data))
+    return rel_path, sha256, existing is None
+
+
+def _link_or_copy(src: Path, target: Path) -> None:
+    try:
+        os.link(src, target)
+    except FileExistsError:
+        pass  # parallel von einem anderen Aufruf angelegt – gleicher Inhalt
+    except OSError:
+        # z.B. anderes Dateisystem oder keine Hardlinks unterstützt
+        shutil.copy2(src, target)
+
+
+def put_file(
+    conn: sqlite3.Connection,
+    src: Path,
+    move: bool = False,
+    sha256: Optional[str] = None,
+    link: bool = False,
+) -> Tuple[str, str, bool]:
+    """
+    Übernimmt eine vorhandene Datei in den Store.
+    move=True verschiebt die Datei (bzw. löscht sie, wenn der Inhalt schon
+    vorhanden ist), link=True legt einen Hardlink an (Quelle bleibt, keine
+    zweite Kopie auf der Platte; Fallback Kopie), sonst wird kopiert.
+
+    :return: (rel_path, sha256, is_new)
+    """
+    sha256 = sha256 or sha256_file(src)
+    existing = _existing_rel_path(conn, sha256)
+    rel_path = existing or rel_path_for(sha256, src.suffix)
+    target = IMAGE_DIR / rel_path
+
+    if target.exists():
+        if move:
+            src.unlink()
+    else:
+        target.parent.mkdir(parents=True, exist_ok=True)
+        if move:
+            os.replace(src, target)
+        elif link:
+            _link_or_copy(src, target)
+        else:
+            shutil.copy2(src, target)
+
+    _register(conn, sha256, rel_path, target.stat().st_size)
+    return rel_path, sha256, existing is None
+
+
+def add_ref(conn: sqlite3.Connection, rel_path: str, delta: int = 1) -> None:
+    """
+    Erhöht (oder verringert) den Referenzzähler eines Store-Objekts.
+    Wer eine taric_live-Zeile löscht oder ihren filename ersetzt, ruft
+    add_ref(conn, alter_pfad, -1) auf; collect_garbage() zählt vor dem
+    Löschen ohnehin aus taric_live nach.
+    """
+    conn.execute(
+        "UPDATE image_store SET ref_count = MAX(ref_count + ?, 0) WHERE rel_path = ?",
+        (delta, rel_path),
+    )
+
+
+def add_alias(conn: sqlite3.Connection, legacy_filename: str, sha256: str) -> None:
+    conn.execute(
+        "INSERT OR REPLACE INTO image_alias (legacy_filename, sha256) VALUES (?, ?)",
+        (legacy_filename, sha256),
+    )
+
+
+def recount_refs(conn: sqlite3.Connection) -> None:
+    """Berechnet alle Referenzzähler aus taric_live neu."""
+    conn.execute(
+        """
+        UPDATE image_store
+           SET ref_count = (
+               SELECT COUNT(*) FROM taric_live l WHERE l.filename = image_store.rel_path
+           )
+        """
+    )
+
+
+def resolve_image_path(conn: Optional[sqlite3.Connection], filename: str) -> Optional[Path]:
+    """
+    Liefert den Dateipfad zu einem `filename`-Wert aus taric_live:
+    1. Store-Pfad (ab/cd/<hash>.ext)
+    2. Alter flacher Dateiname, falls noch vorhanden
+    3. Alias-Tabelle (nach Migration verschobene Altdateien)
+    """
+    if not filename or ".." in Path(filename).parts:
+        return None
+
+    candidate = IMAGE_DIR / filename
+    if candidate.is_file():
+        return candidate
+
+    if conn is not None and not is_store_path(filename):
+        try:
+            row = conn.execute(
+                """
+                SELECT s.rel_path
+                  FROM image_alias a
+                  JOIN image_store s ON s.sha256 = a.sha256
+                 WHERE a.legacy_filename = ?
+                """,
+                (filename,),
+            ).fetchone()
+        except sqlite3.OperationalError:
+            # DB ohne Image-Store-Tabellen (vor der Migration)
+            row = None
+        if row:
+            aliased = IMAGE_DIR / row[0]
+            if aliased.is_file():
+                return aliased
+
+    return None
+
+
+def collect_garbage(conn: sqlite3.Connection, min_age_hours: float = 24.0, dry_run: bool = False) -> List[str]:
+    """
+    Entfernt Store-Objekte ohne Referenz, die älter als min_age_hours sind
+    (z.B. Uploads, bei denen der Modellaufruf fehlgeschlagen ist).
+    Objekte mit Alias bleiben erhalten.
+
+    Die Zähler werden vorher aus taric_live neu berechnet, damit ein
+    abweichender Zähler nie zum Löschen eines referenzierten Bildes führt.
+    Läuft in eigener Transaktion; Dateien werden erst nach dem Commit gelöscht.
+
+    :return: entfernte (bzw. bei dry_run: zu entfernende) rel_paths
+    """
+    cutoff = time.strftime(
+        "%Y-%m-%d %H:%M:%S", time.localtime(time.time() - min_age_hours * 3600)
+    )
+    with conn:
+        recount_refs(conn)
+        rows = conn.execute(
+            """
+            SELECT sha256, rel_path FROM image_store
+             WHERE ref_count = 0
+               AND created_at < ?
+               AND sha256 NOT IN (SELECT sha256 FROM image_alias)
+            """,
+            (cutoff,),
+        ).fetchall()
+        if not dry_run:
+            conn.executemany(
+                "DELETE FROM image_store WHERE sha256 = ? AND ref_count = 0",
+                [(sha256,) for sha256, _ in rows],
+            )
+
+    removed = [rel_path for _, rel_path in rows]
+    if dry_run:
+        return removed
+    for rel_path in removed:
+        (IMAGE_DIR / rel_path).unlink(missing_ok=True)
+    if removed:
+        logger.info("Image-Store GC: %s unreferenzierte Objekte entfernt", len(removed))
+    return removed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Image-Store verwalten")
+    parser.add_argument("--gc", action="store_true", help="unreferenzierte Objekte entfernen")
+    parser.add_argument("--min-age-hours", type=float, default=24.0, help="nur Objekte älter als N Stunden (Standard: 24)")
+    parser.add_argument("--dry-run", action="store_true", help="nur anzeigen, nichts löschen")
+    args = parser.parse_args()
+
+    if not args.gc:
+        parser.print_help()
+        return
+    if not DB_PATH.exists():
+        raise SystemExit(f"DB '{DB_PATH}' nicht gefunden – bitte Pfad prüfen.")
+
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        ensure_image_store_schema(conn)
+        removed = collect_garbage(conn, min_age_hours=args.min_age_hours, dry_run=args.dry_run)
+    finally:
+        conn.close()
+    verb = "würden entfernt" if args.dry_run else "entfernt"
+    print(f"[INFO] {len(removed)} unreferenzierte Objekte {verb} (älter als {args.min_age_hours:g}h).")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,172 @@
+"""
+taric_lanes.py
+
+Verantwortung:
+- Prioritäts-Spuren für Modellaufrufe: interactive (Web-UI), bulk
+  (bulk-evaluation.py), batch (Backfill, taric_batch_gemini.py --live)
+- Gewichteter Scheduler vor dem Gemini-Aufruf (ersetzt die einfache
+  Semaphore in taric_classify):
+    * capacity = max. gleichzeitige Modellaufrufe je Prozess
+    * interactive darf alle Plätze nutzen und wird bei freien Plätzen immer
+      zuerst bedient; reserved Plätze bleiben für interactive frei
+    * bulk und batch teilen sich den Rest nach Gewicht (Stride-Verfahren),
+      innerhalb einer Spur in Ankunftsreihenfolge
+    * Hintergrund-Spuren warten höchstens max_wait Sekunden, danach
+      LaneTimeout (-> 429, der Bulk-Client drosselt über seine Taktung)
+- Zuordnung einer Anfrage zur Spur über den Header X-Taric-Lane oder,
+  für ältere Clients, über deren User-Agent-Kennung
+
+Laufende Modellaufrufe werden nicht abgebrochen; "Vorrang" heißt, dass eine
+wartende interaktive Anfrage den nächsten freien Platz bekommt und nie hinter
+einem Bulk-Rückstand ansteht.
+"""
+
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Iterator, Optional
+import threading
+import time
+
+INTERACTIVE = "interactive"
+BULK = "bulk"
+BATCH = "batch"
+LANES = (INTERACTIVE, BULK, BATCH)
+BACKGROUND_LANES = (BULK, BATCH)
+
+LANE_HEADER = "X-Taric-Lane"
+
+# User-Agent-Kennungen bekannter Clients ohne Lane-Header
+USER_AGENT_LANES = {
+    "TARIC-Bulk-Evaluation": BULK,
+}
+
+
+def parse_weights(spec: str) -> Dict[str, float]:
+    """'bulk:3,batch:1' -> {"bulk": 3.0, "batch": 1.0}; unbekannte Spuren werden ignoriert."""
+    weights = {BULK: 3.0, BATCH: 1.0}
+    for part in (spec or "").split(","):
+        name, _, value = part.partition(":")
+        name = name.strip().lower()
+        if name in BACKGROUND_LANES and value.strip():
+            weights[name] = max(float(value), 0.01)
+    return weights
+
+
+def lane_for(header_value: Optional[str], user_agent: Optional[str] = None) -> str:
+    """Spur aus X-Taric-Lane bzw. User-Agent; ohne Angabe interactive (Web-UI)."""
+    value = (header_value or "").strip().lower()
+    if value in LANES:
+        return value
+    for token, lane in USER_AGENT_LANES.items():
+        if user_agent and token in user_agent:
+            return lane
+    return INTERACTIVE
+
+
+class LaneTimeout(Exception):
+    """Hintergrund-Anfrage hat innerhalb von max_wait keinen Platz bekommen."""
+
+
+class LaneScheduler:
+    """
+    Thread-safe; slot(lane) ist ein Context-Manager um den Modellaufruf.
+    Ein Platz wird nur an den Kopf der jeweiligen Warteschlange vergeben.
+    """
+
+    def __init__(
+        self,
+        capacity: int,
+        reserved_interactive: int = 1,
+        weights: Optional[Dict[str, float]] = None,
+        max_wait: float = 0.0,
+    ) -> None:
+        self.capacity = max(capacity, 1)
+        # Mindestens ein Platz bleibt für Hintergrund-Spuren, sonst liefen sie nie
+        self.reserved = min(max(reserved_interactive, 0), self.capacity - 1)
+        self.weights = weights or parse_weights("")
+        self.max_wait = max_wait
+        self._cond = threading.Condition()
+        self._queues: Dict[str, Deque[object]] = {lane: deque() for lane in LANES}
+        self._active: Dict[str, int] = {lane: 0 for lane in LANES}
+        # Stride: virtuelle Zeit je Hintergrund-Spur, kleinste kommt zuerst dran
+        self._pass: Dict[str, float] = {lane: 0.0 for lane in BACKGROUND_LANES}
+        self._granted: Dict[str, int] = {lane: 0 for lane in LANES}
+        self._timeouts: Dict[str, int] = {lane: 0 for lane in LANES}
+        self._wait_seconds: Dict[str, float] = {lane: 0.0 for lane in LANES}
+
+    def _in_use(self) -> int:
+        return sum(self._active.values())
+
+    def _can_grant(self, lane: str, ticket: object) -> bool:
+        queue = self._queues[lane]
+        if not queue or queue[0] is not ticket or self._in_use() >= self.capacity:
+            return False
+        if lane == INTERACTIVE:
+            return True
+        if self._queues[INTERACTIVE]:
+            return False
+        background = sum(self._active[b] for b in BACKGROUND_LANES)
+        if background >= self.capacity - self.reserved:
+            return False
+        waiting = [b for b in BACKGROUND_LANES if self._queues[b]]
+        return min(waiting, key=lambda b: self._pass[b]) == lane
+
+    @contextmanager
+    def slot(self, lane: str) -> Iterator[None]:
+        if lane not in LANES:
+            lane = INTERACTIVE
+        ticket = object()
+        started = time.monotonic()
+        with self._cond:
+            queue = self._queues[lane]
+            if lane in BACKGROUND_LANES and not queue:
+                # Nach Leerlauf nicht mit altem Vorsprung starten
+                others = [self._pass[b] for b in BACKGROUND_LANES if b != lane and self._queues[b]]
+                if others:
+                    self._pass[lane] = max(self._pass[lane], min(others))
+            queue.append(ticket)
+            deadline = started + self.max_wait if lane != INTERACTIVE and self.max_wait > 0 else None
+            try:
+                while not self._can_grant(lane, ticket):
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        self._timeouts[lane] += 1
+                        raise LaneTimeout(
+                            f"Kein freier Modell-Platz für '{lane}' innerhalb von {self.max_wait:g}s "
+                            f"(interaktive Anfragen haben Vorrang)"
+                        )
+                    self._cond.wait(remaining)
+            finally:
+                queue.remove(ticket)
+                # Nachfolger (auch anderer Spuren) neu prüfen lassen
+                self._cond.notify_all()
+            self._active[lane] += 1
+            self._granted[lane] += 1
+            self._wait_seconds[lane] += time.monotonic() - started
+            if lane in BACKGROUND_LANES:
+                self._pass[lane] += 1.0 / self.weights.get(lane, 1.0)
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._active[lane] -= 1
+                self._cond.notify_all()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "capacity": self.capacity,
+                "reserved_interactive": self.reserved,
+                "weights": dict(self.weights),
+                "lanes": {
+                    lane: {
+                        "active": self._active[lane],
+                        "waiting": len(self._queues[lane]),
+                        "granted": self._granted[lane],
+                        "timeouts": self._timeouts[lane],
+                        "avg_wait_s": round(self._wait_seconds[lane] / self._granted[lane], 3)
+                        if self._granted[lane] else 0.0,
+                    }
+                    for lane in LANES
+                },
+            }
@@ -0,0 +1,125 @@
+"""
+taric_memory_cache.py
+
+Verantwortung:
+- Prozessinterne Cache-Stufe vor den SQLite-Caches für offizielle Beschreibungen
+- LRU mit fester Größe + TTL je Eintrag
+- Negative Einträge (Wert None) mit kurzer TTL, damit unbekannte Codes
+  nicht bei jedem Aufruf erneut upstream abgefragt werden
+- Hintergrund-Aktualisierung (stale-while-revalidate) mit Deduplizierung je Schlüssel
+
+Alle Klassen sind thread-safe; sie werden sowohl aus dem Event-Loop als auch
+aus Worker-Threads verwendet.
+"""
+
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, Set, Tuple
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAXSIZE = int(os.getenv("TARIC_MEMCACHE_SIZE", "5000"))
+DEFAULT_TTL = float(os.getenv("TARIC_MEMCACHE_TTL", "600"))
+DEFAULT_NEGATIVE_TTL = float(os.getenv("TARIC_NEGATIVE_TTL", "120"))
+
+# Rückgabe von get(), wenn kein gültiger Eintrag vorhanden ist (None = negativer Eintrag)
+MISS = object()
+
+
+class LRUTTLCache:
+    def __init__(
+        self,
+        maxsize: int = DEFAULT_MAXSIZE,
+        ttl: float = DEFAULT_TTL,
+        negative_ttl: float = DEFAULT_NEGATIVE_TTL,
+    ) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._lock = threading.Lock()
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Any:
+        """Wert, None (negativer Eintrag) oder MISS."""
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[0] < now:
+                if item is not None:
+                    del self._data[key]
+                self.misses += 1
+                return MISS
+            self._data.move_to_end(key)
+            if item[1] is None:
+                self.negative_hits += 1
+            else:
+                self.hits += 1
+            return item[1]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """value=None legt einen negativen Eintrag mit negative_ttl an."""
+        ttl = self.negative_ttl if value is None else self.ttl
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "negative_hits": self.negative_hits,
+                "misses": self.misses,
+            }
+
+
+class BackgroundRefresher:
+    """
+    Führt Aktualisierungen im Hintergrund aus; je Schlüssel läuft höchstens
+    eine Aktualisierung gleichzeitig.
+    """
+
+    def __init__(self, max_workers: int = 2) -> None:
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="taric-refresh")
+        self._lock = threading.Lock()
+        self._pending: Set[Hashable] = set()
+
+    def submit(self, key: Hashable, fn: Callable[[], Any]) -> bool:
+        """False, wenn für key bereits eine Aktualisierung läuft."""
+        with self._lock:
+            if key in self._pending:
+                return False
+            self._pending.add(key)
+        future = self._executor.submit(fn)
+        future.add_done_callback(lambda f: self._done(key, f))
+        return True
+
+    def _done(self, key: Hashable, future: Future) -> None:
+        with self._lock:
+            self._pending.discard(key)
+        exc = future.exception()
+        if exc is not None:
+            logger.warning("Hintergrund-Aktualisierung für %s fehlgeschlagen: %s", key, exc)
+
+    @property
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._pending)
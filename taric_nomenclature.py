@@ -0,0 +1,263 @@
+"""
+taric_nomenclature.py
+
+Verantwortung:
+- Schema von taric_reference (inkl. Hierarchie und Gültigkeitsdaten)
+- Kompakter In-Memory-Index über die komplette Nomenklatur:
+    * sortiertes Code-Array + bisect für Präfix-Abfragen (4/6/8/10 Stellen)
+    * Eltern-/Kind-Beziehungen für Vorfahren und Unterpositionen
+    * Gültigkeitsprüfung zu einem Stichtag
+- Keine Netzwerkzugriffe; Befüllung über import_taric_nomenclature.py
+- Import-Protokoll (taric_reference_imports): nur ein vollständig
+  importierter Bestand gilt als Nomenklatur, gegen die geprüft werden darf
+  (Testdaten wie aus insert_test_data.py sind kein Import)
+
+Der Index wird beim Backend-Start einmal aus taric_reference aufgebaut
+(load_index) und ist danach nur lesend in Verwendung.
+"""
+
+from bisect import bisect_left
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+import datetime
+import logging
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Zusätzliche Spalten gegenüber dem ursprünglichen Schema (create_db_schema.py)
+REFERENCE_EXTRA_COLUMNS = {
+    "parent_code": "TEXT",
+    "indent": "INTEGER",      # Hierarchieebene: 0 = Kapitel, 1 = Position, ...
+    "valid_from": "TEXT",
+    "valid_to": "TEXT",
+    "is_leaf": "INTEGER",
+}
+
+
+def ensure_reference_schema(conn: sqlite3.Connection) -> None:
+    """Legt taric_reference an bzw. ergänzt Hierarchie-/Gültigkeitsspalten."""
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS taric_reference (
+            taric_code     TEXT PRIMARY KEY NOT NULL,
+            cn_code        TEXT,
+            hs_chapter     TEXT,
+            description_de TEXT,
+            description_en TEXT,
+            legal_base     TEXT
+        )
+        """
+    )
+    cols = {row[1] for row in conn.execute("PRAGMA table_info(taric_reference)")}
+    for name, sql_type in REFERENCE_EXTRA_COLUMNS.items():
+        if name not in cols:
+            conn.execute(f"ALTER TABLE taric_reference ADD COLUMN {name} {sql_type}")
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_taric_reference_parent ON taric_reference(parent_code)"
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS taric_reference_imports (
+            id          INTEGER PRIMARY KEY AUTOINCREMENT,
+            imported_at TEXT NOT NULL,
+            lang        TEXT NOT NULL,
+            source      TEXT,
+            codes       INTEGER NOT NULL
+        )
+        """
+    )
+
+
+def record_import(conn: sqlite3.Connection, lang: str, source: str, codes: int) -> None:
+    """
+    Vermerkt einen abgeschlossenen Nomenklatur-Import (nach dem Upsert).
+    imported_at in UTC wie taric_official_cache.fetched_at, damit
+    score_official_match.py beide Zeitpunkte mit scored_at vergleichen kann.
+    """
+    imported_at = datetime.datetime.utcnow().isoformat(timespec="seconds") + "Z"
+    conn.execute(
+        "INSERT INTO taric_reference_imports (imported_at, lang, source, codes) VALUES (?, ?, ?, ?)",
+        (imported_at, lang, source, codes),
+    )
+
+
+def last_import_at(conn: sqlite3.Connection) -> Optional[str]:
+    """Zeitpunkt des letzten Nomenklatur-Imports oder None (nie importiert)."""
+    try:
+        row = conn.execute("SELECT MAX(imported_at) FROM taric_reference_imports").fetchone()
+    except sqlite3.OperationalError:
+        return None
+    return row[0] if row else None
+
+
+@dataclass(frozen=True)
+class NomenclatureEntry:
+    taric_code: str
+    description_de: Optional[str]
+    description_en: Optional[str]
+    parent_code: Optional[str]
+    indent: Optional[int]
+    valid_from: Optional[str]   # YYYY-MM-DD
+    valid_to: Optional[str]     # YYYY-MM-DD oder None (offen)
+    is_leaf: bool
+
+    def description(self, lang: str = "de") -> Optional[str]:
+        if lang.lower().startswith("en"):
+            return self.description_en or self.description_de
+        return self.description_de or self.description_en
+
+    def is_valid_on(self, on_date: Optional[str] = None) -> bool:
+        """on_date im Format YYYY-MM-DD oder YYYYMMDD; None = heute."""
+        day = normalize_date(on_date) or time.strftime("%Y-%m-%d")
+        if self.valid_from and day < self.valid_from:
+            return False
+        if self.valid_to and day > self.valid_to:
+            return False
+        return True
+
+
+def normalize_date(value: Optional[str]) -> Optional[str]:
+    """'20251201', '2025-12-01', '01-12-2025' oder '01/12/2025' -> '2025-12-01'."""
+    if not value:
+        return None
+    v = value.strip()
+    if len(v) == 8 and v.isdigit():
+        return f"{v[:4]}-{v[4:6]}-{v[6:]}"
+    if len(v) >= 10 and v[4] == "-" and v[7] == "-":
+        return v[:10]
+    if len(v) >= 10 and v[2] in "-/." and v[5] in "-/.":
+        return f"{v[6:10]}-{v[3:5]}-{v[:2]}"
+    return None
+
+
+class NomenclatureIndex:
+    """
+    Unveränderlicher Index über alle Codes. Präfix-Abfragen laufen über
+    bisect auf dem sortierten Code-Array (O(log n)), Vorfahren/Kinder über
+    vorberechnete Zuordnungen.
+    """
+
+    def __init__(self, entries: List[NomenclatureEntry], imported_at: Optional[str] = None) -> None:
+        # Zeitpunkt des letzten vollständigen Imports; None = nur Teilbestand
+        self.imported_at = imported_at
+        entries = sorted(entries, key=lambda e: e.taric_code)
+        self._codes: List[str] = [e.taric_code for e in entries]
+        self._entries: Dict[str, NomenclatureEntry] = {e.taric_code: e for e in entries}
+        self._children: Dict[str, List[str]] = {}
+        for e in entries:
+            if e.parent_code:
+                self._children.setdefault(e.parent_code, []).append(e.taric_code)
+
+    def __len__(self) -> int:
+        return len(self._codes)
+
+    @property
+    def complete(self) -> bool:
+        """True, wenn der Bestand aus einem Nomenklatur-Import stammt."""
+        return self.imported_at is not None and len(self._codes) > 0
+
+    def get(self, taric_code: str) -> Optional[NomenclatureEntry]:
+        return self._entries.get(taric_code)
+
+    def exists(self, taric_code: str, on_date: Optional[str] = None) -> bool:
+        entry = self._entries.get(taric_code)
+        return entry is not None and entry.is_valid_on(on_date)
+
+    def prefix_range(self, prefix: str) -> List[str]:
+        """Alle Codes, die mit prefix beginnen (sortiert)."""
+        lo = bisect_left(self._codes, prefix)
+        # ':' folgt in ASCII direkt auf '9' -> obere Schranke für reine Ziffern-Codes
+        hi = bisect_left(self._codes, prefix + ":", lo)
+        return self._codes[lo:hi]
+
+    def has_prefix(self, prefix: str) -> bool:
+        lo = bisect_left(self._codes, prefix)
+        return lo < len(self._codes) and self._codes[lo].startswith(prefix)
+
+    def lookup_prefix(self, prefix: str) -> Optional[NomenclatureEntry]:
+        """
+        Eintrag für einen 4/6/8/10-stelligen Präfix: nur der mit Nullen
+        aufgefüllte Code (z.B. '8517' -> '8517000000'). Fehlt dieser, None –
+        eine Unterposition im Präfixbereich hätte eine andere Beschreibung, der
+        Aufrufer fällt dann auf Cache bzw. WSDL zurück.
+        """
+        return self._entries.get(prefix.ljust(10, "0"))
+
+    def children(self, taric_code: str) -> List[NomenclatureEntry]:
+        return [self._entries[c] for c in self._children.get(taric_code, [])]
+
+    def ancestors(self, taric_code: str) -> List[NomenclatureEntry]:
+        """Vorfahren vom direkten Elternteil bis zur obersten Ebene."""
+        result: List[NomenclatureEntry] = []
+        seen = set()
+        entry = self._entries.get(taric_code)
+        while entry is not None and entry.parent_code and entry.parent_code not in seen:
+            seen.add(entry.parent_code)
+            entry = self._entries.get(entry.parent_code)
+            if entry is not None:
+                result.append(entry)
+        return result
+
+    def siblings(self, taric_code: str, on_date: Optional[str] = None) -> List[NomenclatureEntry]:
+        """Gültige Codes mit demselben Elternteil (ohne den Code selbst)."""
+        entry = self._entries.get(taric_code)
+        if entry is None or not entry.parent_code:
+            return []
+        return [
+            e for e in self.children(entry.parent_code)
+            if e.taric_code != taric_code and e.is_valid_on(on_date)
+        ]
+
+
+def load_index(conn: sqlite3.Connection) -> NomenclatureIndex:
+    """Baut den Index aus taric_reference auf und setzt ihn als aktuellen Index."""
+    ensure_reference_schema(conn)
+    started = time.perf_counter()
+    rows = conn.execute(
+        """
+        SELECT taric_code, description_de, description_en, parent_code,
+               indent, valid_from, valid_to, is_leaf
+          FROM taric_reference
+        """
+    ).fetchall()
+    entries = [
+        NomenclatureEntry(
+            taric_code=r[0],
+            description_de=r[1],
+            description_en=r[2],
+            parent_code=r[3],
+            indent=r[4],
+            valid_from=r[5],
+            valid_to=r[6],
+            is_leaf=bool(r[7]) if r[7] is not None else True,
+        )
+        for r in rows
+        if r[0]
+    ]
+    index = NomenclatureIndex(entries, last_import_at(conn))
+    set_index(index)
+    logger.info(
+        "TARIC-Nomenklatur-Index geladen: %s Codes in %.0f ms%s",
+        len(index),
+        (time.perf_counter() - started) * 1000,
+        "" if index.complete else " (kein Import vermerkt – keine Existenzprüfung)",
+    )
+    return index
+
+
+_index_lock = threading.Lock()
+_index = NomenclatureIndex([])
+
+
+def set_index(index: NomenclatureIndex) -> None:
+    global _index
+    with _index_lock:
+        _index = index
+
+
+def get_index() -> NomenclatureIndex:
+    """Aktueller Index (leer, solange load_index nicht gelaufen ist)."""
+    return _index
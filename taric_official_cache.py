@@ -0,0 +1,436 @@
+"""
+taric_official_cache.py
+
+Verantwortung:
+- Einziges Schema für taric_official_cache (EU-Webseite und WSDL gemeinsam)
+- Lesen/Schreiben per Upsert, keine doppelten Zeilen
+- last_used_at wird gesammelt und gebündelt geschrieben (kein UPDATE je Lesezugriff)
+- Begrenzung nach Alter, Zeilenzahl und Größe (LRU über last_used_at)
+- get/put committen nie selbst: fällige Pflege (last_used_at schreiben,
+  Verdrängung) merken sie nur vor; der Aufrufer ruft nach seinem Commit
+  maybe_evict(conn)
+- Übernahme der beiden alten Tabellenformate (backend.py / migrate_2025_12)
+
+Schlüssel eines Eintrags: (taric_code, digits, sim_date, language)
+- EU-Webseite: taric_code = Präfix, digits = Präfixlänge, sim_date = YYYYMMDD
+- WSDL:        taric_code = Goods Code, digits = Codelänge, sim_date = ''
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+import datetime
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from taric_storage_codec import decode_json, decode_text, encode_json, encode_text
+
+logger = logging.getLogger(__name__)
+
+SOURCE_WEB = "EU_TARIC_WEB"
+SOURCE_WSDL = "EU_TARIC_WSDL"
+
+# Rohdaten (HTML-Seite bzw. SOAP-XML) nur auf Wunsch und komprimiert speichern
+STORE_RAW = os.getenv("TARIC_STORE_OFFICIAL_HTML", "0") == "1"
+
+# Obergrenzen; 0 = keine Begrenzung
+MAX_ROWS = int(os.getenv("TARIC_OFFICIAL_CACHE_MAX_ROWS", "20000"))
+MAX_BYTES = int(float(os.getenv("TARIC_OFFICIAL_CACHE_MAX_MB", "64")) * 1024 * 1024)
+MAX_AGE_DAYS = int(os.getenv("TARIC_OFFICIAL_CACHE_MAX_AGE_DAYS", "90"))
+
+# Verdrängung nach so vielen Schreibzugriffen prüfen
+EVICT_EVERY = 200
+
+# last_used_at gebündelt schreiben: ab so vielen Einträgen oder nach so vielen Sekunden
+TOUCH_BATCH = 100
+TOUCH_FLUSH_SECONDS = 30.0
+
+# Max. Parameter je IN (...)-Abfrage
+IN_CHUNK = 500
+
+Key = Tuple[str, int, str, str]
+
+_lock = threading.Lock()
+_pending_touches: Dict[Key, str] = {}
+_last_flush = time.monotonic()
+_puts_since_evict = 0
+_evict_due = False
+
+
+def _now() -> str:
+    return datetime.datetime.utcnow().isoformat(timespec="seconds") + "Z"
+
+
+def make_key(taric_code: str, digits: int, sim_date: str, language: str) -> Key:
+    return (taric_code, int(digits), sim_date or "", (language or "DE").upper())
+
+
+# --------------------------------------------------
+# Schema + Übernahme alter Formate
+# --------------------------------------------------
+
+_CREATE_SQL = """
+    CREATE TABLE IF NOT EXISTS taric_official_cache (
+        id           INTEGER PRIMARY KEY AUTOINCREMENT,
+        taric_code   TEXT NOT NULL,
+        digits       INTEGER NOT NULL,
+        sim_date     TEXT NOT NULL DEFAULT '',
+        language     TEXT NOT NULL,
+        source       TEXT NOT NULL,
+        description  TEXT,
+        rows_json    BLOB,
+        raw_payload  BLOB,
+        source_url   TEXT,
+        fetched_at   TEXT NOT NULL,
+        last_used_at TEXT NOT NULL,
+        size_bytes   INTEGER NOT NULL DEFAULT 0,
+        UNIQUE (taric_code, digits, sim_date, language)
+    )
+"""
+
+
+def _columns(conn: sqlite3.Connection, table: str) -> List[str]:
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def ensure_schema(conn: sqlite3.Connection) -> None:
+    """Legt die Tabelle an und übernimmt ggf. Daten aus einem alten Format."""
+    cols = _columns(conn, "taric_official_cache")
+    if cols and "size_bytes" not in cols:
+        _migrate_legacy(conn, cols)
+    conn.execute(_CREATE_SQL)
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_taric_official_cache_last_used "
+        "ON taric_official_cache(last_used_at)"
+    )
+
+
+def _migrate_legacy(conn: sqlite3.Connection, cols: List[str]) -> None:
+    conn.execute("DROP TABLE IF EXISTS taric_official_cache_legacy")
+    conn.execute("ALTER TABLE taric_official_cache RENAME TO taric_official_cache_legacy")
+    conn.execute(_CREATE_SQL)
+
+    if "taric_prefix" in cols:
+        # Format aus backend.py; bei Duplikaten gewinnt die jüngste Zeile
+        rows_col = "official_rows_json" if "official_rows_json" in cols else "NULL"
+        legacy = conn.execute(
+            f"""
+            SELECT taric_prefix, digits, sim_date, lang, official_description,
+                   {rows_col}, source_url, created_at, last_used_at
+              FROM taric_official_cache_legacy
+             ORDER BY rowid
+            """
+        ).fetchall()
+        params = [
+            _row_params(r[0], r[1], r[2], r[3], SOURCE_WEB, r[4], r[5], None, r[6], r[7], r[8])
+            for r in legacy
+            if r[0]
+        ]
+    else:
+        # Format aus migrate_2025_12 / taric_official_repository
+        legacy = conn.execute(
+            """
+            SELECT taric_code, language, description, source, fetched_at, raw_payload
+              FROM taric_official_cache_legacy
+            """
+        ).fetchall()
+        params = [
+            _row_params(r[0], len(r[0]), "", r[1], r[3] or SOURCE_WSDL, r[2], None,
+                        encode_text(r[5]) if STORE_RAW and r[5] else None, None, r[4], r[4])
+            for r in legacy
+            if r[0]
+        ]
+
+    conn.executemany(_UPSERT_SQL, params)
+    conn.execute("DROP TABLE taric_official_cache_legacy")
+    logger.info("taric_official_cache: %s Zeilen aus altem Format übernommen", len(params))
+
+
+# --------------------------------------------------
+# Lesen / Schreiben
+# --------------------------------------------------
+
+_UPSERT_SQL = """
+    INSERT INTO taric_official_cache (
+        taric_code, digits, sim_date, language, source, description,
+        rows_json, raw_payload, source_url, fetched_at, last_used_at, size_bytes
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(taric_code, digits, sim_date, language) DO UPDATE SET
+        source       = excluded.source,
+        description  = excluded.description,
+        rows_json    = excluded.rows_json,
+        raw_payload  = excluded.raw_payload,
+        source_url   = excluded.source_url,
+        fetched_at   = excluded.fetched_at,
+        last_used_at = excluded.last_used_at,
+        size_bytes   = excluded.size_bytes
+"""
+
+
+def _size(value: Any) -> int:
+    if value is None:
+        return 0
+    if isinstance(value, str):
+        return len(value.encode("utf-8"))
+    return len(value)
+
+
+def _row_params(taric_code, digits, sim_date, language, source, description,
+                rows_json, raw_payload, source_url, fetched_at, last_used_at) -> tuple:
+    taric_code, digits, sim_date, language = make_key(taric_code, digits, sim_date, language)
+    fetched_at = fetched_at or _now()
+    size = _size(description) + _size(rows_json) + _size(raw_payload)
+    return (
+        taric_code, digits, sim_date, language, source, description,
+        rows_json, raw_payload, source_url, fetched_at, last_used_at or fetched_at, size,
+    )
+
+
+def get(conn: sqlite3.Connection, taric_code: str, digits: int, sim_date: str, language: str,
+        with_raw: bool = False) -> Optional[Dict[str, Any]]:
+    """Eintrag als Dict oder None; merkt den Zugriff für last_used_at vor."""
+    key = make_key(taric_code, digits, sim_date, language)
+    raw_col = "raw_payload" if with_raw else "NULL"
+    row = conn.execute(
+        f"""
+        SELECT source, description, rows_json, {raw_col}, source_url, fetched_at
+          FROM taric_official_cache
+         WHERE taric_code = ? AND digits = ? AND sim_date = ? AND language = ?
+        """,
+        key,
+    ).fetchone()
+    if row is None:
+        return None
+
+    _touch(conn, key)
+    return {
+        "taric_code": key[0],
+        "digits": key[1],
+        "sim_date": key[2],
+        "language": key[3],
+        "source": row[0],
+        "description": row[1],
+        "rows": decode_json(row[2], default=[]),
+        "raw": decode_text(row[3]) if with_raw else None,
+        "source_url": row[4],
+        "fetched_at": row[5],
+    }
+
+
+def get_many(conn: sqlite3.Connection, keys: List[Key]) -> Dict[Key, Dict[str, Any]]:
+    """
+    Mehrere Einträge mit einer IN-Abfrage je (sim_date, language) und Block
+    von IN_CHUNK Codes. Rückgabe nur für gefundene Schlüssel.
+    """
+    keys = [make_key(*k) for k in keys]
+    wanted = set(keys)
+    groups: Dict[Tuple[str, str], List[str]] = {}
+    for code, _digits, sim_date, language in wanted:
+        groups.setdefault((sim_date, language), []).append(code)
+
+    found: Dict[Key, Dict[str, Any]] = {}
+    for (sim_date, language), codes in groups.items():
+        codes = sorted(set(codes))
+        for i in range(0, len(codes), IN_CHUNK):
+            chunk = codes[i : i + IN_CHUNK]
+            placeholders = ",".join("?" * len(chunk))
+            rows = conn.execute(
+                f"""
+                SELECT taric_code, digits, source, description, rows_json, source_url, fetched_at
+                  FROM taric_official_cache
+                 WHERE sim_date = ? AND language = ? AND taric_code IN ({placeholders})
+                """,
+                (sim_date, language, *chunk),
+            ).fetchall()
+            for row in rows:
+                key = (row[0], row[1], sim_date, language)
+                if key not in wanted:
+                    continue
+                found[key] = {
+                    "taric_code": row[0],
+                    "digits": row[1],
+                    "sim_date": sim_date,
+                    "language": language,
+                    "source": row[2],
+                    "description": row[3],
+                    "rows": decode_json(row[4], default=[]),
+                    "raw": None,
+                    "source_url": row[5],
+                    "fetched_at": row[6],
+                }
+
+    for key in found:
+        _touch(conn, key)
+    return found
+
+
+def put(conn: sqlite3.Connection, taric_code: str, digits: int, sim_date: str, language: str,
+        source: str, description: Optional[str], rows: Optional[list] = None,
+        raw: Optional[str] = None, source_url: Optional[str] = None,
+        fetched_at: Optional[str] = None) -> None:
+    """Upsert eines Eintrags (Commit und maybe_evict() durch den Aufrufer)."""
+    put_many(conn, [{
+        "taric_code": taric_code, "digits": digits, "sim_date": sim_date, "language": language,
+        "source": source, "description": description, "rows": rows, "raw": raw,
+        "source_url": source_url, "fetched_at": fetched_at,
+    }])
+
+
+def put_many(conn: sqlite3.Connection, entries: List[Dict[str, Any]]) -> None:
+    """
+    Upsert vieler Einträge mit einem executemany (Commit und maybe_evict()
+    durch den Aufrufer). Schlüssel je Eintrag wie bei put().
+    """
+    global _puts_since_evict, _evict_due
+    now = _now()
+    params = [
+        _row_params(
+            e["taric_code"], e["digits"], e.get("sim_date") or "", e["language"],
+            e["source"], e.get("description"),
+            encode_json(e["rows"]) if e.get("rows") else None,
+            encode_text(e["raw"]) if STORE_RAW and e.get("raw") else None,
+            e.get("source_url"), e.get("fetched_at"), now,
+        )
+        for e in entries
+    ]
+    if not params:
+        return
+    conn.executemany(_UPSERT_SQL, params)
+
+    with _lock:
+        for p in params:
+            _pending_touches.pop(p[:4], None)
+        _puts_since_evict += len(params)
+        if _puts_since_evict >= EVICT_EVERY:
+            _puts_since_evict = 0
+            _evict_due = True
+
+
+# --------------------------------------------------
+# last_used_at gebündelt
+# --------------------------------------------------
+
+def _touch(conn: sqlite3.Connection, key: Key) -> None:
+    with _lock:
+        _pending_touches[key] = _now()
+
+
+def _touches_due() -> bool:
+    with _lock:
+        return bool(_pending_touches) and (
+            len(_pending_touches) >= TOUCH_BATCH
+            or time.monotonic() - _last_flush >= TOUCH_FLUSH_SECONDS
+        )
+
+
+def maybe_evict(conn: sqlite3.Connection) -> int:
+    """
+    Fällige Pflege nach get/put: vorgemerkte Zugriffe schreiben und, nach
+    EVICT_EVERY Schreibzugriffen, verdrängen. Erst nach dem eigenen Commit
+    aufrufen; bei offener Transaktion wird nichts getan (nächster Aufruf).
+    Rückgabe: Anzahl verdrängter Einträge.
+    """
+    global _evict_due
+    if conn.in_transaction:
+        return 0
+    with _lock:
+        evict_now = _evict_due
+        _evict_due = False
+    if evict_now:
+        return evict(conn)  # schreibt die Zugriffe vorher selbst
+    if _touches_due():
+        flush_touches(conn)
+    return 0
+
+
+def flush_touches(conn: sqlite3.Connection) -> int:
+    """
+    Schreibt alle vorgemerkten Zugriffe in einer eigenen Transaktion
+    (nur ohne offene Transaktion des Aufrufers verwenden).
+    """
+    global _last_flush
+    with _lock:
+        pending = list(_pending_touches.items())
+        _pending_touches.clear()
+        _last_flush = time.monotonic()
+    if not pending:
+        return 0
+    with conn:
+        conn.executemany(
+            """
+            UPDATE taric_official_cache
+               SET last_used_at = ?
+             WHERE taric_code = ? AND digits = ? AND sim_date = ? AND language = ?
+               AND last_used_at < ?
+            """,
+            [(used, *key, used) for key, used in pending],
+        )
+    return len(pending)
+
+
+# --------------------------------------------------
+# Verdrängung
+# --------------------------------------------------
+
+def evict(conn: sqlite3.Connection, max_rows: int = MAX_ROWS, max_bytes: int = MAX_BYTES,
+          max_age_days: int = MAX_AGE_DAYS) -> int:
+    """
+    Löscht zuerst Einträge, die länger als max_age_days nicht genutzt wurden,
+    dann die am längsten ungenutzten, bis Zeilenzahl und Größe passen.
+    Eigene Transaktion – nicht mit offener Transaktion des Aufrufers verwenden.
+    """
+    flush_touches(conn)
+    deleted = 0
+    with conn:
+        if max_age_days:
+            cutoff = (
+                datetime.datetime.utcnow() - datetime.timedelta(days=max_age_days)
+            ).isoformat(timespec="seconds") + "Z"
+            deleted += conn.execute(
+                "DELETE FROM taric_official_cache WHERE last_used_at < ?", (cutoff,)
+            ).rowcount
+
+        count, total = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size_bytes), 0) FROM taric_official_cache"
+        ).fetchone()
+        if (max_rows and count > max_rows) or (max_bytes and total > max_bytes):
+            # Grenze über laufende Summe (neueste zuerst) bestimmen, Rest löschen
+            keep_rows = max_rows or count
+            keep_bytes = max_bytes or total
+            deleted += conn.execute(
+                """
+                DELETE FROM taric_official_cache
+                 WHERE id IN (
+                    SELECT id FROM (
+                        SELECT id,
+                               ROW_NUMBER() OVER (ORDER BY last_used_at DESC, id DESC) AS rn,
+                               SUM(size_bytes) OVER (ORDER BY last_used_at DESC, id DESC) AS running
+                          FROM taric_official_cache
+                    )
+                     WHERE rn > ? OR running > ?
+                 )
+                """,
+                (keep_rows, keep_bytes),
+            ).rowcount
+
+    if deleted:
+        logger.info("taric_official_cache: %s Einträge verdrängt", deleted)
+    return deleted
+
+
+def stats(conn: sqlite3.Connection) -> Dict[str, Any]:
+    count, total, oldest = conn.execute(
+        "SELECT COUNT(*), COALESCE(SUM(size_bytes), 0), MIN(last_used_at) FROM taric_official_cache"
+    ).fetchone()
+    with _lock:
+        pending = len(_pending_touches)
+    return {
+        "rows": count,
+        "size_bytes": total,
+        "oldest_last_used_at": oldest,
+        "pending_touches": pending,
+        "max_rows": MAX_ROWS,
+        "max_bytes": MAX_BYTES,
+        "max_age_days": MAX_AGE_DAYS,
+    }
@@ -0,0 +1,212 @@
+"""
+taric_official_extract.py
+
+Verantwortung:
+- Extraktion der offiziellen Beschreibung aus der TARIC-Consultation-Seite
+- Ergebnis als strukturierte Zeilen ({"code", "text"}) statt kompletter HTML-Seite
+- Mehrere Engines, schnellste verfügbare wird automatisch gewählt:
+    * "selectolax" – Paket selectolax (optional)
+    * "lxml"       – Paket lxml (optional)
+    * "slice"      – nur Standardbibliothek: sucht die Anker-IDs per Regex und
+                     parst nur die umschließenden <tr>-Zeilen, nicht die ganze Seite
+    * "bs4"        – bisherige BeautifulSoup/html.parser-Variante (Referenz für Benchmarks)
+
+Alle Engines arbeiten ankerbasiert: Anker-ID = Präfix auf 10 Stellen mit
+Nullen aufgefüllt (z.B. '8517' -> '8517000000'); mit Expand=true liefert die
+Seite zusätzlich die Unterpositionen, deren Anker mit dem Präfix beginnen.
+Ohne Anker wird wie bisher nach Textstellen mit dem Präfix gesucht.
+"""
+
+from dataclasses import dataclass, field
+from html import unescape
+from typing import Callable, Dict, List, Optional
+import asyncio
+import os
+import re
+
+try:
+    from selectolax.parser import HTMLParser as _SelectolaxParser  # optional
+except ImportError:
+    _SelectolaxParser = None
+
+try:
+    import lxml.html as _lxml_html  # optional
+except ImportError:
+    _lxml_html = None
+
+try:
+    from bs4 import BeautifulSoup
+except ImportError:
+    BeautifulSoup = None
+
+# "auto" oder fester Engine-Name (siehe ENGINES)
+ENGINE = os.getenv("TARIC_HTML_ENGINE", "auto")
+
+# Max. Länge der zusammengesetzten Fallback-Beschreibung (wie bisher)
+MAX_FALLBACK_CHARS = 4000
+
+_ANCHOR_RE = re.compile(r"""\b(?:id|name)\s*=\s*["']?(\d{10})\b""", re.IGNORECASE)
+_TAG_RE = re.compile(r"<[^>]+>")
+_SCRIPT_RE = re.compile(r"<(script|style)\b.*?</\1\s*>", re.IGNORECASE | re.DOTALL)
+_WS_RE = re.compile(r"\s+")
+
+
+@dataclass
+class OfficialExtract:
+    description: Optional[str]
+    rows: List[Dict[str, str]] = field(default_factory=list)
+    engine: str = ""
+
+
+def _clean(text: str) -> str:
+    return _WS_RE.sub(" ", text.replace("\xa0", " ")).strip()
+
+
+def _result(anchor_id: str, rows: List[Dict[str, str]], fallback: List[str], engine: str) -> OfficialExtract:
+    """Gemeinsame Nachbearbeitung: Beschreibung = Text der Ankerzeile, sonst Fallback."""
+    rows = [r for r in rows if r["text"]]
+    # Doppelte Zeilen (Anker mit id und name in derselben Zeile) entfernen
+    rows = list({(r["code"], r["text"]): r for r in rows}.values())
+    for row in rows:
+        if row["code"] == anchor_id:
+            return OfficialExtract(row["text"], rows, engine)
+
+    unique = list(dict.fromkeys(t for t in fallback if t))
+    if unique:
+        return OfficialExtract(" | ".join(unique)[:MAX_FALLBACK_CHARS], rows, engine)
+    return OfficialExtract(None, rows, engine)
+
+
+# --------------------------------------------------
+# Engines
+# --------------------------------------------------
+
+def _extract_slice(html: str, taric_prefix: str, anchor_id: str) -> OfficialExtract:
+    lower = html.lower()
+    rows: List[Dict[str, str]] = []
+    seen_rows = set()
+
+    for match in _ANCHOR_RE.finditer(html):
+        code = match.group(1)
+        if not code.startswith(taric_prefix):
+            continue
+        pos = match.start()
+        tr_start = lower.rfind("<tr", 0, pos)
+        # Anker liegt nur in der Zeile, wenn diese vor dem Anker nicht schon geschlossen wurde
+        if tr_start == -1 or lower.rfind("</tr", tr_start, pos) != -1:
+            start = lower.rfind("<", 0, pos)
+            end = lower.find("</div", pos)
+        else:
+            start = tr_start
+            end = lower.find("</tr", pos)
+        if end == -1:
+            end = len(html)
+        if (start, end) in seen_rows:
+            continue
+        seen_rows.add((start, end))
+        fragment = _SCRIPT_RE.sub(" ", html[start:end])
+        rows.append({"code": code, "text": _clean(unescape(_TAG_RE.sub(" ", fragment)))})
+
+    fallback: List[str] = []
+    if not any(r["code"] == anchor_id for r in rows):
+        body = _SCRIPT_RE.sub(" ", html)
+        for text in re.findall(r">([^<]*" + re.escape(taric_prefix) + r"[^<]*)<", body):
+            fallback.append(_clean(unescape(text)))
+    return _result(anchor_id, rows, fallback, "slice")
+
+
+def _extract_lxml(html: str, taric_prefix: str, anchor_id: str) -> OfficialExtract:
+    doc = _lxml_html.fromstring(html)
+    rows: List[Dict[str, str]] = []
+    for el in doc.xpath(
+        "//*[starts-with(@id, $p) or starts-with(@name, $p)]", p=taric_prefix
+    ):
+        code = el.get("id") or el.get("name") or ""
+        if len(code) != 10 or not code.isdigit():
+            continue
+        container = next(iter(el.xpath("ancestor::tr[1]")), None)
+        if container is None:
+            container = next(iter(el.xpath("ancestor::div[1]")), None) or el.getparent()
+        if container is not None:
+            rows.append({"code": code, "text": _clean(" ".join(container.itertext()))})
+
+    fallback: List[str] = []
+    if not any(r["code"] == anchor_id for r in rows):
+        for parent in doc.xpath(
+            "//text()[contains(., $p)][not(ancestor::script or ancestor::style)]/..", p=taric_prefix
+        ):
+            fallback.append(_clean(" ".join(parent.itertext())))
+    return _result(anchor_id, rows, fallback, "lxml")
+
+
+def _extract_selectolax(html: str, taric_prefix: str, anchor_id: str) -> OfficialExtract:
+    tree = _SelectolaxParser(html)
+    rows: List[Dict[str, str]] = []
+    for el in tree.css(f'[id^="{taric_prefix}"], [name^="{taric_prefix}"]'):
+        code = el.attributes.get("id") or el.attributes.get("name") or ""
+        if len(code) != 10 or not code.isdigit():
+            continue
+        container = el.parent
+        while container is not None and container.tag not in ("tr", "div"):
+            container = container.parent
+        container = container or el.parent
+        if container is not None:
+            rows.append({"code": code, "text": _clean(container.text(separator=" "))})
+
+    if any(r["code"] == anchor_id for r in rows):
+        return _result(anchor_id, rows, [], "selectolax")
+    # Selten benötigt: Textsuche ohne Anker über die Slice-Engine
+    fallback = _extract_slice(html, taric_prefix, anchor_id)
+    return OfficialExtract(fallback.description, rows or fallback.rows, "selectolax")
+
+
+def _extract_bs4(html: str, taric_prefix: str, anchor_id: str) -> OfficialExtract:
+    soup = BeautifulSoup(html, "html.parser")
+    rows: List[Dict[str, str]] = []
+    anchor = soup.find(id=anchor_id) or soup.find("a", attrs={"name": anchor_id})
+    if anchor:
+        container = anchor.find_parent("tr") or anchor.find_parent("div") or anchor.parent
+        if container:
+            rows.append({"code": anchor_id, "text": _clean(" ".join(container.stripped_strings))})
+
+    fallback: List[str] = []
+    if not rows:
+        for t in soup.find_all(string=lambda s: s and taric_prefix in s):
+            if t.parent:
+                fallback.append(" ".join(t.parent.stripped_strings))
+    return _result(anchor_id, rows, fallback, "bs4")
+
+
+ENGINES: Dict[str, Callable[[str, str, str], OfficialExtract]] = {"slice": _extract_slice}
+if _SelectolaxParser is not None:
+    ENGINES["selectolax"] = _extract_selectolax
+if _lxml_html is not None:
+    ENGINES["lxml"] = _extract_lxml
+if BeautifulSoup is not None:
+    ENGINES["bs4"] = _extract_bs4
+
+
+def default_engine() -> str:
+    if ENGINE != "auto" and ENGINE in ENGINES:
+        return ENGINE
+    for name in ("selectolax", "lxml", "slice"):
+        if name in ENGINES:
+            return name
+    return "slice"
+
+
+def extract(html: str, taric_prefix: str, digits: int, engine: Optional[str] = None) -> OfficialExtract:
+    """
+    Extrahiert Beschreibung + Zeilen für den Präfix (z.B. '8517' bei digits=4).
+    Läuft synchron; im Backend über extract_async aufrufen.
+    """
+    name = engine or default_engine()
+    if not html:
+        return OfficialExtract(None, [], name)
+    anchor_id = taric_prefix[:digits].ljust(10, "0")
+    return ENGINES[name](html, taric_prefix[:digits], anchor_id)
+
+
+async def extract_async(html: str, taric_prefix: str, digits: int, engine: Optional[str] = None) -> OfficialExtract:
+    """extract() im Thread-Pool, damit der Event-Loop nicht blockiert."""
+    return await asyncio.to_thread(extract, html, taric_prefix, digits, engine)
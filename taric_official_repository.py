@@ -2,23 +2,40 @@
 taric_official_repository.py
 
 Verantwortung:
-- Zugriff auf taric_official_cache in taric_live.db
-- Caching-Strategie für offizielle TARIC-Beschreibungen
-- Öffentliche Funktion: get_official_description(taric_code, lang, max_age_hours)
+- Zugriff auf taric_official_cache in taric_live.db (Schema/Upsert: taric_official_cache.py)
+- Caching-Strategie für offizielle TARIC-Beschreibungen:
+    * prozessinterner LRU/TTL-Cache vor SQLite (taric_memory_cache)
+    * veraltete Einträge sofort liefern, Aktualisierung im Hintergrund
+    * "nicht gefunden" kurzzeitig negativ cachen
+- Öffentliche Funktionen:
+    * get_official_description(taric_code, lang, max_age_hours)
+    * get_official_descriptions(codes, lang, max_age_hours) + async aget_official_descriptions
+      (eine Cache-Abfrage, parallele WSDL-Abrufe, Rückschreiben in einer Transaktion)
 """
 
-from typing import Optional, Dict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, List, Optional, Dict
+import asyncio
 import os
 import sqlite3
 import datetime
 import logging
 
 from taric_wsdl_client import fetch_from_wsdl, TaricWsdlError
+from taric_memory_cache import LRUTTLCache, BackgroundRefresher, MISS
+import taric_official_cache
 
 logger = logging.getLogger(__name__)
 
 DB_PATH = os.getenv("TARIC_DB_PATH", "taric_live.db")
 
+# Max. parallele WSDL-Abrufe bei Bulk-Abfragen (entspricht dem Session-Pool)
+WSDL_CONCURRENCY = int(os.getenv("TARIC_WSDL_CONCURRENCY", os.getenv("TARIC_WSDL_POOL_SIZE", "8")))
+
+# Stufe 1: Speicher (Schlüssel: (taric_code, lang)), Stufe 2: taric_official_cache
+_memory_cache = LRUTTLCache()
+_refresher = BackgroundRefresher()
+
 
 def _get_db_connection() -> sqlite3.Connection:
     # Wenn du bereits ein `db.py` mit get_db_connection hast, kannst du das hier ersetzen:
@@ -29,30 +46,20 @@ def _get_db_connection() -> sqlite3.Connection:
     return conn
 
 
-def _row_to_dict(row: sqlite3.Row) -> Dict:
-    return {
-        "taric_code": row["taric_code"],
-        "language": row["language"],
-        "description": row["description"],
-        "source": row["source"],
-        "fetched_at": row["fetched_at"],
-        "raw": row["raw_payload"],
-    }
-
-
 def _load_from_cache(taric_code: str, lang: str) -> Optional[Dict]:
     with _get_db_connection() as conn:
-        cur = conn.execute(
-            """
-            SELECT taric_code, language, description, source, fetched_at, raw_payload
-              FROM taric_official_cache
-             WHERE taric_code = ?
-               AND language   = ?
-            """,
-            (taric_code, lang),
-        )
-        row = cur.fetchone()
-        return _row_to_dict(row) if row else None
+        entry = taric_official_cache.get(conn, taric_code, len(taric_code), "", lang, with_raw=True)
+        taric_official_cache.maybe_evict(conn)
+    if not entry:
+        return None
+    return {
+        "taric_code": entry["taric_code"],
+        "language": entry["language"],
+        "description": entry["description"],
+        "source": entry["source"],
+        "fetched_at": entry["fetched_at"],
+        "raw": entry["raw"],
+    }
 
 
 def _is_fresh(entry: Dict, max_age_hours: Optional[int]) -> bool:
@@ -68,43 +75,56 @@ def _is_fresh(entry: Dict, max_age_hours: Optional[int]) -> bool:
 
 def _save_to_cache(data: Dict) -> None:
     with _get_db_connection() as conn:
-        conn.execute(
-            """
-            INSERT INTO taric_official_cache (taric_code, language, description, source, fetched_at, raw_payload)
-            VALUES (?, ?, ?, ?, ?, ?)
-            ON CONFLICT(taric_code, language)
-            DO UPDATE SET
-              description = excluded.description,
-              source      = excluded.source,
-              fetched_at  = excluded.fetched_at,
-              raw_payload = excluded.raw_payload;
-            """,
-            (
-                data["taric_code"],
-                data["language"],
-                data["description"],
-                data["source"],
-                data["fetched_at"],
-                data.get("raw"),
-            ),
+        taric_official_cache.put(
+            conn,
+            data["taric_code"],
+            len(data["taric_code"]),
+            "",
+            data["language"],
+            source=data["source"],
+            description=data["description"],
+            raw=data.get("raw"),
+            fetched_at=data["fetched_at"],
         )
         conn.commit()
+        taric_official_cache.maybe_evict(conn)
+
+
+def _refresh_from_wsdl(taric_code: str, lang: str) -> Optional[Dict]:
+    """
+    Holt den Eintrag via WSDL, schreibt ihn in beide Cache-Stufen und gibt ihn zurück.
+    None = nicht gefunden (wird negativ gecacht). Wirft TaricWsdlError.
+    """
+    wsdl_result = fetch_from_wsdl(taric_code, lang, keep_raw=taric_official_cache.STORE_RAW)
+    if wsdl_result is None:
+        logger.info("Keine offizielle TARIC-Beschreibung gefunden: code=%s lang=%s", taric_code, lang)
+        _memory_cache.set((taric_code, lang), None)
+        return None
+
+    _save_to_cache(wsdl_result)
+    entry = _load_from_cache(taric_code, lang)
+    _memory_cache.set((taric_code, lang), entry)
+    return entry
 
 
 def get_official_description(taric_code: str,
                              lang: str = "DE",
-                             max_age_hours: Optional[int] = 24) -> Optional[Dict]:
+                             max_age_hours: Optional[int] = 24,
+                             stale_while_revalidate: bool = True) -> Optional[Dict]:
     """
     High-Level-Funktion für Backend und Evaluation-Endpoints.
 
     Ablauf:
-    1. Cache prüfen (taric_official_cache)
+    1. Speicher-Cache prüfen, sonst taric_official_cache (SQLite)
     2. Wenn Eintrag existiert und (optional) nicht zu alt -> zurückgeben.
-    3. Sonst via WSDL holen, in Cache schreiben, zurückgeben.
+    3. Veralteter Eintrag -> sofort zurückgeben, WSDL-Abruf im Hintergrund
+       (bei stale_while_revalidate=False wie bisher blockierend).
+    4. Kein Eintrag -> via WSDL holen, in Cache schreiben, zurückgeben.
 
     :param taric_code: TARIC / Goods Code (10-stellig bevorzugt).
     :param lang: Sprachcode ('DE', 'EN', ...)
     :param max_age_hours: maximale "Alter" des Cache-Eintrags; None = immer verwenden.
+    :param stale_while_revalidate: veraltete Einträge liefern und im Hintergrund aktualisieren.
     :return: Dict mit offizieller Beschreibung oder None, wenn nichts gefunden.
     """
 
@@ -114,27 +134,165 @@ def get_official_description(taric_code: str,
         return None
 
     lang = (lang or "DE").upper()
+    key = (taric_code, lang)
+
+    # 1. Cache prüfen (Speicher, dann SQLite)
+    cached = _memory_cache.get(key)
+    if cached is None:
+        logger.info("TARIC official negativ gecacht: code=%s lang=%s", taric_code, lang)
+        return None
+    if cached is MISS:
+        cached = _load_from_cache(taric_code, lang)
+        if cached:
+            _memory_cache.set(key, cached)
 
-    # 1. Cache prüfen
-    cached = _load_from_cache(taric_code, lang)
     if cached and _is_fresh(cached, max_age_hours):
         logger.info("TARIC official aus Cache: code=%s lang=%s", taric_code, lang)
         return cached
 
+    if cached and stale_while_revalidate:
+        if _refresher.submit(key, lambda: _refresh_from_wsdl(taric_code, lang)):
+            logger.info("TARIC official veraltet, Aktualisierung im Hintergrund: code=%s lang=%s", taric_code, lang)
+        return cached
+
     # 2. WSDL-Aufruf
     try:
-        wsdl_result = fetch_from_wsdl(taric_code, lang)
+        return _refresh_from_wsdl(taric_code, lang)
     except TaricWsdlError as exc:
         logger.error("Fehler beim TARIC-WSDL-Aufruf: %s", exc)
-        # Falls es einen veralteten Cache gibt, kannst du den optional trotzdem zurückgeben:
+        # Falls es einen veralteten Cache gibt, wird er trotzdem zurückgegeben
+        return cached
+    except Exception:
+        # Unerwarteter Fehler (Client, Cache-Schreiben): ebenfalls veralteten Cache liefern
+        logger.exception("Unerwarteter Fehler beim TARIC-WSDL-Abruf: code=%s lang=%s", taric_code, lang)
         return cached
 
-    if wsdl_result is None:
-        # Nichts gefunden
-        logger.info("Keine offizielle TARIC-Beschreibung gefunden: code=%s lang=%s", taric_code, lang)
-        return None
 
-    # 3. Im Cache speichern
-    _save_to_cache(wsdl_result)
+def cache_stats() -> Dict:
+    return {**_memory_cache.stats(), "refresh_pending": _refresher.pending}
+
+
+def _fetch_many(codes: List[str], lang: str, max_workers: int) -> Dict[str, Dict]:
+    """
+    Parallele WSDL-Abrufe. Rückgabe je Code: {"result": Dict|None} oder {"error": str}.
+    """
+    def one(code: str) -> Dict:
+        try:
+            return {"result": fetch_from_wsdl(code, lang, keep_raw=taric_official_cache.STORE_RAW)}
+        except TaricWsdlError as exc:
+            return {"error": str(exc)}
+        except Exception as exc:
+            # Ein einzelner Ausreißer darf den restlichen Batch nicht abbrechen
+            logger.exception("Unerwarteter Fehler beim TARIC-WSDL-Abruf: code=%s lang=%s", code, lang)
+            return {"error": f"{type(exc).__name__}: {exc}"}
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="taric-wsdl") as pool:
+        return dict(zip(codes, pool.map(one, codes)))
+
+
+def get_official_descriptions(codes: Iterable[str],
+                              lang: str = "DE",
+                              max_age_hours: Optional[int] = 24,
+                              max_workers: int = WSDL_CONCURRENCY) -> Dict[str, Optional[Dict]]:
+    """
+    Bulk-Variante von get_official_description für viele Codes.
+
+    Ablauf:
+    1. Speicher-Cache, dann eine Abfrage für alle übrigen Codes (taric_official_cache.get_many)
+    2. Fehlende/veraltete Codes parallel via WSDL (max. max_workers gleichzeitig)
+    3. Alle neuen Einträge in einer Transaktion zurückschreiben
+
+    :return: {code: Dict oder None}; bei WSDL-Fehler bleibt ein veralteter Eintrag erhalten.
+             "raw" ist bei Cache-Treffern aus SQLite nicht enthalten.
+    """
+    lang = (lang or "DE").upper()
+    codes = list(dict.fromkeys((c or "").strip() for c in codes if c and c.strip()))
+    results: Dict[str, Optional[Dict]] = {}
+    stale: Dict[str, Dict] = {}
+    to_fetch: List[str] = []
+
+    # 1. Speicher-Cache
+    pending = []
+    for code in codes:
+        cached = _memory_cache.get((code, lang))
+        if cached is None:
+            results[code] = None
+        elif cached is not MISS and _is_fresh(cached, max_age_hours):
+            results[code] = cached
+        else:
+            pending.append(code)
+
+    # 1b. SQLite in einer Abfrage
+    if pending:
+        with _get_db_connection() as conn:
+            found = taric_official_cache.get_many(conn, [(c, len(c), "", lang) for c in pending])
+            taric_official_cache.maybe_evict(conn)
+        for code in pending:
+            entry = found.get(taric_official_cache.make_key(code, len(code), "", lang))
+            if entry is None:
+                to_fetch.append(code)
+                continue
+            cached = {
+                "taric_code": code,
+                "language": lang,
+                "description": entry["description"],
+                "source": entry["source"],
+                "fetched_at": entry["fetched_at"],
+                "raw": None,
+            }
+            _memory_cache.set((code, lang), cached)
+            if _is_fresh(cached, max_age_hours):
+                results[code] = cached
+            else:
+                stale[code] = cached
+                to_fetch.append(code)
+
+    if not to_fetch:
+        return {code: results.get(code) for code in codes}
+
+    # 2. Parallele WSDL-Abrufe
+    logger.info("TARIC official Bulk: %s Codes aus Cache, %s per WSDL", len(codes) - len(to_fetch), len(to_fetch))
+    fetched = _fetch_many(to_fetch, lang, max_workers)
+
+    # 3. Rückschreiben in einer Transaktion
+    new_entries = []
+    errors = 0
+    for code, outcome in fetched.items():
+        if "error" in outcome:
+            errors += 1
+            results[code] = stale.get(code)
+            continue
+        data = outcome["result"]
+        if data is None:
+            _memory_cache.set((code, lang), None)
+            results[code] = None
+            continue
+        new_entries.append({
+            "taric_code": code,
+            "digits": len(code),
+            "language": lang,
+            "source": data["source"],
+            "description": data["description"],
+            "raw": data.get("raw"),
+            "fetched_at": data["fetched_at"],
+        })
+        results[code] = data
+        _memory_cache.set((code, lang), data)
+
+    if new_entries:
+        with _get_db_connection() as conn:
+            taric_official_cache.put_many(conn, new_entries)
+            conn.commit()
+            taric_official_cache.maybe_evict(conn)
+    if errors:
+        logger.error("TARIC official Bulk: %s WSDL-Fehler", errors)
+
+    return {code: results.get(code) for code in codes}
+
 
-    return _load_from_cache(taric_code, lang)
+async def aget_official_descriptions(codes: Iterable[str],
+                                     lang: str = "DE",
+                                     max_age_hours: Optional[int] = 24,
+                                     max_workers: int = WSDL_CONCURRENCY) -> Dict[str, Optional[Dict]]:
+    """Async-Variante für FastAPI-Handler; läuft komplett außerhalb des Event-Loops."""
+    return await asyncio.to_thread(get_official_descriptions, list(codes), lang, max_age_hours, max_workers)
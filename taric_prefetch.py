@@ -0,0 +1,144 @@
+"""
+taric_prefetch.py
+
+Verantwortung:
+- Offizielle Beschreibungen für neu klassifizierte Codes (Vorhersage + Alternativen)
+  im Hintergrund vorladen, damit die Evaluations-UI einen warmen Cache vorfindet
+- Niedrige Priorität: ein Worker, Ratenbegrenzung für echte Upstream-Abrufe,
+  Pause solange alle Upstream-Plätze durch interaktive Anfragen belegt sind
+- Deduplizierung: derselbe Schlüssel wird innerhalb von DEDUP_SECONDS nur einmal geladen
+
+enqueue() ist thread-safe und kann direkt aus store_classification aufgerufen
+werden; der Worker läuft im Event-Loop des Backends (start/stop im Lifespan).
+"""
+
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Tuple
+import asyncio
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# Max. echte Upstream-Abrufe pro Sekunde durch den Prefetcher
+RATE_PER_SECOND = float(os.getenv("TARIC_PREFETCH_RATE", "0.5"))
+
+# Wartende Codes; darüber hinaus wird verworfen (der Abruf passiert dann beim Öffnen)
+QUEUE_SIZE = 1000
+
+DEDUP_SECONDS = 6 * 3600
+DEDUP_MAX_KEYS = 20000
+
+Key = Tuple[str, int, str]
+FetchFn = Callable[[str, int, str], Awaitable[Dict[str, Any]]]
+
+
+class Prefetcher:
+    def __init__(self, fetch: FetchFn, busy: Optional[Callable[[], bool]] = None) -> None:
+        """
+        fetch(code, digits, sim_date) lädt bzw. cached eine Beschreibung und liefert
+        das Ergebnis-Dict (mit "from_cache"). busy() = True, solange interaktive
+        Anfragen alle Upstream-Plätze belegen.
+        """
+        self._fetch = fetch
+        self._busy = busy or (lambda: False)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._seen: Dict[Key, float] = {}
+        self.stats: Dict[str, int] = {
+            "enqueued": 0,
+            "deduplicated": 0,
+            "dropped": 0,
+            "fetched": 0,
+            "cache_hits": 0,
+            "errors": 0,
+        }
+
+    async def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self._worker = asyncio.create_task(self._run(), name="taric-prefetch")
+
+    async def stop(self) -> None:
+        worker, self._worker = self._worker, None
+        self._loop = None
+        if worker is not None:
+            worker.cancel()
+            try:
+                await worker
+            except asyncio.CancelledError:
+                pass
+
+    def enqueue(self, codes: Iterable[Any], digits: Iterable[int], sim_date: str) -> None:
+        """
+        Merkt gültige 10-stellige Codes für jede Präfixlänge in digits vor.
+        Codes kommen roh aus der Modellantwort ("8517 13 00 00", 8517130000) und
+        werden wie in taric_validation auf ihre Ziffern normalisiert.
+        """
+        loop = self._loop
+        if loop is None:
+            return  # Prefetcher läuft nicht (z.B. Skriptbetrieb)
+        digits = list(digits)
+        normalized = ("".join(ch for ch in str(c) if ch.isdigit()) for c in codes if c is not None)
+        keys = [
+            (code, d, sim_date)
+            for code in dict.fromkeys(normalized)
+            if len(code) == 10
+            for d in digits
+        ]
+        if keys:
+            try:
+                loop.call_soon_threadsafe(self._put, keys)
+            except RuntimeError:
+                pass  # Event-Loop bereits geschlossen
+
+    def _put(self, keys: list) -> None:
+        now = time.monotonic()
+        if len(self._seen) > DEDUP_MAX_KEYS:
+            self._seen = {k: t for k, t in self._seen.items() if now - t < DEDUP_SECONDS}
+        for key in keys:
+            seen_at = self._seen.get(key)
+            if seen_at is not None and now - seen_at < DEDUP_SECONDS:
+                self.stats["deduplicated"] += 1
+                continue
+            try:
+                self._queue.put_nowait(key)
+            except asyncio.QueueFull:
+                self.stats["dropped"] += 1
+                continue
+            self._seen[key] = now
+            self.stats["enqueued"] += 1
+
+    async def _run(self) -> None:
+        interval = 1.0 / RATE_PER_SECOND if RATE_PER_SECOND > 0 else 0.0
+        while True:
+            code, digits, sim_date = await self._queue.get()
+            # Interaktive Anfragen haben Vorrang
+            while self._busy():
+                await asyncio.sleep(0.5)
+            try:
+                result = await self._fetch(code, digits, sim_date)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                self.stats["errors"] += 1
+                # Bei Fehler später erneut zulassen
+                self._seen.pop((code, digits, sim_date), None)
+                logger.warning("Prefetch für %s (%s Stellen) fehlgeschlagen: %s", code, digits, exc)
+                await asyncio.sleep(interval)
+                continue
+
+            if result.get("from_cache"):
+                self.stats["cache_hits"] += 1
+            else:
+                self.stats["fetched"] += 1
+                await asyncio.sleep(interval)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "running": self._worker is not None and not self._worker.done(),
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "rate_per_second": RATE_PER_SECOND,
+        }
@@ -0,0 +1,229 @@
+"""
+taric_storage_codec.py
+
+Verantwortung:
+- Kompakte Ablage großer JSON-Felder (raw_response_json, alternatives_json) in SQLite
+- Format-Marker im BLOB, damit alte unkomprimierte TEXT-Zeilen lesbar bleiben
+- Optional zstd mit trainiertem Dictionary (Paket `zstandard`), sonst zlib
+
+Format eines komprimierten Wertes (BLOB):
+    b"TZ\\x01" + zlib-Daten
+    b"TZ\\x02" + dict_id (4 Byte, big endian) + zstd-Daten
+
+Alles, was als str aus der DB kommt, ist ein Alt-Eintrag und wird unverändert
+zurückgegeben.
+
+zstd-Dictionaries: ZSTD_DICT_PATH ist das aktive Dictionary (zum Kodieren).
+Jedes Dictionary wird zusätzlich unter seiner id abgelegt
+(taric_response.<dict_id>.zdict daneben); beim Dekodieren wird es über die id im
+Marker gesucht. Neu trainieren macht alte Einträge daher nicht unlesbar.
+"""
+
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Union
+import json
+import logging
+import os
+import zlib
+
+try:
+    import zstandard  # optional, nicht in requirements.txt
+except ImportError:  # Fallback: nur zlib
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).resolve().parent
+
+# "zlib" (Standard), "zstd" (nur mit zstandard + Dictionary) oder "none"
+RESPONSE_CODEC = os.getenv("TARIC_RESPONSE_CODEC", "zlib").lower()
+
+# Trainiertes zstd-Dictionary über den Response-Korpus
+ZSTD_DICT_PATH = Path(
+    os.getenv("TARIC_RESPONSE_ZDICT", str(BASE_DIR / "data" / "taric_response.zdict"))
+)
+
+ZLIB_LEVEL = 9
+ZSTD_LEVEL = 19
+
+MARKER_ZLIB = b"TZ\x01"
+MARKER_ZSTD_DICT = b"TZ\x02"
+
+StoredValue = Union[str, bytes, memoryview, None]
+
+
+class StorageCodecError(Exception):
+    """Fehler beim Dekodieren eines gespeicherten Wertes."""
+
+
+class UnknownDictionaryError(StorageCodecError):
+    """zstd-Eintrag, dessen Dictionary (bzw. das Paket zstandard) fehlt – keine defekten Daten."""
+
+
+_zstd_dict = None
+_zstd_dicts_by_id: Dict[int, Any] = {}
+
+
+def dict_path_for(dict_id: int) -> Path:
+    """Ablage eines Dictionaries nach id: taric_response.<dict_id>.zdict neben ZSTD_DICT_PATH."""
+    return ZSTD_DICT_PATH.with_name(f"{ZSTD_DICT_PATH.stem}.{dict_id}{ZSTD_DICT_PATH.suffix}")
+
+
+def _archive_dict(zdict) -> None:
+    """Legt ein Dictionary unter seiner id ab (idempotent)."""
+    path = dict_path_for(zdict.dict_id())
+    if not path.exists():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(zdict.as_bytes())
+
+
+def _load_zstd_dict():
+    """Lädt das aktive zstd-Dictionary einmalig (oder None, wenn nicht verfügbar)."""
+    global _zstd_dict
+    if _zstd_dict is not None or zstandard is None:
+        return _zstd_dict
+    if ZSTD_DICT_PATH.exists():
+        _zstd_dict = zstandard.ZstdCompressionDict(ZSTD_DICT_PATH.read_bytes())
+        _zstd_dicts_by_id[_zstd_dict.dict_id()] = _zstd_dict
+        # Aktive Dictionaries aus der Zeit vor der Ablage nach id nachträglich sichern
+        _archive_dict(_zstd_dict)
+        logger.info("zstd-Dictionary geladen: %s (id=%s)", ZSTD_DICT_PATH, _zstd_dict.dict_id())
+    return _zstd_dict
+
+
+def _zstd_dict_for_id(dict_id: int):
+    """Dictionary zur id aus dem Marker: aktives oder abgelegtes; sonst UnknownDictionaryError."""
+    if zstandard is None:
+        raise UnknownDictionaryError("zstd-Eintrag gefunden, aber 'zstandard' ist nicht installiert.")
+    _load_zstd_dict()
+    zdict = _zstd_dicts_by_id.get(dict_id)
+    if zdict is None:
+        path = dict_path_for(dict_id)
+        if not path.exists():
+            raise UnknownDictionaryError(f"zstd-Dictionary mit id={dict_id} nicht gefunden ({path}).")
+        zdict = zstandard.ZstdCompressionDict(path.read_bytes())
+        _zstd_dicts_by_id[dict_id] = zdict
+    return zdict
+
+
+def train_zstd_dict(samples: Iterable[bytes], dict_size: int = 32 * 1024) -> Path:
+    """
+    Trainiert ein zstd-Dictionary über Beispiel-Responses, legt es unter seiner
+    id und als aktives Dictionary (ZSTD_DICT_PATH) ab und verwendet es sofort.
+    Das bisherige aktive Dictionary bleibt unter seiner id erhalten.
+    """
+    global _zstd_dict
+    if zstandard is None:
+        raise StorageCodecError("Paket 'zstandard' ist nicht installiert.")
+
+    sample_list = [s for s in samples if s]
+    if len(sample_list) < 10:
+        raise StorageCodecError(
+            f"Zu wenige Beispiele für Dictionary-Training ({len(sample_list)} < 10)."
+        )
+
+    previous = _load_zstd_dict()
+    if previous is not None:
+        _archive_dict(previous)
+
+    trained = zstandard.train_dictionary(dict_size, sample_list)
+    _archive_dict(trained)
+    ZSTD_DICT_PATH.parent.mkdir(parents=True, exist_ok=True)
+    tmp = ZSTD_DICT_PATH.with_name(ZSTD_DICT_PATH.name + ".tmp")
+    tmp.write_bytes(trained.as_bytes())
+    os.replace(tmp, ZSTD_DICT_PATH)
+    _zstd_dict = trained
+    _zstd_dicts_by_id[trained.dict_id()] = trained
+    return ZSTD_DICT_PATH
+
+
+def encode_text(text: Optional[str], codec: Optional[str] = None) -> StoredValue:
+    """
+    Kodiert einen Text für die DB-Ablage.
+    Bei codec="none" (oder leerem Text) wird der Text unverändert zurückgegeben.
+    """
+    if text is None:
+        return None
+
+    codec = (codec or RESPONSE_CODEC).lower()
+    if codec == "none" or not text:
+        return text
+
+    raw = text.encode("utf-8")
+
+    if codec == "zstd":
+        zdict = _load_zstd_dict()
+        if zdict is not None:
+            cctx = zstandard.ZstdCompressor(level=ZSTD_LEVEL, dict_data=zdict)
+            return (
+                MARKER_ZSTD_DICT
+                + zdict.dict_id().to_bytes(4, "big")
+                + cctx.compress(raw)
+            )
+        # ohne Dictionary auf zlib zurückfallen – bleibt lesbar
+
+    return MARKER_ZLIB + zlib.compress(raw, ZLIB_LEVEL)
+
+
+def decode_text(value: StoredValue) -> Optional[str]:
+    """Dekodiert einen DB-Wert (Alt-Text oder komprimierter BLOB) zu str."""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return value
+
+    data = bytes(value)
+    marker = data[:3]
+
+    if marker == MARKER_ZLIB:
+        return zlib.decompress(data[3:]).decode("utf-8")
+
+    if marker == MARKER_ZSTD_DICT:
+        zdict = _zstd_dict_for_id(int.from_bytes(data[3:7], "big"))
+        dctx = zstandard.ZstdDecompressor(dict_data=zdict)
+        return dctx.decompress(data[7:]).decode("utf-8")
+
+    # Unbekannter BLOB ohne Marker: als UTF-8-Text interpretieren
+    return data.decode("utf-8")
+
+
+def encode_json(obj: Any, codec: Optional[str] = None) -> StoredValue:
+    """json.dumps (ensure_ascii=False) + encode_text."""
+    return encode_text(json.dumps(obj, ensure_ascii=False), codec=codec)
+
+
+def decode_json(value: StoredValue, default: Any = None) -> Any:
+    """
+    decode_text + json.loads; bei leerem oder defektem Wert `default`.
+    Fehlendes Dictionary (UnknownDictionaryError) wird weitergereicht – die Daten
+    sind intakt, nur die Konfiguration fehlt; ein Leerwert würde das verdecken.
+    """
+    try:
+        text = decode_text(value)
+    except UnknownDictionaryError:
+        raise
+    except (StorageCodecError, zlib.error, UnicodeDecodeError) as exc:
+        logger.warning("Gespeicherter Wert nicht dekodierbar: %s", exc)
+        return default
+    if not text:
+        return default
+    try:
+        return json.loads(text)
+    except Exception:
+        return default
+
+
+def is_encoded(value: StoredValue) -> bool:
+    """True, wenn der Wert bereits ein komprimierter BLOB mit Marker ist."""
+    if value is None or isinstance(value, str):
+        return False
+    return bytes(value[:3]) in (MARKER_ZLIB, MARKER_ZSTD_DICT)
+
+
+def stored_size(value: StoredValue) -> int:
+    """Bytes, die ein Wert in der DB belegt (für Größenberichte)."""
+    if value is None:
+        return 0
+    if isinstance(value, str):
+        return len(value.encode("utf-8"))
+    return len(bytes(value))
@@ -0,0 +1,182 @@
+"""
+taric_thumbnails.py
+
+Verantwortung:
+- Erzeugung von WebP-Vorschaubildern (thumb / medium) für die Evaluations-UI
+- Plattencache unter bilder_thumbs/<variante>/ab/cd/<schlüssel>.webp
+- Hintergrund-Erzeugung in einem Worker-Pool (beim Upload oder lazy)
+- Starke ETags (Inhalts-Hash der Quelle + Variante + Version)
+
+Die Auslieferung (ETag, Cache-Control, Range) erfolgt im Backend über
+/api/images/{variant}/{filename}.
+"""
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).resolve().parent
+
+THUMB_DIR = Path(os.getenv("TARIC_THUMB_DIR", str(BASE_DIR / "bilder_thumbs")))
+
+# Variante -> (maximale Kantenlänge in Pixel, WebP-Qualität)
+VARIANTS: Dict[str, Tuple[int, int]] = {
+    "thumb": (320, 75),
+    "medium": (1280, 82),
+}
+
+# Bei Änderungen an Größen/Qualität erhöhen -> neue ETags, alte Cache-Dateien ungenutzt
+THUMB_VERSION = 1
+
+MAX_WORKERS = int(os.getenv("TARIC_THUMB_WORKERS", "2"))
+
+_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="thumbs")
+_inflight: Dict[Tuple[str, str], Future] = {}
+_inflight_lock = threading.Lock()
+
+
+class ThumbnailError(Exception):
+    """Vorschaubild konnte nicht erzeugt werden."""
+
+
+def source_key(src: Path) -> str:
+    """
+    Cache-Schlüssel der Quelle. Für Store-Dateien ist das der SHA-256 aus dem
+    Dateinamen, für Altdateien ein Hash über Name, Größe und mtime.
+    """
+    stem = src.stem
+    if len(stem) == 64 and all(c in "0123456789abcdef" for c in stem):
+        return stem
+    st = src.stat()
+    return hashlib.sha256(f"{src.name}:{st.st_size}:{st.st_mtime_ns}".encode()).hexdigest()
+
+
+def etag_for(src: Path, variant: str) -> str:
+    """Starker ETag (inkl. Anführungszeichen)."""
+    return f'"{source_key(src)}-{variant}-v{THUMB_VERSION}"'
+
+
+def cache_path_for(src: Path, variant: str) -> Path:
+    key = source_key(src)
+    return THUMB_DIR / f"{variant}-v{THUMB_VERSION}" / key[:2] / key[2:4] / f"{key}.webp"
+
+
+def _render(src: Path, variant: str, target: Path) -> Path:
+    """Skaliert src auf die Variante und schreibt atomar nach target."""
+    max_edge, quality = VARIANTS[variant]
+
+    try:
+        with Image.open(src) as img:
+            img = ImageOps.exif_transpose(img)
+            if img.mode not in ("RGB", "RGBA"):
+                img = img.convert("RGBA" if "A" in img.getbands() else "RGB")
+            img.thumbnail((max_edge, max_edge), Image.LANCZOS)
+
+            target.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp_name = tempfile.mkstemp(dir=target.parent, prefix=".tmp_", suffix=".webp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    img.save(f, "WEBP", quality=quality, method=4)
+                os.replace(tmp_name, target)
+            except Exception:
+                Path(tmp_name).unlink(missing_ok=True)
+                raise
+    except Exception as exc:
+        raise ThumbnailError(f"Vorschau {variant} für {src.name} fehlgeschlagen: {exc}") from exc
+
+    return target
+
+
+def _submit(src: Path, variant: str) -> Future:
+    """
+    Plant die Erzeugung im Worker-Pool ein. Parallele Anfragen für dieselbe
+    Quelle/Variante teilen sich einen Job.
+    """
+    target = cache_path_for(src, variant)
+    key = (str(target), variant)
+    with _inflight_lock:
+        fut = _inflight.get(key)
+        if fut is not None:
+            return fut
+        fut = _executor.submit(_render, src, variant, target)
+        _inflight[key] = fut
+
+    def _done(_f: Future) -> None:
+        with _inflight_lock:
+            _inflight.pop(key, None)
+
+    fut.add_done_callback(_done)
+    return fut
+
+
+def get_cached(src: Path, variant: str) -> Optional[Path]:
+    target = cache_path_for(src, variant)
+    return target if target.is_file() else None
+
+
+def ensure_thumbnail_future(src: Path, variant: str) -> Future:
+    """Future auf den Cache-Pfad; sofort erfüllt, wenn bereits vorhanden."""
+    if variant not in VARIANTS:
+        raise ThumbnailError(f"Unbekannte Variante: {variant}")
+    cached = get_cached(src, variant)
+    if cached is not None:
+        fut: Future = Future()
+        fut.set_result(cached)
+        return fut
+    return _submit(src, variant)
+
+
+def schedule_all(src: Path) -> None:
+    """Erzeugt alle Varianten im Hintergrund (z.B. direkt nach dem Upload)."""
+    for variant in VARIANTS:
+        try:
+            fut = ensure_thumbnail_future(src, variant)
+            fut.add_done_callback(_log_failure)
+        except Exception:
+            logger.exception("Vorschau-Job für %s konnte nicht eingeplant werden", src)
+
+
+def _log_failure(fut: Future) -> None:
+    exc = fut.exception()
+    if exc is not None:
+        logger.warning("%s", exc)
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parst einen einfachen Range-Header ("bytes=a-b", "bytes=a-", "bytes=-n").
+    Rückgabe: (start, end) inklusive, oder None bei fehlendem/ungültigem Header.
+    Mehrfach-Ranges werden nicht unterstützt (-> None, volle Antwort).
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    spec = header[len("bytes="):].strip()
+    start_s, _, end_s = spec.partition("-")
+    try:
+        if start_s == "":
+            length = int(end_s)
+            if length <= 0:
+                return None
+            start, end = max(size - length, 0), size - 1
+        else:
+            start = int(start_s)
+            end = int(end_s) if end_s else size - 1
+    except ValueError:
+        return None
+    end = min(end, size - 1)
+    if start > end or start >= size:
+        return None
+    return start, end
+
+
+def shutdown() -> None:
+    _executor.shutdown(wait=False, cancel_futures=True)
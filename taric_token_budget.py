@@ -0,0 +1,151 @@
+"""
+taric_token_budget.py
+
+Verantwortung:
+- Token-Schätzung je Bild vor dem Senden:
+    * Größenklasse aus den Bildmaßen (Gemini rechnet Bilder in 768er-Kacheln ab,
+      kleine Bilder <= 384 px als eine Kachel)
+    * Historischer Verbrauch je Größenklasse aus dem Bulk-Journal; solange es
+      wenige Messwerte gibt, wird mit einem Vorab-Schätzwert geglättet
+- Budget-Zulassung: ein Bild wird nur gesendet, wenn die Schätzung noch in das
+  Lauf- und das Tagesbudget passt (Reservierung, danach Abrechnung mit dem
+  tatsächlichen Verbrauch)
+- Dauer-Schätzung für den Dry-Run aus dem Kontingent (Anfragen bzw. Tokens pro Minute)
+"""
+
+from typing import Any, Dict, Iterable, Optional, Tuple
+import math
+import threading
+
+try:
+    from PIL import Image
+except ImportError:  # Schätzung fällt dann auf die Klasse "unknown" zurück
+    Image = None
+
+# Gemini-Abrechnung für Bilder
+TILE_SIZE = 768
+SMALL_IMAGE_SIZE = 384
+TOKENS_PER_TILE = 258
+
+# Vorab-Schätzwerte für Systemprompt und Antwort (ohne Bild)
+PROMPT_TOKENS_PRIOR = 600
+COMPLETION_TOKENS_PRIOR = 300
+
+# Gewicht des Vorab-Schätzwerts in "Messwerten" (Glättung bei wenig Historie)
+PRIOR_WEIGHT = 5
+
+UNKNOWN_BUCKET = "unknown"
+UNKNOWN_TILES = 4
+
+
+def image_size(path) -> Tuple[Optional[int], Optional[int]]:
+    """Bildmaße aus dem Dateikopf (ohne die Pixeldaten zu dekodieren)."""
+    if Image is None:
+        return None, None
+    try:
+        with Image.open(path) as img:
+            return img.size
+    except Exception:
+        return None, None
+
+
+def tiles_for(width: Optional[int], height: Optional[int]) -> Optional[int]:
+    if not width or not height:
+        return None
+    if width <= SMALL_IMAGE_SIZE and height <= SMALL_IMAGE_SIZE:
+        return 1
+    return math.ceil(width / TILE_SIZE) * math.ceil(height / TILE_SIZE)
+
+
+def size_bucket(width: Optional[int], height: Optional[int]) -> str:
+    tiles = tiles_for(width, height)
+    return f"{tiles}t" if tiles else UNKNOWN_BUCKET
+
+
+def prior_tokens(bucket: str) -> int:
+    tiles = UNKNOWN_TILES if bucket == UNKNOWN_BUCKET else int(bucket.rstrip("t"))
+    return PROMPT_TOKENS_PRIOR + tiles * TOKENS_PER_TILE + COMPLETION_TOKENS_PRIOR
+
+
+class TokenEstimator:
+    """Schätzung je Größenklasse: (Summe Historie + Prior * PRIOR_WEIGHT) / (n + PRIOR_WEIGHT)."""
+
+    def __init__(self, history: Dict[str, Tuple[int, float]]) -> None:
+        """history: {bucket: (anzahl, summe_total_tokens)}"""
+        self.history = history
+
+    def estimate(self, bucket: str) -> int:
+        count, total = self.history.get(bucket, (0, 0.0))
+        return int(round((total + prior_tokens(bucket) * PRIOR_WEIGHT) / (count + PRIOR_WEIGHT)))
+
+    def describe(self, buckets: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        return {
+            b: {"estimate": self.estimate(b), "samples": self.history.get(b, (0, 0.0))[0]}
+            for b in sorted(set(buckets))
+        }
+
+
+class TokenBudget:
+    """
+    Thread-safe Zulassung gegen Lauf- und Tagesbudget (0 = unbegrenzt).
+    admit() reserviert die Schätzung, settle() ersetzt sie durch den Ist-Verbrauch.
+    """
+
+    def __init__(self, run_limit: int = 0, daily_limit: int = 0, used_today: int = 0) -> None:
+        self.run_limit = run_limit
+        self.daily_limit = daily_limit
+        self.used_today = used_today
+        self.used_run = 0
+        self.reserved = 0
+        self.refused = 0
+        self._lock = threading.Lock()
+
+    def _fits(self, tokens: int) -> bool:
+        pending = self.reserved + tokens
+        if self.run_limit > 0 and self.used_run + pending > self.run_limit:
+            return False
+        if self.daily_limit > 0 and self.used_today + pending > self.daily_limit:
+            return False
+        return True
+
+    def admit(self, estimate: int) -> bool:
+        with self._lock:
+            if not self._fits(estimate):
+                self.refused += 1
+                return False
+            self.reserved += estimate
+            return True
+
+    def settle(self, estimate: int, actual: Optional[int]) -> None:
+        """Reservierung freigeben; actual=None (z.B. Fehler ohne usage) verbraucht nichts."""
+        with self._lock:
+            self.reserved = max(self.reserved - estimate, 0)
+            if actual:
+                self.used_run += actual
+                self.used_today += actual
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "run_limit": self.run_limit,
+                "daily_limit": self.daily_limit,
+                "used_run": self.used_run,
+                "used_today": self.used_today,
+                "refused": self.refused,
+            }
+
+
+def estimate_minutes(images: int, tokens: int, requests_per_minute: float,
+                     tokens_per_minute: float, fallback_interval: float) -> float:
+    """
+    Dauer in Minuten: das engere der beiden Kontingente; ohne Angaben
+    fallback_interval (Sekunden zwischen zwei Anfragen).
+    """
+    candidates = []
+    if requests_per_minute > 0:
+        candidates.append(images / requests_per_minute)
+    if tokens_per_minute > 0:
+        candidates.append(tokens / tokens_per_minute)
+    if not candidates:
+        candidates.append(images * fallback_interval / 60.0)
+    return max(candidates)
@@ -0,0 +1,165 @@
+"""
+taric_validation.py
+
+Verantwortung:
+- Prüfung einer Modellantwort gegen die lokale Nomenklatur (taric_nomenclature):
+    * taric_code 10-stellig, existiert und ist zum Stichtag gültig
+    * cn_code / hs_chapter passen zum Präfix des taric_code (werden lokal korrigiert)
+    * Alternativen existieren (ungültige werden verworfen)
+- Gültige Nachbar-Codes für eine gezielte Rückfrage an das Modell
+- Aufbau des Rückfrage-Prompts (nur Text, ohne Bild)
+
+Ist kein vollständiger Nomenklatur-Import vermerkt (leerer Index oder nur
+Testzeilen in taric_reference), werden nur die Formatprüfungen durchgeführt;
+die Existenzprüfung gilt dann als "unchecked", Alternativen bleiben stehen.
+"""
+
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional
+import json
+
+from taric_nomenclature import NomenclatureEntry, NomenclatureIndex
+
+# Max. Anzahl Kandidaten im Rückfrage-Prompt
+MAX_CANDIDATES = 25
+
+
+@dataclass
+class ValidationReport:
+    status: str                      # "valid", "invalid", "unchecked"
+    taric_code: Optional[str]
+    checked: bool = False            # gegen eine vollständige Nomenklatur geprüft
+    issues: List[str] = field(default_factory=list)
+    fixes: List[str] = field(default_factory=list)
+    dropped_alternatives: List[str] = field(default_factory=list)
+
+    @property
+    def needs_followup(self) -> bool:
+        # Kandidaten aus einem Teilbestand würden gültige Codes "korrigieren"
+        return self.checked and self.status == "invalid"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def _digits(value: Any) -> str:
+    return "".join(ch for ch in str(value or "") if ch.isdigit())
+
+
+def _alt_code(alt: Any) -> str:
+    return _digits(alt.get("taric_code") if isinstance(alt, dict) else alt)
+
+
+def validate(result: Dict[str, Any], index: NomenclatureIndex, on_date: Optional[str] = None) -> ValidationReport:
+    """
+    Prüft result (Modellantwort) und korrigiert ableitbare Felder direkt in result:
+    cn_code/hs_chapter aus dem taric_code, ungültige Alternativen werden entfernt.
+    """
+    checked = index.complete
+    code = _digits(result.get("taric_code"))
+    report = ValidationReport(
+        status="valid" if checked else "unchecked", taric_code=code or None, checked=checked
+    )
+
+    if len(code) != 10:
+        report.status = "invalid"
+        report.issues.append(f"taric_code '{result.get('taric_code')}' ist nicht 10-stellig")
+    elif checked:
+        entry = index.get(code)
+        if entry is None:
+            report.status = "invalid"
+            report.issues.append(f"taric_code {code} existiert nicht in der Nomenklatur")
+        elif not entry.is_valid_on(on_date):
+            report.status = "invalid"
+            report.issues.append(
+                f"taric_code {code} ist zum Stichtag nicht gültig ({entry.valid_from} – {entry.valid_to or 'offen'})"
+            )
+        elif not entry.is_leaf:
+            report.status = "invalid"
+            report.issues.append(f"taric_code {code} ist keine deklarierbare Unterposition")
+
+    # Präfix-Konsistenz: cn_code und hs_chapter sind aus dem taric_code ableitbar
+    if len(code) == 10:
+        result["taric_code"] = code
+        for key, expected in (("cn_code", code[:8]), ("hs_chapter", code[:2])):
+            if _digits(result.get(key)) != expected:
+                report.fixes.append(f"{key} '{result.get(key)}' -> '{expected}'")
+                result[key] = expected
+
+    # Alternativen: nur existierende, gültige 10-stellige Codes behalten
+    kept = []
+    for alt in result.get("possible_alternatives") or []:
+        alt_code = _alt_code(alt)
+        ok = len(alt_code) == 10 and (not checked or index.exists(alt_code, on_date))
+        if ok:
+            kept.append(alt)
+        else:
+            report.dropped_alternatives.append(alt_code or str(alt))
+    result["possible_alternatives"] = kept
+
+    return report
+
+
+def candidates(code: str, index: NomenclatureIndex, on_date: Optional[str] = None,
+               limit: int = MAX_CANDIDATES) -> List[NomenclatureEntry]:
+    """
+    Gültige deklarierbare Codes in der Nähe von code: unter dem längsten
+    Präfix (8/6/4/2 Stellen), der in der Nomenklatur vorkommt.
+    """
+    code = _digits(code)
+    for length in (8, 6, 4, 2):
+        prefix = code[:length]
+        if len(prefix) < length or not index.has_prefix(prefix):
+            continue
+        found = []
+        for c in index.prefix_range(prefix):
+            entry = index.get(c)
+            if entry is not None and entry.is_leaf and entry.is_valid_on(on_date):
+                found.append(entry)
+                if len(found) >= limit:
+                    break
+        if found:
+            return found
+    return []
+
+
+def build_followup_prompt(result: Dict[str, Any], report: ValidationReport,
+                          options: List[NomenclatureEntry], lang: str = "de") -> str:
+    """Kurzer Text-Prompt: Fehler benennen, gültige Codes zur Auswahl geben."""
+    lines = "\n".join(f"- {e.taric_code}: {e.description(lang) or ''}" for e in options)
+    previous = {
+        "taric_code": result.get("taric_code"),
+        "short_reason": result.get("short_reason"),
+    }
+    return f"""
+Du hast für ein Produktfoto folgende TARIC-Klassifikation geliefert:
+{json.dumps(previous, ensure_ascii=False)}
+
+Die Prüfung gegen die EU-Nomenklatur ergab:
+{chr(10).join('- ' + issue for issue in report.issues)}
+
+Wähle aus den folgenden gültigen TARIC-Codes den passendsten für die beschriebene Ware:
+{lines}
+
+Antworte ausschließlich mit diesem JSON-Objekt, ohne Markdown:
+{{"taric_code": "XXXXXXXXXX", "confidence": 0.0, "short_reason": "kurze Begründung"}}
+""".strip()
+
+
+def apply_followup(result: Dict[str, Any], followup: Dict[str, Any],
+                   options: List[NomenclatureEntry]) -> bool:
+    """
+    Übernimmt den Code aus der Rückfrage, wenn er zu den angebotenen Kandidaten
+    gehört. Rückgabe: True, wenn übernommen.
+    """
+    code = _digits(followup.get("taric_code"))
+    if code not in {e.taric_code for e in options}:
+        return False
+    result["taric_code"] = code
+    result["cn_code"] = code[:8]
+    result["hs_chapter"] = code[:2]
+    if followup.get("confidence") is not None:
+        result["confidence"] = followup["confidence"]
+    if followup.get("short_reason"):
+        result["short_reason"] = followup["short_reason"]
+    return True
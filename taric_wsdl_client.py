@@ -2,42 +2,167 @@
 taric_wsdl_client.py
 
 Verantwortung:
-- Kommunikation mit der TARIC WSDL-API der EU-Kommission
-- SOAP-Request bauen
-- SOAP/XML-Response parsen
+- Kommunikation mit dem TARIC-Webservice (SOAP) der EU-Kommission
+- SOAP-Request bauen (Operation goodsDescrForWs laut WSDL)
+- SOAP/XML-Response inkrementell parsen (iterparse, kein vollständiger DOM)
 - Ergebnis als neutrales Python-Dict zurückgeben
 
-WICHTIG:
-- Die echte Endpoint-URL und die SOAP-Action müssen aus der offiziellen
-  Dokumentation / WSDL gezogen und hier eingetragen werden.
+Verbindungen laufen über eine gemeinsame requests.Session mit Connection-Pool,
+Timeouts und Wiederholungen (Backoff bei 429/502/503/504 und Verbindungsfehlern).
+Für Offline-Tests: taric_wsdl_stub_server.py und
+TARIC_WSDL_ENDPOINT=http://127.0.0.1:8765/taric/services/goods
 """
 
-from typing import Optional, Dict
-import os
-import logging
+from typing import IO, Optional, Dict
 import datetime
+import io
+import logging
+import os
+import threading
+import xml.etree.ElementTree as ET
 
 import requests  # ggf. in requirements aufnehmen
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import HTTPError as Urllib3HTTPError
+from urllib3.util.retry import Retry
 
 logger = logging.getLogger(__name__)
 
-# Platzhalter – hier später die echte WSDL/SOAP-Endpoint-URL hinterlegen
 TARIC_WSDL_ENDPOINT = os.getenv(
     "TARIC_WSDL_ENDPOINT",
-    "https://ec.europa.eu/taxation_customs/dds2/taric/services/goods"  # Beispiel / TODO
+    "https://ec.europa.eu/taxation_customs/dds2/taric/services/goods",
 )
 
+# Namespace der Operation goodsDescrForWs (aus der WSDL des Dienstes)
+TARIC_WSDL_NAMESPACE = os.getenv(
+    "TARIC_WSDL_NAMESPACE",
+    "http://goodsNomenclatureForWS.ws.taric.dds.s/",
+)
+
+# (Connect-, Read-Timeout) in Sekunden
+TIMEOUT = (5.0, float(os.getenv("TARIC_WSDL_TIMEOUT", "15")))
+RETRIES = int(os.getenv("TARIC_WSDL_RETRIES", "3"))
+POOL_SIZE = int(os.getenv("TARIC_WSDL_POOL_SIZE", "8"))
+
+# Fault-Texte, die "Code nicht gefunden" bedeuten (kein technischer Fehler)
+NOT_FOUND_MARKERS = ("not found", "nicht gefunden", "no result", "does not exist", "invalid goods code")
+
+SOAP_TEMPLATE = """<?xml version="1.0" encoding="UTF-8"?>
+<soapenv:Envelope xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/"
+                  xmlns:good="{namespace}">
+  <soapenv:Header/>
+  <soapenv:Body>
+    <good:goodsDescrForWs>
+      <goodsCode>{code}</goodsCode>
+      <languageCode>{lang}</languageCode>
+      <referenceDate>{reference_date}</referenceDate>
+    </good:goodsDescrForWs>
+  </soapenv:Body>
+</soapenv:Envelope>
+"""
+
 
 class TaricWsdlError(Exception):
     """Allgemeiner Fehler beim TARIC-WSDL-Aufruf."""
 
 
-def fetch_from_wsdl(taric_code: str, lang: str = "DE") -> Optional[Dict]:
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """Gemeinsame Session (Keep-Alive, Pool, Retries) für alle Aufrufe."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            retry = Retry(
+                total=RETRIES,
+                connect=RETRIES,
+                read=RETRIES,
+                status=RETRIES,
+                backoff_factor=0.5,
+                # kein 500: SOAP-Faults (z.B. "nicht gefunden") kommen als HTTP 500
+                status_forcelist=(429, 502, 503, 504),
+                allowed_methods=frozenset({"POST"}),  # SOAP-Abfrage ist lesend
+                respect_retry_after_header=True,
+                raise_on_status=False,
+            )
+            adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE, max_retries=retry)
+            session = requests.Session()
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers.update(
+                {
+                    "Content-Type": "text/xml; charset=utf-8",
+                    "SOAPAction": '""',
+                    "User-Agent": "TARIC-Gemini-Backend/1.0",
+                }
+            )
+            _session = session
+        return _session
+
+
+def close_session() -> None:
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+
+
+def build_envelope(taric_code: str, lang: str, reference_date: str) -> bytes:
+    return SOAP_TEMPLATE.format(
+        namespace=TARIC_WSDL_NAMESPACE,
+        code=taric_code,
+        lang=lang,
+        reference_date=reference_date,
+    ).encode("utf-8")
+
+
+def _local(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+
+def parse_response(stream: IO[bytes]) -> Dict[str, Optional[str]]:
+    """
+    Liest die SOAP-Antwort elementweise. Verarbeitete Elemente werden sofort
+    geleert, damit auch große Antworten keinen vollständigen Baum aufbauen.
+    Rückgabe: {"description", "goods_code", "fault"} (Werte ggf. None).
+    """
+    found: Dict[str, Optional[str]] = {"description": None, "goods_code": None, "fault": None}
+    descriptions = []
+    try:
+        for _event, elem in ET.iterparse(stream, events=("end",)):
+            name = _local(elem.tag)
+            text = (elem.text or "").strip()
+            if name == "faultstring" and text:
+                found["fault"] = text
+            elif name in ("description", "descr", "goodsDescription") and text:
+                descriptions.append(text)
+            elif name in ("goodsCode", "goods_code") and text and not found["goods_code"]:
+                found["goods_code"] = text
+            if len(elem) == 0 or name in ("data", "result", "return"):
+                elem.clear()
+    except ET.ParseError as exc:
+        raise TaricWsdlError(f"Antwort des TARIC-WSDL ist kein gültiges XML: {exc}") from exc
+
+    if descriptions:
+        # Mehrere Zeilen (z.B. Einrückungsebenen) zu einer Beschreibung verbinden
+        found["description"] = " | ".join(dict.fromkeys(descriptions))
+    return found
+
+
+def fetch_from_wsdl(taric_code: str,
+                    lang: str = "DE",
+                    reference_date: Optional[str] = None,
+                    keep_raw: bool = False) -> Optional[Dict]:
     """
     Ruft die offizielle TARIC-Beschreibung für einen TARIC-Code via WSDL/SOAP ab.
 
     :param taric_code: TARIC / Goods Code, vorzugsweise 10-stellig (z.B. '8517120000').
     :param lang: Sprachcode, z.B. 'DE', 'EN'.
+    :param reference_date: Stichtag YYYY-MM-DD; None = heute.
+    :param keep_raw: Antwort-XML zusätzlich als "raw" zurückgeben (sonst wird gestreamt).
     :return: Dict mit Beschreibung oder None bei „nicht gefunden“.
     :raises TaricWsdlError: bei technischen Fehlern / Parserfehlern.
     """
@@ -48,55 +173,57 @@ def fetch_from_wsdl(taric_code: str, lang: str = "DE") -> Optional[Dict]:
         return None
 
     lang = (lang or "DE").upper()
-
-    # TODO: Hier konkretes SOAP-Envelope laut WSDL einbauen.
-    # Aktuell nur ein Dummy-Request-Body als Platzhalter.
-    soap_body = f"""<?xml version="1.0" encoding="UTF-8"?>
-<soapenv:Envelope xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/"
-                  xmlns:tar="http://example.org/taric">
-  <soapenv:Header/>
-  <soapenv:Body>
-    <tar:getGoodsDescription>
-      <tar:code>{taric_code}</tar:code>
-      <tar:language>{lang}</tar:language>
-    </tar:getGoodsDescription>
-  </soapenv:Body>
-</soapenv:Envelope>
-"""
-
-    headers = {
-        "Content-Type": "text/xml; charset=utf-8",
-        # "SOAPAction": "..."  # TODO: SOAPAction aus WSDL eintragen, falls erforderlich
-    }
+    reference_date = reference_date or datetime.date.today().isoformat()
 
     logger.info("TARIC WSDL Request: code=%s, lang=%s", taric_code, lang)
 
     try:
-        resp = requests.post(TARIC_WSDL_ENDPOINT, data=soap_body.encode("utf-8"), headers=headers, timeout=15)
-    except Exception as exc:
+        resp = get_session().post(
+            TARIC_WSDL_ENDPOINT,
+            data=build_envelope(taric_code, lang, reference_date),
+            timeout=TIMEOUT,
+            stream=not keep_raw,
+        )
+    except requests.RequestException as exc:
         logger.exception("Fehler beim HTTP-Request an TARIC-WSDL")
         raise TaricWsdlError(f"HTTP-Fehler beim TARIC-WSDL-Aufruf: {exc}") from exc
 
+    raw_xml = None
+    try:
+        # SOAP-Faults kommen mit HTTP 500 – Inhalt trotzdem auswerten
+        if resp.status_code not in (200, 500):
+            logger.error("TARIC-WSDL HTTP-Status != 200: %s", resp.status_code)
+            raise TaricWsdlError(f"Unerwarteter HTTP-Status {resp.status_code} von TARIC-WSDL")
+
+        if keep_raw:
+            raw_xml = resp.text
+            parsed = parse_response(io.BytesIO(resp.content))
+        else:
+            resp.raw.decode_content = True  # gzip transparent entpacken
+            parsed = parse_response(resp.raw)
+    except (requests.RequestException, Urllib3HTTPError, OSError) as exc:
+        # Beim Streamen liest iterparse direkt aus resp.raw: Abbrüche (z.B. zu kurze
+        # Antwort bei Content-Length) kommen dann als urllib3- bzw. Socket-Fehler
+        raise TaricWsdlError(f"Fehler beim Lesen der TARIC-WSDL-Antwort: {exc}") from exc
+    finally:
+        resp.close()
+
+    if parsed["fault"]:
+        if any(marker in parsed["fault"].lower() for marker in NOT_FOUND_MARKERS):
+            return None
+        raise TaricWsdlError(f"SOAP-Fault vom TARIC-WSDL: {parsed['fault']}")
+
     if resp.status_code != 200:
-        logger.error("TARIC-WSDL HTTP-Status != 200: %s", resp.status_code)
         raise TaricWsdlError(f"Unerwarteter HTTP-Status {resp.status_code} von TARIC-WSDL")
 
-    raw_xml = resp.text
-
-    # TODO: Hier XML mit z.B. `xml.etree.ElementTree` oder `lxml` parsen
-    # und die tatsächliche Description extrahieren.
-    #
-    # Aktuell nur Dummy-Wert als Platzhalter:
-
-    description = f"[OFFIZIELLE TARIC-Beschreibung für {taric_code} – TODO: XML-Parsing implementieren]"
+    if not parsed["description"]:
+        return None
 
-    result = {
+    return {
         "taric_code": taric_code,
         "language": lang,
-        "description": description,
+        "description": parsed["description"],
         "source": "EU_TARIC_WSDL",
         "fetched_at": datetime.datetime.utcnow().isoformat() + "Z",
         "raw": raw_xml,
     }
-
-    return result
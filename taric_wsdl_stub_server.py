@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Lokaler Stub für den TARIC-SOAP-Dienst (goodsDescrForWs)
+
+Funktion:
+- Beantwortet SOAP-Requests wie der EU-Dienst, ohne Netzwerkzugriff
+- Antworten kommen aus data/taric_wsdl_stub/<code>_<LANG>.xml,
+  unbekannte Codes erhalten den Fault aus fault_not_found.xml
+- Optional: synthetische Antworten für beliebige Codes, künstliche Latenz,
+  zufällige 503-Fehler (testet Retries) und große Antworten (testet iterparse)
+- --bench: startet den Stub im Hintergrund und misst den Durchsatz von
+  taric_wsdl_client.fetch_from_wsdl
+
+Verwendung:
+    python3 taric_wsdl_stub_server.py --port 8765
+    TARIC_WSDL_ENDPOINT=http://127.0.0.1:8765/taric/services/goods python3 ...
+    python3 taric_wsdl_stub_server.py --bench 2000 --concurrency 8 --synthetic --latency-ms 5
+"""
+
+import argparse
+import os
+import random
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from html import escape
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent
+RESPONSES_DIR = BASE_DIR / "data" / "taric_wsdl_stub"
+ENDPOINT_PATH = "/taric/services/goods"
+
+SYNTHETIC_TEMPLATE = """<?xml version="1.0" encoding="UTF-8"?>
+<S:Envelope xmlns:S="http://schemas.xmlsoap.org/soap/envelope/">
+  <S:Body>
+    <ns2:goodsDescrForWsResponse xmlns:ns2="http://goodsNomenclatureForWS.ws.taric.dds.s/">
+      <return><result>{rows}</result></return>
+    </ns2:goodsDescrForWsResponse>
+  </S:Body>
+</S:Envelope>
+"""
+
+SYNTHETIC_ROW = (
+    "<data><goodsCode>{code}</goodsCode><language>{lang}</language>"
+    "<description>{text}</description></data>"
+)
+
+
+class StubConfig:
+    synthetic = False
+    latency = 0.0
+    fail_rate = 0.0
+    rows = 1
+    requests = 0
+    failures = 0
+    lock = threading.Lock()
+
+
+def _field(body: str, name: str) -> str:
+    match = re.search(rf"<(?:\w+:)?{name}>\s*([^<]*?)\s*</(?:\w+:)?{name}>", body)
+    return match.group(1) if match else ""
+
+
+def _response_for(code: str, lang: str):
+    """(HTTP-Status, XML) für code/lang."""
+    recorded = RESPONSES_DIR / f"{code}_{lang}.xml"
+    if recorded.exists():
+        return 200, recorded.read_text(encoding="utf-8")
+    if StubConfig.synthetic and code.isdigit():
+        rows = "".join(
+            SYNTHETIC_ROW.format(code=code, lang=lang, text=escape(f"Beschreibung {code} Zeile {i + 1}"))
+            for i in range(StubConfig.rows)
+        )
+        return 200, SYNTHETIC_TEMPLATE.format(rows=rows)
+    fault = (RESPONSES_DIR / "fault_not_found.xml").read_text(encoding="utf-8")
+    return 500, fault.replace("{code}", escape(code))
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-Alive wie beim echten Dienst
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length).decode("utf-8", errors="replace")
+
+        with StubConfig.lock:
+            StubConfig.requests += 1
+            fail = random.random() < StubConfig.fail_rate
+            if fail:
+                StubConfig.failures += 1
+        if StubConfig.latency:
+            time.sleep(StubConfig.latency)
+
+        if self.path.split("?")[0] != ENDPOINT_PATH:
+            status, payload = 404, "not found"
+        elif fail:
+            status, payload = 503, "temporarily unavailable"
+        else:
+            status, payload = _response_for(_field(body, "goodsCode"), _field(body, "languageCode").upper())
+
+        data = payload.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "text/xml; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass  # Stub soll Benchmarks nicht mit Logausgaben bremsen
+
+
+def serve(port: int) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", port), StubHandler)
+    server.daemon_threads = True
+    return server
+
+
+def run_bench(port: int, total: int, concurrency: int) -> None:
+    os.environ["TARIC_WSDL_ENDPOINT"] = f"http://127.0.0.1:{port}{ENDPOINT_PATH}"
+    os.environ.setdefault("TARIC_WSDL_POOL_SIZE", str(concurrency))
+    import taric_wsdl_client  # nach dem Setzen des Endpoints importieren
+
+    codes = [f"{8517000000 + i * 10000:010d}" for i in range(total)]
+    results = {"ok": 0, "not_found": 0, "error": 0}
+    lock = threading.Lock()
+
+    def one(code: str) -> None:
+        try:
+            outcome = "ok" if taric_wsdl_client.fetch_from_wsdl(code, "DE") else "not_found"
+        except taric_wsdl_client.TaricWsdlError:
+            outcome = "error"
+        with lock:
+            results[outcome] += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, codes))
+    elapsed = time.perf_counter() - started
+
+    print(f"[INFO] {total} Abrufe in {elapsed:.2f}s – {total / elapsed:.0f} Abrufe/s "
+          f"(Threads: {concurrency}, Zeilen je Antwort: {StubConfig.rows})")
+    print(f"[INFO] Ergebnis: {results}; Stub-Requests: {StubConfig.requests}, "
+          f"davon künstliche 503: {StubConfig.failures}")
+    taric_wsdl_client.close_session()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--synthetic", action="store_true", help="Antworten für beliebige Codes erzeugen")
+    parser.add_argument("--rows", type=int, default=1, help="Zeilen je synthetischer Antwort (große Payloads)")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="künstliche Latenz je Request")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Anteil 503-Antworten (0..1)")
+    parser.add_argument("--bench", type=int, default=0, metavar="N", help="N Abrufe gegen den Stub messen")
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    StubConfig.synthetic = args.synthetic
+    StubConfig.rows = max(args.rows, 1)
+    StubConfig.latency = args.latency_ms / 1000.0
+    StubConfig.fail_rate = args.fail_rate
+
+    server = serve(args.port)
+    if args.bench:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            run_bench(args.port, args.bench, args.concurrency)
+        finally:
+            server.shutdown()
+        return
+
+    print(f"[INFO] TARIC-SOAP-Stub auf http://127.0.0.1:{args.port}{ENDPOINT_PATH}")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\nAbgebrochen durch Benutzer.")
+        sys.exit(1)